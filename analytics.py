@@ -0,0 +1,132 @@
+import os
+from typing import Callable, Dict, List, Tuple
+
+import sublime
+import sublime_plugin
+
+from .build import RUNNER, timing_store
+from .completions import WORKSPACE, refresh_workspace
+from .logs import log_dirs
+from .plugins.lib import ScopeType
+from .plugins.lib.buildevents import format_duration
+from .plugins.lib.modulecache import find_rc_file
+from .plugins.lib.timings import RECENT_RUNS, durations_from_logs, run_dirs
+
+
+def import_history() -> None:
+    """Estimate timings of past runs from their logs, must run on the async thread."""
+    store = timing_store()
+    runs = run_dirs(log_dirs())
+    if RUNNER.current is not None and runs:
+        # logs of the running build are incomplete, it records its own timings when done
+        runs.pop()
+
+    for run_dir in runs:
+        run = os.path.basename(run_dir)
+        if store.is_imported(run):
+            continue
+        try:
+            with os.scandir(run_dir) as it:
+                module_dirs = [entry.path for entry in it if entry.is_dir(follow_symlinks=False)]
+        except OSError:
+            continue
+        for module_dir in module_dirs:
+            for phase, seconds in durations_from_logs(module_dir):
+                store.append(run, os.path.basename(module_dir), phase, seconds)
+        store.mark_imported(run)
+    store.flush()
+
+
+def module_sets() -> Dict[str, List[str]]:
+    """Modules of every module set in the configuration, must run on the async thread."""
+    rc = find_rc_file()
+    if rc is not None and os.path.normpath(rc) not in WORKSPACE.graph:
+        refresh_workspace()
+
+    found = {}  # type: Dict[str, List[str]]
+    for path in WORKSPACE.files():
+        doc = WORKSPACE.document(path)
+        if doc is None:
+            continue
+        for block in doc.blocks_of(ScopeType.MODULE_SET):
+            option = block.get("use-modules")
+            if block.name and option is not None:
+                found.setdefault(block.name, []).extend(option.value.split())
+    return found
+
+
+def show_timings(window: sublime.Window, collect: Callable[[], List[sublime.QuickPanelItem]], empty: str) -> None:
+    """Import timings of past runs, then show what `collect` makes of them, which runs on the async thread."""
+    def run_async() -> None:
+        import_history()
+        items = collect()
+
+        def run_main() -> None:
+            if len(items) == 0:
+                sublime.status_message("kdesrc-build: {}".format(empty))
+            else:
+                window.show_quick_panel(items, lambda index: None)
+
+        sublime.set_timeout(run_main)
+
+    sublime.set_timeout_async(run_async)
+
+
+def slowest_modules() -> List[sublime.QuickPanelItem]:
+    return [
+        sublime.QuickPanelItem(module, annotation=format_duration(seconds),
+                               details="median of the last {} builds".format(min(runs, RECENT_RUNS)))
+        for module, seconds, runs in timing_store().slowest()
+    ]
+
+
+def build_regressions() -> List[sublime.QuickPanelItem]:
+    return [
+        sublime.QuickPanelItem(module, annotation="+" + format_duration(last - before),
+                               details="{} before, {} in the last build".format(
+                                   format_duration(before), format_duration(last)),
+                               kind=sublime.KIND_NAVIGATION)
+        for module, before, last in timing_store().regressions()
+    ]
+
+
+def predicted_build_times() -> List[sublime.QuickPanelItem]:
+    store = timing_store()
+    predictions = []  # type: List[Tuple[str, float, List[str], int]]
+    for name, modules in module_sets().items():
+        total, unknown = store.predict_total(modules)
+        predictions.append((name, total, unknown, len(modules)))
+    predictions.sort(key=lambda item: -item[1])
+
+    return [
+        sublime.QuickPanelItem(
+            name,
+            annotation=format_duration(total),
+            details="{} modules{}".format(
+                count,
+                ", never built: " + " ".join(unknown) if unknown else "",
+            ),
+        )
+        for name, total, unknown, count in predictions
+    ]
+
+
+class KdesrcBuildShowSlowestModulesCommand(sublime_plugin.WindowCommand):
+    """Modules which take the most time to build, predicted from their latest builds."""
+
+    def run(self) -> None:
+        show_timings(self.window, slowest_modules, "No build timings yet")
+
+
+class KdesrcBuildShowBuildRegressionsCommand(sublime_plugin.WindowCommand):
+    """Modules whose last build took much longer than the builds before it."""
+
+    def run(self) -> None:
+        show_timings(self.window, build_regressions, "No modules got slower to build")
+
+
+class KdesrcBuildPredictBuildTimeCommand(sublime_plugin.WindowCommand):
+    """Predicted wall time of building each module set of the configuration."""
+
+    def run(self) -> None:
+        show_timings(self.window, predicted_build_times, "No module sets in the configuration")
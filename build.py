@@ -0,0 +1,330 @@
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+import sublime
+import sublime_plugin
+from sublime import Edit, Region, View, Window
+
+from .completions import MODULES, OUTPUT_SYNTAX, global_options, kdesrc_build_executable, settings
+from .plugins.lib.buildevents import BuildProgress, OutputParser
+from .plugins.lib.outputsink import OutputSink, split_preserved
+from .plugins.lib.runner import BuildJob, BuildRunner, owning_module
+from .plugins.lib.timings import TimingStore
+
+OUTPUT_PANEL = "kdesrc-build"
+
+PROGRESS_STATUS_KEY = "kdesrc-build-progress"
+
+# Fallback for the kdesrc_build_output_max_lines setting.
+MAX_LINES = 20000
+
+# Same defaults as kdesrc-build itself.
+DEFAULT_SOURCE_DIR = "~/kde/src"
+DEFAULT_BUILD_DIR = "~/kde/build"
+
+
+def build_roots() -> List[str]:
+    """Source and build directories of kdesrc-build, must run on the async thread."""
+    options = global_options("source-dir", "build-dir")
+    return [options.get("source-dir", DEFAULT_SOURCE_DIR), options.get("build-dir", DEFAULT_BUILD_DIR)]
+
+
+TIMING_STORE: Optional[TimingStore] = None
+TIMING_STORE_LOCK = threading.Lock()
+
+
+def timing_store() -> TimingStore:
+    global TIMING_STORE
+    with TIMING_STORE_LOCK:
+        if TIMING_STORE is None:
+            TIMING_STORE = TimingStore(os.path.join(sublime.cache_path(), __package__))
+        return TIMING_STORE
+
+
+def record_timings(progress: BuildProgress) -> None:
+    """Save durations of phases printed during the build, must not run on the main thread."""
+    if progress.log_dir:
+        # same name as the run directory, so that its logs are not counted twice
+        run = os.path.basename(os.path.normpath(progress.log_dir))
+    else:
+        run = time.strftime("%Y-%m-%d-%H%M%S")
+
+    store = timing_store()
+    for phase in progress.phases:
+        if phase.seconds is not None:
+            store.append(run, phase.module, phase.phase, phase.seconds, phase.succeeded)
+    store.mark_imported(run)
+    store.flush()
+
+
+def build_command(module: str) -> List[str]:
+    arguments = settings().get("kdesrc_build_build_arguments", ["--no-src"])
+    return [kdesrc_build_executable(), *arguments, module]
+
+
+def output_panel(window: Window, clear: bool = False) -> View:
+    panel = window.find_output_panel(OUTPUT_PANEL)
+    if panel is None or clear:
+        panel = window.create_output_panel(OUTPUT_PANEL)
+        panel.assign_syntax(OUTPUT_SYNTAX)
+        panel_settings = panel.settings()
+        panel_settings.set("word_wrap", False)
+        panel_settings.set("line_numbers", False)
+        panel_settings.set("gutter", False)
+        panel_settings.set("scroll_past_end", False)
+        panel_settings.erase("kdesrc_build_trimmed_lines")
+    return panel
+
+
+def append(window_id: int, text: str) -> None:
+    """Append text to the output panel of the window, must run on the main thread."""
+    window = sublime.Window(window_id)
+    if not window.is_valid():
+        return
+    panel = output_panel(window)
+    panel.run_command("kdesrc_build_append_output", {
+        "characters": text,
+        "max_lines": settings().get("kdesrc_build_output_max_lines", MAX_LINES),
+    })
+    sink(window_id).metrics.trimmed_lines = panel.settings().get("kdesrc_build_trimmed_lines", 0)
+
+
+SINKS: Dict[int, OutputSink] = {}
+"""Output of builds by id of the window they were started from."""
+
+
+def sink(window_id: int) -> OutputSink:
+    found = SINKS.get(window_id)
+    if found is None:
+        found = SINKS[window_id] = OutputSink(lambda text: append(window_id, text), sublime.set_timeout)
+    return found
+
+
+PARSERS: Dict[int, OutputParser] = {}
+"""Parsers of running builds by window id, only accessed from the runner's worker thread."""
+
+PROGRESS: Dict[int, BuildProgress] = {}
+"""Progress of the last build by window id, updated from the worker thread."""
+
+
+def show_progress(window_id: int) -> None:
+    """Show progress of the window's build in the status bar of its active view, must run on the main thread."""
+    window = sublime.Window(window_id)
+    progress = PROGRESS.get(window_id)
+    if not window.is_valid() or progress is None:
+        return
+
+    if progress.finished is None and RUNNER.current is not None:
+        view = window.active_view()
+        if view is not None:
+            view.set_status(PROGRESS_STATUS_KEY, progress.status())
+    else:
+        for view in window.views():
+            view.erase_status(PROGRESS_STATUS_KEY)
+
+
+def on_start(job: BuildJob) -> None:
+    PARSERS[job.tag] = OutputParser()
+    PROGRESS[job.tag] = BuildProgress()
+    sublime.set_timeout(lambda: sublime.status_message("kdesrc-build: Building {}".format(job.module)))
+    sink(job.tag).write("[{}]\n".format(" ".join(job.cmd)))
+
+
+def on_output(job: BuildJob, text: str) -> None:
+    sink(job.tag).write(text)
+
+    progress = PROGRESS[job.tag]
+    changed = False
+    for event in PARSERS[job.tag].feed(text):
+        progress.update(event)
+        changed = True
+    if changed:
+        sublime.set_timeout(lambda: show_progress(job.tag))
+
+
+def on_finish(job: BuildJob) -> None:
+    progress = PROGRESS[job.tag]
+    for event in PARSERS.pop(job.tag).close():
+        progress.update(event)
+    if progress.finished is None:
+        progress.finished = job.returncode == 0 and not job.cancelled
+    if not job.cancelled:
+        record_timings(progress)
+
+    elapsed = job.elapsed
+    if job.cancelled:
+        summary = "Cancelled"
+    elif job.returncode == 0:
+        summary = "Finished {} in {:.1f}s".format(job.module, elapsed)
+    else:
+        summary = "Failed to build {} in {:.1f}s with exit code {}".format(job.module, elapsed, job.returncode)
+    sink(job.tag).write("[{}]\n\n".format(summary))
+
+    def run_main() -> None:
+        show_progress(job.tag)
+        sublime.status_message("kdesrc-build: {}".format(summary))
+
+    sublime.set_timeout(run_main)
+
+
+RUNNER = BuildRunner(on_start, on_output, on_finish)
+
+
+class KdesrcBuildBuildModuleCommand(sublime_plugin.WindowCommand):
+    """Build the given module, or the one which the active file belongs to."""
+
+    def run(self, module: Optional[str] = None) -> None:
+        if module is not None:
+            self.submit(module)
+            return
+
+        view = self.window.active_view()
+        path = view.file_name() if view is not None else None
+        if path is None:
+            sublime.status_message("kdesrc-build: Current file does not belong to any module")
+            return
+
+        # MODULES is only safe to iterate on the main thread
+        known = list(MODULES)
+
+        def resolve() -> None:
+            found = owning_module(path, build_roots(), (str(name) for name in known))
+            if found is None:
+                sublime.set_timeout(lambda: sublime.status_message(
+                    "kdesrc-build: Current file does not belong to any module"))
+            else:
+                sublime.set_timeout(lambda: self.submit(found))
+
+        sublime.set_timeout_async(resolve)
+
+    def submit(self, module: str) -> None:
+        idle = RUNNER.current is None and not RUNNER.queued()
+        # start over with a clean panel, unless previous builds are still going
+        if idle:
+            sink(self.window.id()).flush()
+            SINKS.pop(self.window.id(), None)
+        output_panel(self.window, clear=idle)
+        self.window.run_command("show_panel", { "panel": "output." + OUTPUT_PANEL })
+
+        job = BuildJob(module, build_command(module), cwd=os.path.expanduser("~"), tag=self.window.id())
+        if not RUNNER.submit(job):
+            sublime.status_message("kdesrc-build: {} is already queued".format(module))
+        elif not idle:
+            sublime.status_message("kdesrc-build: Queued {}".format(module))
+
+
+class KdesrcBuildCancelBuildCommand(sublime_plugin.WindowCommand):
+    """Stop the running build and forget queued ones."""
+
+    def run(self) -> None:
+        cancelled = RUNNER.cancel()
+        if len(cancelled) > 1:
+            sublime.status_message("kdesrc-build: Cancelled {} builds".format(len(cancelled)))
+
+    def is_enabled(self) -> bool:
+        return RUNNER.current is not None or len(RUNNER.queued()) != 0
+
+
+class KdesrcBuildAppendOutputCommand(sublime_plugin.TextCommand):
+    """
+    Append text to an output panel, and keep the panel within `max_lines`.
+
+    The oldest lines are trimmed, except for summaries of failed packages,
+    which are moved to the top instead.
+    """
+
+    def run(self, edit: Edit, characters: str, max_lines: int = 0) -> None:
+        view = self.view
+        old_size = view.size()
+        # only follow the output if its end is in sight, not while earlier output is being read
+        window = view.window()
+        shown = window is not None and window.active_panel() == "output." + OUTPUT_PANEL
+        following = not shown or view.visible_region().end() >= old_size
+        view.insert(edit, old_size, characters)
+
+        lines = view.rowcol(view.size())[0]
+        if max_lines > 0 and lines > max_lines:
+            # trim a tenth more than needed, so that it does not happen on every flush
+            cut = view.text_point(lines - max_lines + max_lines // 10, 0)
+            preserved, cut = split_preserved(view.substr(Region(0, cut)))
+
+            if cut > 0:
+                panel_settings = view.settings()
+                marker = "[{} lines trimmed]\n\n"
+                trimmed = panel_settings.get("kdesrc_build_trimmed_lines", 0)
+                # the previous marker and preserved summaries are cut as well, but they are not lost
+                trimmed += view.rowcol(cut)[0]
+                if panel_settings.has("kdesrc_build_trimmed_lines"):
+                    trimmed -= marker.count("\n")
+                trimmed -= sum(summary.count("\n") for summary in preserved)
+
+                view.replace(edit, Region(0, cut), marker.format(trimmed) + "".join(preserved))
+                panel_settings.set("kdesrc_build_trimmed_lines", trimmed)
+
+        if following:
+            view.show(view.size())
+
+
+class KdesrcBuildShowOutputStatisticsCommand(sublime_plugin.WindowCommand):
+    """Print throughput of the build output panel to the console, for tuning."""
+
+    def run(self) -> None:
+        found = SINKS.get(self.window.id())
+        if found is None:
+            sublime.status_message("kdesrc-build: No build output yet")
+            return
+        print("kdesrc-build: Build output:", found.metrics.summary())
+        self.window.run_command("show_panel", { "panel": "console" })
+
+
+class KdesrcBuildShowFailuresCommand(sublime_plugin.WindowCommand):
+    """List modules which failed in the last build, and open their logs."""
+
+    def run(self) -> None:
+        progress = PROGRESS.get(self.window.id())
+        if progress is None:
+            sublime.status_message("kdesrc-build: No build yet")
+            return
+
+        # the summary with paths to logs only comes at the very end
+        failures = [(failure.module, failure.log_path) for failure in progress.failures]
+        if len(failures) == 0:
+            failures = [(phase.module, "") for phase in progress.failed_phases]
+        if len(failures) == 0:
+            sublime.status_message("kdesrc-build: No failures")
+            return
+
+        items = [
+            sublime.QuickPanelItem(module, details=path or "Log is not available until the build ends",
+                                   kind=sublime.KIND_NAVIGATION)
+            for module, path in failures
+        ]
+
+        def goto(index: int) -> None:
+            if index < 0:
+                return
+            path = failures[index][1]
+            if path:
+                self.window.run_command("kdesrc_build_open_log", { "path": path })
+            else:
+                self.window.run_command("show_panel", { "panel": "output." + OUTPUT_PANEL })
+
+        self.window.show_quick_panel(items, goto)
+
+    def is_enabled(self) -> bool:
+        return self.window.id() in PROGRESS
+
+
+class KdesrcBuildProgressListener(sublime_plugin.EventListener):
+    def on_activated(self, view: View) -> None:
+        window = view.window()
+        if window is not None:
+            progress = PROGRESS.get(window.id())
+            if progress is not None and progress.finished is None:
+                show_progress(window.id())
+
+
+def plugin_unloaded():
+    RUNNER.cancel()
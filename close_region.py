@@ -1,6 +1,10 @@
 import sublime
 import sublime_plugin
 
+from .completions import document
+from .plugins.lib.instrumentation import INSTRUMENTATION
+
+@INSTRUMENTATION.instrument
 class CloseRegionCommand(sublime_plugin.TextCommand):
     def run(self, edit: sublime.Edit) -> None:
         sel = self.view.sel()
@@ -11,12 +15,13 @@ class CloseRegionCommand(sublime_plugin.TextCommand):
         s = sel[0]
         line_region = self.view.line(s.end())
 
-        for kind in ("global", "module-set", "module", "options"):
-            scope = "meta.block.%s.kdesrc-build" % kind
-            if self.view.match_selector(s.end(), "%s - meta.expected - comment" % scope):
-                replacement = "end %s\n" % kind
-                self.view.replace(edit, line_region, replacement)
-                break;
+        if not self.view.match_selector(s.end(), "meta.block - meta.expected - comment"):
+            return
+
+        block = document(self.view).block_at(self.view.rowcol(s.end())[0])
+        if block is not None:
+            replacement = "end %s\n" % block.kind.value
+            self.view.replace(edit, line_region, replacement)
 
     def is_enabled(self):
         return self.view.match_selector(0, "source.kdesrc-build")
@@ -1,28 +1,56 @@
-from dataclasses import dataclass
-from enum import Enum
+from dataclasses import dataclass, field
 import html
 import json
 import multiprocessing
 from pathlib import Path
 import os
+import shutil
 import subprocess
-from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Type, Union, Tuple
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set, Type, Union, Tuple
 from urllib.parse import urljoin
 
+IMPORT_STARTED = time.perf_counter()
+
 import sublime
 import sublime_plugin
 from sublime import View, CompletionItem, CompletionList, Region, Window
 
 from .plugins.lib import *
+from .plugins.lib.computed import ComputedValue
+from .plugins.lib.depgraph import DependencyGraph, dependency_data_file
+from .plugins.lib.diagnostics import Diagnostic, Linter, ERROR, INFO, WARNING
+from .plugins.lib.fscache import DIRECTORY_CACHE, STAT_CACHE, DirectoryListing
+from .plugins.lib.fuzzy import FuzzyIndex, RecentNames
+from .plugins.lib.instrumentation import INSTRUMENTATION
 from .plugins.lib.langs import LANGUAGES
+from .plugins.lib.logview import is_large_log
+from .plugins.lib.modulecache import ModuleListCache, find_rc_file, metadata_dir, module_list_key, stream_module_list
+from .plugins.lib.persistent import ModuleState, PersistentData, default_persistent_data_files
+from .plugins.lib.rcparser import Block, Document, OptionEntry
+from .plugins.lib.repometadata import Project, RepoMetadataIndex
+from .plugins.lib.workspace import Symbol, WorkspaceIndex, module_definitions_dir
+from .plugins.lib.tracking import DirtyLines, changed_regions, find_by_selector_in, overlaps
 
 Point = int
 HoverZone = int
 OptionType = Type[Union[bool, int, str, Path]]
 
 KDESRC_BUILD_SYNTAX = f"Packages/{__package__}/kdesrc-build.sublime-syntax"
-KDESRC_BUILD_DOCS_JSON = f"Packages/{__package__}/plugins/conf_options.json"
+KDESRC_BUILD_REGISTRY_JSON = f"Packages/{__package__}/plugins/conf_registry.json"
+KDESRC_BUILD_DOCS_JSONL = f"Packages/{__package__}/plugins/conf_docs.jsonl"
 INCLUDE_KEY = "include"
+LINK_SCOPE = "string.unquoted.kdesrc-build"
+OUTPUT_SYNTAX = f"Packages/{__package__}/kdesrc-build - output.sublime-syntax"
+# Paths to logs in the output of kdesrc-build.
+OUTPUT_LINK_SCOPE = "source.build_output.kdesrc-build entity.name.filename"
+SETTINGS_FILE = "kdesrc-build.sublime-settings"
+
+# Delay between the last keystroke and re-checking file links, in milliseconds.
+REFRESH_DELAY = 300
+
+LINKS_DIRTY = DirtyLines("kdesrc-build-links-dirty")
 
 DOCUMENT_LINK_FLAGS = sublime.HIDE_ON_MINIMAP | sublime.DRAW_NO_FILL | sublime.DRAW_NO_OUTLINE | sublime.DRAW_SOLID_UNDERLINE  # noqa: E501
 
@@ -73,24 +101,6 @@ POPUP_TEMPLATE = """
 </body>
 """
 
-class ScopeType(Enum):
-    GLOBAL = "global"
-    MODULE_SET = "module-set"
-    MODULE = "module"
-    OPTIONS = "options"
-
-    def may_contain(self, restricted: ScopeRestriction):
-        if restricted == ScopeRestriction.ANY:
-            return True
-        elif restricted == (ScopeRestriction.GLOBAL | ScopeRestriction.MODULE_SET):
-            return self in (ScopeType.MODULE_SET, ScopeType.OPTIONS)
-        elif restricted == ScopeRestriction.GLOBAL:
-            return self == ScopeType.GLOBAL
-        elif restricted == ScopeRestriction.MODULE_SET:
-            return self == ScopeType.MODULE_SET
-        else:
-            return True
-
 CompletionData = Union[int, str, CompletionItem]
 
 @dataclass
@@ -102,9 +112,18 @@ class OptionDescriptor:
     default: Any = None
     default_fn: Optional[Callable[[], Any]] = None
     doc: str = ""
+    doc_index: int = -1
     anchor: str = ""
     since: str = ""
     deprecated: bool = False
+    strict: bool = False
+    # (cache key, items) of prebuilt value completions
+    _values_cache: Optional[Tuple[Any, List[CompletionItem]]] = field(default=None, init=False, repr=False, compare=False)
+
+    def get_doc(self) -> str:
+        if not self.doc and self.doc_index >= 0:
+            self.doc = load_doc(self.doc_index)
+        return self.doc
 
     def fill(self, item: CompletionItem, value: Any, short: bool = False) -> CompletionItem:
         if self.deprecated:
@@ -128,9 +147,14 @@ class OptionDescriptor:
         if self.default is not None:
             output += "<h2>Default: {}</h2>".format(html.escape(sublime.encode_value(self.default)))
         elif self.default_fn is not None:
-            output += "<h2>Default: {}</h2>".format(html.escape(sublime.encode_value(self.default_fn())))
-        if self.doc:
-            output += "<p>{}</p>".format(self.doc)  # deliberately do not escape
+            default = self.default_fn()
+            if default is None:
+                output += "<h2>Default: computing…</h2>"
+            else:
+                output += "<h2>Default: {}</h2>".format(html.escape(sublime.encode_value(default)))
+        doc = self.get_doc()
+        if doc:
+            output += "<p>{}</p>".format(doc)  # deliberately do not escape
         if self.since:
             output += "<h2>Since: {}</h2>".format(html.escape(self.since))
         if self.anchor:
@@ -138,6 +162,52 @@ class OptionDescriptor:
             output += '<p><a href="{}">Read more at kdesrc-build website</a></p>'.format(href)
         return output
 
+    def bool_completions(self) -> List[CompletionItem]:
+        key = ("bool", self.get_default())
+        if self._values_cache is None or self._values_cache[0] != key:
+            self._values_cache = (key, [
+                self.fill(CompletionItem("true", kind=sublime.KIND_VARIABLE), True, short=True),
+                self.fill(CompletionItem("false", kind=sublime.KIND_VARIABLE), False, short=True),
+            ])
+        return self._values_cache[1]
+
+    def value_completions(self) -> List[CompletionItem]:
+        """Sorted choices and the default value, rebuilt only when either of them changes."""
+        key = (CHOICES_GENERATION, self.get_default())
+        hit = self._values_cache is not None and self._values_cache[0] == key
+        INSTRUMENTATION.count("value completions", hit)
+        if hit:
+            return self._values_cache[1]
+
+        def sort_key(choice: CompletionData) -> Union[int, str]:
+            if isinstance(choice, int):
+                assert self.type is int
+                return choice
+            if isinstance(choice, str):
+                return choice
+            if isinstance(choice, CompletionItem):
+                return choice.trigger
+
+        def item(pair: Tuple[Union[int, str], CompletionData]) -> CompletionItem:
+            choice = pair[1]
+            if isinstance(choice, CompletionItem):
+                return choice
+            else:
+                assert isinstance(choice, (int, str))
+                return CompletionItem(str(choice), kind=sublime.KIND_VARIABLE)
+
+        choices = { sort_key(c): c for c in self.choices }
+        c = self.get_default()
+        if c is not None:
+            choices[sort_key(c)] = c
+
+        items = [
+            self.fill(choice, choice.trigger, short=True)
+            for choice in map(item, sorted(choices.items()))
+        ]
+        self._values_cache = (key, items)
+        return items
+
     def has_default(self) -> bool:
         return self.default is not None or self.default_fn is not None
 
@@ -200,131 +270,119 @@ class KdesrcBuildResolveDocsCommand(sublime_plugin.TextCommand):
 
         sublime.set_timeout(run_main)
 
-CMAKE_GENERATORS = (
-    "Unix Makefiles",
-    "Ninja",
-    "Ninja Multi-Config",
-    "CodeBlocks - Ninja",
-    "CodeBlocks - Unix Makefiles",
-    "CodeLite - Ninja",
-    "CodeLite - Unix Makefiles",
-    "Eclipse CDT4 - Ninja",
-    "Eclipse CDT4 - Unix Makefiles",
-    "Kate - Ninja",
-    "Kate - Unix Makefiles",
-    "Sublime Text 2 - Ninja",
-    "Sublime Text 2 - Unix Makefiles",
-)
-
 def default_git_user() -> str:
     try:
-        return subprocess.check_output('echo "$(git config user.name) <$(git config user.email)>"', shell=True, text=True).strip()
+        with INSTRUMENTATION.timed("subprocess: git config"):
+            return subprocess.check_output('echo "$(git config user.name) <$(git config user.email)>"', shell=True, text=True).strip()
     except subprocess.SubprocessError as e:
         return "User Name <email@example.com>"
 
 MODULES: Set[CompletionData] = set()
 """Global set of modules, will be filled asynchronously later."""
 
+CHOICES_GENERATION = 0
+"""Bumped whenever dynamic choices (such as MODULES) change, to invalidate prebuilt completions."""
+
+def bump_choices_generation() -> None:
+    global CHOICES_GENERATION
+    CHOICES_GENERATION += 1
+
+GIT_USER = ComputedValue(
+    default_git_user,
+    ttl=10 * 60,
+    watch=("~/.gitconfig", "~/.config/git/config"),
+    schedule=sublime.set_timeout_async,
+    on_ready=lambda value: sublime.set_timeout(bump_choices_generation),
+)
+"""Spawning git on every hover and completion is way too slow, so it is memoized."""
+
+CPU_CHOICES = list(range(1, multiprocessing.cpu_count() + 1))
+
+OPTION_TYPES: Dict[str, OptionType] = {
+    "bool": bool,
+    "int": int,
+    "str": str,
+    "path": Path,
+}
+
+# Choices and defaults which depend on the machine or on the user's setup,
+# everything else comes precompiled from plugins/gen_conf_options.py.
+DYNAMIC_OPTIONS: Dict[str, Dict[str, Any]] = {
+    "git-user": { "default_fn": GIT_USER.get },
+    "ignore-modules": { "choices": MODULES },
+    "kde-languages": { "choices": LANGUAGES },
+    "num-cores": { "choices": CPU_CHOICES },
+    "num-cores-low-mem": { "choices": CPU_CHOICES },
+}
+
+# Startup budgets, in seconds. Exceeding them is reported in the console.
+IMPORT_BUDGET = 0.05
+REGISTRY_BUDGET = 0.02
+FIRST_COMPLETION_BUDGET = 0.05
+
+REGISTRY_LOCK = threading.Lock()
+FIRST_COMPLETION_DONE = False
+
+
+def check_budget(what: str, elapsed: float, budget: float) -> None:
+    if elapsed > budget:
+        print("WARNING: kdesrc-build: {} took {:.1f} ms, budget is {:.1f} ms".format(what, elapsed * 1000, budget * 1000))
+
+
 # See https://docs.kde.org/trunk5/en/kdesrc-build/kdesrc-build/conf-options-table.html
 def ensure_registry():
     global OPTION_DESCRIPTOR_REGISTRY
     if len(OPTION_DESCRIPTOR_REGISTRY) != 0:
         return
 
-    REGISTRY_LIST = [
-        # apidox: Removed in 1.6.3
-        # apply-qt-patches: Removed in 1.10
-        OptionDescriptor("async",                           type=bool, default=True, since="1.6"),
-        OptionDescriptor("binpath",                         type=Path),
-        OptionDescriptor("branch",                          type=str),
-        OptionDescriptor("branch-group",                    type=str,  default="kf5-qt5", choices=("kf5-qt5",), since="1.16-pre2"),
-        OptionDescriptor("build-dir",                       type=Path, default="build"),
-        OptionDescriptor("build-when-unchanged",            type=bool),
-        OptionDescriptor("checkout-only",                   type=bool),
-        OptionDescriptor("cmake-generator",                 type=str, default="Unix Makefiles", choices=CMAKE_GENERATORS),
-        OptionDescriptor("cmake-toolchain",                 type=str),
-        OptionDescriptor("cmake-options",                   type=str),
-        OptionDescriptor("colorful-output",                 type=bool, default=True),
-        OptionDescriptor("compile-commands-export",         type=bool, default=True),
-        OptionDescriptor("compile-commands-linking",        type=bool, default=False),
-        OptionDescriptor("configure-flags",                 type=str),
-        OptionDescriptor("custom-build-command",            type=str),
-        OptionDescriptor("cxxflags",                        type=str),
-        OptionDescriptor("dest-dir",                        type=str),
-        OptionDescriptor("disable-agent-check",             type=bool, default=False),
-        OptionDescriptor("do-not-compile",                  type=str),
-        OptionDescriptor("git-desired-protocol",            type=str, choices=("git", "https"), default="git", since="1.16"),
-        OptionDescriptor("git-repository-base",             type=str, since="1.12.1"),
-        OptionDescriptor("git-user",                        type=str, default_fn=default_git_user, since="15.09"),
-        OptionDescriptor("http-proxy",                      type=str, since="1.16"),
-        OptionDescriptor("ignore-kde-structure",            type=bool, deprecated=True),
-        OptionDescriptor("directory-layout",                type=str, default="metadata", choices=("flat", "invent", "metadata")),  # docs lie about "flat" being the default one
-        OptionDescriptor("ignore-modules",                  type=str, choices=MODULES, since="1.16"),
-        OptionDescriptor("include-dependencies",            type=bool, default=True),
-        OptionDescriptor("install-after-build",             type=bool, default=True),
-        OptionDescriptor("install-environment-driver",      type=bool, default=True, since="17.08"),
-        OptionDescriptor("install-session-driver",          type=bool, default=True, since="1.16"),
-        OptionDescriptor("kdedir",                          type=Path, default="~/kde", choices=("/usr/local/kde")),
-        OptionDescriptor("kde-languages",                   type=str, choices=LANGUAGES),
-        OptionDescriptor("libpath",                         type=Path),
-        OptionDescriptor("log-dir",                         type=Path),
-        OptionDescriptor("make-install-prefix",             type=Path),
-        OptionDescriptor("make-options",                    type=str),
-        OptionDescriptor("manual-build",                    type=bool, default=False),
-        OptionDescriptor("manual-update",                   type=bool, default=False),
-        OptionDescriptor("module-base-path",                type=str, choices=("trunk/$module", "trunk/KDE/$module")),
-        OptionDescriptor("niceness",                        type=int, default=10, choices=list(range(0, 20 + 1))),
-        OptionDescriptor("ninja-options",                   type=str),
-        OptionDescriptor("no-svn",                          type=bool, default=False),
-        OptionDescriptor("num-cores",                       type=int, default=4, choices=list(range(1, multiprocessing.cpu_count() + 1)), since="20.07"),
-        OptionDescriptor("num-cores-low-mem",               type=int, default=2, choices=list(range(1, multiprocessing.cpu_count() + 1)), since="20.07"),
-        OptionDescriptor("override-build-system",           type=str, choices=("KDE", "Qt", "qmake", "generic", "autotools", "meson"), since="1.16"),
-        OptionDescriptor("override-url",                    type=str),
-        OptionDescriptor("persistent-data-file",            type=Path, default="~/.local/state/kdesrc-build-data", choices=("~/.config/kdesrc-build-data", "~/.local/state/kdesrc-build-data",), since="1.15"),
-        OptionDescriptor("prefix",                          type=Path),
-        OptionDescriptor("purge-old-logs",                  type=bool, default=True),
-        OptionDescriptor("qmake-options",                   type=str, since="1.16"),
-        OptionDescriptor("qtdir",                           type=Path),
-        OptionDescriptor("remove-after-install",            type=str, default="none", choices=("none", "builddir", "all")),
-        OptionDescriptor("repository",                      type=str, since="1.10"),
-        OptionDescriptor("revision",                        type=str),
-        OptionDescriptor("run-tests",                       type=bool, default=False),
-        OptionDescriptor("set-env",                         type=str),
-        OptionDescriptor("source-dir",                      type=Path, default="~/kdesrc", choices=("~/kde/src",)),
-        OptionDescriptor("ssh-identity-file",               type=Path),
-        OptionDescriptor("stop-on-failure",                 type=bool, default=False),
-        OptionDescriptor("svn-server",                      type=str),
-        OptionDescriptor("tag",                             type=str),
-        OptionDescriptor("use-clean-install",               type=bool, default=False, since="1.12"),
-        OptionDescriptor("use-idle-io-priority",            type=bool, default=False, since="1.12"),
-        OptionDescriptor("use-inactive-modules",            type=bool, default=False, since="1.12"),
-        OptionDescriptor("use-modules",                     type=str, since="1.12.1"),
-    ]
-
-    docs_list = json.loads(sublime.load_resource(KDESRC_BUILD_DOCS_JSON), cls=OptionDecoder)  # type: List[Option]
-    docs = { option.name: option for option in docs_list }  # type: Dict[str, Option]
-
-    options = {}
-    for option in REGISTRY_LIST:
-        if option.name in options:
-            print("WARNING: Duplicated option", option.name)
-
-        doc = docs.pop(option.name, None)
-        if doc is None:
-            print("WARNING: Undocumented option", option.name)
+    with REGISTRY_LOCK:
+        # might have been built by another thread while we were waiting for the lock
+        if len(OPTION_DESCRIPTOR_REGISTRY) != 0:
+            return
+
+        started = time.perf_counter()
+        table = json.loads(sublime.load_resource(KDESRC_BUILD_REGISTRY_JSON))
+
+        options = {}
+        for name, scope, anchor, kind, default, choices, since, deprecated, strict, doc_index in table["options"]:
+            fields = dict(
+                type=OPTION_TYPES[kind],
+                scope=ScopeRestriction(scope),
+                choices=tuple(choices),
+                default=default,
+                doc_index=doc_index,
+                anchor=anchor,
+                since=since,
+                deprecated=deprecated,
+                strict=strict,
+            )  # type: Dict[str, Any]
+            # runtime values take precedence over the precompiled ones
+            fields.update(DYNAMIC_OPTIONS.get(name, {}))
+            options[name] = OptionDescriptor(name, **fields)
+
+        OPTION_DESCRIPTOR_REGISTRY = options
+        check_budget("Loading options registry", time.perf_counter() - started, REGISTRY_BUDGET)
 
-        else:
-            if not option.doc:
-                option.doc = doc.notes
-            option.scope = doc.scope
-            option.anchor = doc.anchor
 
-        options[option.name] = option
+DOCS_LINES: Optional[List[str]] = None
+"""Raw lines of the docs file, each one is decoded on demand."""
 
-    if len(docs) != 0:
-        print("WARNING: Missing options", docs.keys())
+def docs_lines() -> List[str]:
+    global DOCS_LINES
+    if DOCS_LINES is None:
+        DOCS_LINES = sublime.load_resource(KDESRC_BUILD_DOCS_JSONL).splitlines()
+    return DOCS_LINES
 
-    OPTION_DESCRIPTOR_REGISTRY = options
+
+def load_doc(index: int) -> str:
+    return json.loads(docs_lines()[index])[1]
+
+
+def warm_registry():
+    ensure_registry()
+    load_doc(0)
+    for scope in ScopeType:
+        name_index(scope)
 
 
 def registry() -> Dict[str, OptionDescriptor]:
@@ -337,137 +395,626 @@ OPTION_DESCRIPTOR_REGISTRY = {}
 FALLBACK_OPTION_DESCRIPTOR = OptionDescriptor(name="Unknown option", type=str, scope=ScopeRestriction.ANY)
 
 
+# Completions return only this many best matches, and are queried again as the prefix changes.
+MAX_COMPLETIONS = 50
+
+RANKED_COMPLETION_FLAGS = sublime.INHIBIT_WORD_COMPLETIONS | sublime.INHIBIT_REORDER | sublime.DYNAMIC_COMPLETIONS
+
+RECENT_NAMES = RecentNames()
+"""Option and module names completed recently, they rank higher."""
+
+COMMIT_COMMANDS = ("commit_completion", "insert_best_completion")
+
+
+class OptionNameIndex:
+    """
+    Names of options allowed in one kind of block, indexed for ranked fuzzy
+    lookups, along with their prebuilt completion items.
+    """
+
+    def __init__(self, scope: ScopeType, options: Iterable[OptionDescriptor]) -> None:
+        options = sorted((option for option in options if scope.may_contain(option.scope)),
+                         key=lambda option: option.name)
+        self.index = FuzzyIndex([option.name for option in options])
+        self.items = tuple(
+            option.fill(CompletionItem(option.name, completion=option.name + ' ', kind=sublime.KIND_VARIABLE), option.name, short=True)
+            for option in options
+        )
+
+    def complete(self, prefix: str) -> List[CompletionItem]:
+        return [self.items[i] for i in self.index.search(prefix, MAX_COMPLETIONS, RECENT_NAMES)]
+
+
+NAME_INDEXES: Dict[ScopeType, OptionNameIndex] = {}
+
+def name_index(scope: ScopeType) -> OptionNameIndex:
+    index = NAME_INDEXES.get(scope)
+    if index is None:
+        index = NAME_INDEXES[scope] = OptionNameIndex(scope, registry().values())
+    return index
+
+
 def get_option_descriptor(option: str) -> OptionDescriptor:
     descriptor = registry().get(option, FALLBACK_OPTION_DESCRIPTOR)
     return descriptor
 
+def settings() -> sublime.Settings:
+    return sublime.load_settings(SETTINGS_FILE)
+
+
+def kdesrc_build_executable() -> str:
+    """The configured kdesrc-build, or the one on PATH."""
+    return settings().get("kdesrc_build_executable") or shutil.which("kdesrc-build") or "kdesrc-build"
+
+
 def is_applicable(settings: sublime.Settings) -> bool:
     return settings.get("syntax") == KDESRC_BUILD_SYNTAX
 
-def get_region(view: View, pt: Point) -> Optional[ScopeType]:
-    if view.match_selector(pt, "meta.block.global.kdesrc-build"):
-        return ScopeType.GLOBAL
-    elif view.match_selector(pt, "meta.block.module-set.kdesrc-build"):
-        return ScopeType.MODULE_SET
-    elif view.match_selector(pt, "meta.block.module.kdesrc-build"):
-        return ScopeType.MODULE
-    elif view.match_selector(pt, "meta.block.options.kdesrc-build"):
-        return ScopeType.OPTIONS
+MODEL_DIRTY = DirtyLines("kdesrc-build-model-dirty")
+
+DOCUMENTS: Dict[int, Tuple[int, Document]] = {}
+"""Parsed document and the change count it was parsed at, by view id."""
+
+def document(view: View) -> Document:
+    """Return up to date document model of the view, re-parsing it from the first changed line."""
+    change_count = view.change_count()
+    cached = DOCUMENTS.get(view.id())
+    INSTRUMENTATION.count("documents", cached is not None and cached[0] == change_count)
+    if cached is not None and cached[0] == change_count:
+        return cached[1]
+
+    dirty = MODEL_DIRTY.take(view)
+    text = view.substr(Region(0, view.size()))
+    if cached is None:
+        doc = Document.from_text(text)
     else:
+        doc = cached[1]
+        first_line = view.rowcol(dirty[0].begin())[0] if len(dirty) != 0 else 0
+        doc.update_text(text, first_line)
+
+    DOCUMENTS[view.id()] = (change_count, doc)
+    return doc
+
+def get_region(view: View, pt: Point) -> Optional[ScopeType]:
+    block = document(view).block_at(view.rowcol(pt)[0])
+    if block is None:
         return None
+    return block.kind
+
+def get_block_header_at(view: View, pt: Point) -> Optional[Block]:
+    """Return block whose header the point is on, past its keyword."""
+    row, col = view.rowcol(pt)
+    block = document(view).block_at(row)
+    if block is None or block.line != row or col <= block.col + len(block.kind.value):
+        return None
+    return block
+
+def get_known_option_at_line(view: View, pt: Point) -> Optional[OptionEntry]:
+    """Return option which starts on the line, if it is known and allowed in its block."""
+    row = view.rowcol(pt)[0]
+    doc = document(view)
+    block = doc.block_at(row)
+    if block is None:
+        return None
+    option = block.option_at(row)
+    if option is None or option.line != row:
+        return None
+    descriptor = registry().get(option.key)
+    if descriptor is None or not block.kind.may_contain(descriptor.scope):
+        return None
+    return option
 
 def get_key_region_at(view: View, pt: Point) -> Union[None, Region]:
     """Return the key region if point is on a settings key or None."""
-    if view.match_selector(pt, KEY_SCOPE):
-        for region in view.find_by_selector(KEY_SCOPE):
-            if region.contains(pt):
-                return region
+    option = get_known_option_at_line(view, pt)
+    if option is None:
+        return None
+    begin = view.text_point(option.line, option.col)
+    region = Region(begin, begin + len(option.key))
+    if region.contains(pt):
+        return region
     return None
 
-KEY_SCOPE = "support.function.kdesrc-build"
-
 def get_known_option_name_at_line(view: View, pt: Point) -> Optional[str]:
-    for region in view.find_by_selector(KEY_SCOPE):
-        line = view.line(region)
-        if line.contains(pt):
-            return view.substr(region)
+    option = get_known_option_at_line(view, pt)
+    if option is not None:
+        return option.key
     return None
 
 def get_known_option_name_at_location(view: View, pt: Point) -> Optional[Region]:
-    for region in view.find_by_selector(KEY_SCOPE):
-        if region.contains(pt):
-            return region
-    return None
+    return get_key_region_at(view, pt)
 
 
 def get_include_dirs(view: View, skip: Point) -> Tuple[str, List[str]]:
-    includes = view.find_by_selector("keyword.import.kdesrc-build")
+    skip_row = view.rowcol(skip)[0]
 
     mine = ""
     others = []
 
-    for include in includes:
-        line = view.line(include.end())
-        overshoot = Region(include.end(), line.end())
-        path = view.substr(overshoot).strip()
-        if line.contains(skip):
-            mine = path
+    for include in document(view).includes:
+        if include.line == skip_row:
+            mine = include.path
         else:
-            base = os.path.dirname(path)
+            base = os.path.dirname(include.path)
             if len(base) != 0:
                 others.append(base)
 
     return (mine, others)
 
+FILESYSTEM_COMPLETIONS: Optional[Tuple[DirectoryListing, List[CompletionItem]]] = None
+"""Completion items built for the most recent directory listing."""
+
 def get_filesystem_completions(folder: str) -> List[CompletionItem]:
-    try:
-        items = os.listdir(folder)
-    except IOError:
+    global FILESYSTEM_COMPLETIONS
+
+    with INSTRUMENTATION.timed("filesystem: list include directory"):
+        listing = DIRECTORY_CACHE.listing(folder)
+    if listing is None:
         return []
 
-    dirs = []
-    files = []
-    others = []
-    for item in items:
-        path = os.path.join(folder, item)
-        try:
-            if os.path.isdir(path):
-                dirs.append(item)
-            elif os.path.isfile(path):
-                files.append(item)
-            else:
-                others.append(item)
-        except IOError:
-            pass
-    dirs.sort()
-    files.sort()
-    others.sort()
+    cached = FILESYSTEM_COMPLETIONS
+    if cached is not None and cached[0] is listing:
+        return cached[1]
 
     completions = []
-    for item in dirs:
+    for item in listing.dirs:
         completions.append(CompletionItem(item, completion=item + '/', kind=sublime.KIND_NAMESPACE))
-    for item in files:
+    for item in listing.files:
         completions.append(CompletionItem(item, completion=item, kind=sublime.KIND_FUNCTION))
-    for item in others:
+    for item in listing.others:
         completions.append(CompletionItem(item, completion=item, kind=sublime.KIND_AMBIGUOUS))
 
+    FILESYSTEM_COMPLETIONS = (listing, completions)
     return completions
 
 
 def plugin_loaded():
-    sublime.set_timeout_async(query_modules)
+    check_budget("Importing completions", IMPORT_TIME, IMPORT_BUDGET)
+    GIT_USER.refresh()
+    sublime.set_timeout_async(warm_registry)
+    sublime.set_timeout_async(load_modules)
+    PROJECTS.refresh()
+    DEPENDENCY_GRAPH.refresh()
+    sublime.set_timeout_async(refresh_workspace)
+    sublime.set_timeout_async(PERSISTENT_DATA.revalidate)
+
+
+WORKSPACE = WorkspaceIndex()
+"""Include graph and symbols of the user's configuration, indexed on the async thread."""
+
+# Options whose values are lists of module names.
+MODULE_LIST_OPTIONS = ("use-modules", "ignore-modules")
+
+
+def open_config_files() -> List[str]:
+    """Paths of kdesrc-build configuration files open in any window."""
+    paths = []  # type: List[str]
+    for window in sublime.windows():
+        for view in window.views():
+            path = view.file_name()
+            if path is not None and is_applicable(view.settings()):
+                paths.append(path)
+    return paths
+
+
+def refresh_workspace(*extra_roots: str) -> None:
+    if "module-definitions-dir" not in WORKSPACE.variables:
+        WORKSPACE.variables["module-definitions-dir"] = module_definitions_dir(kdesrc_build_executable()) or ""
+
+    roots = list(extra_roots)
+    rc = find_rc_file()
+    if rc is not None:
+        roots.append(rc)
+    # files opened in the editor might not be reachable from the main configuration,
+    # anything else is found by following includes, so that dropped files leave the index
+    roots.extend(open_config_files())
+    with INSTRUMENTATION.timed("filesystem: index workspace"):
+        WORKSPACE.refresh(roots)
+    lint_workspace()
+
+
+def global_options(*names: str) -> Dict[str, str]:
+    """Values of options set in the global block of the configuration, must run on the async thread."""
+    found = {}  # type: Dict[str, str]
+    rc = find_rc_file()
+    if rc is None:
+        return found
+
+    rc = os.path.normpath(rc)
+    if rc not in WORKSPACE.graph:
+        refresh_workspace()
+    doc = WORKSPACE.document(rc)
+    if doc is not None:
+        for block in doc.blocks_of(ScopeType.GLOBAL):
+            for name in names:
+                option = block.get(name)
+                if option is not None and option.value:
+                    found[name] = option.value
+    return found
+
+
+def locate_persistent_data() -> Optional[str]:
+    """Path of kdesrc-build's persistent-data-file, must run on the async thread."""
+    configured = global_options("persistent-data-file").get("persistent-data-file")
+    if configured is not None:
+        return os.path.expanduser(configured)
+    for path in default_persistent_data_files(find_rc_file()):
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+PERSISTENT_DATA = PersistentData(locate_persistent_data, sublime.set_timeout_async)
+"""Last build status of modules, for hovers."""
+
+INSTRUMENTATION.watch_cache("stat", lambda: (STAT_CACHE.hits, STAT_CACHE.misses))
+INSTRUMENTATION.watch_cache("directory listings", lambda: (DIRECTORY_CACHE.hits, DIRECTORY_CACHE.misses))
+
+
+def render_module_state(state: ModuleState) -> str:
+    if state.failure_count > 0:
+        status = "Failed to build {} time{} in a row".format(state.failure_count, "" if state.failure_count == 1 else "s")
+    elif state.status == "succeeded":
+        status = "Last build succeeded"
+    else:
+        status = "Not built yet"
+
+    body = "<h1>module {}</h1>".format(html.escape(state.name))
+    body += "<p>{}</p>".format(status)
+    if state.last_build_rev:
+        body += "<h2>Built revision: {}</h2>".format(html.escape(state.last_build_rev[:12]))
+    if state.last_install_rev and state.last_install_rev != state.last_build_rev:
+        body += "<h2>Installed revision: {}</h2>".format(html.escape(state.last_install_rev[:12]))
+    return body
+
+
+LINT_DIRTY = DirtyLines("kdesrc-build-lint-dirty")
+
+DIAGNOSTIC_STYLES = {
+    ERROR: ("kdesrc-build-errors", "region.redish"),
+    WARNING: ("kdesrc-build-warnings", "region.orangish"),
+    INFO: ("kdesrc-build-info", "region.bluish"),
+}
+
+DIAGNOSTIC_FLAGS = sublime.DRAW_SQUIGGLY_UNDERLINE | sublime.DRAW_NO_FILL | sublime.DRAW_NO_OUTLINE | sublime.HIDE_ON_MINIMAP  # noqa: E501
+
+
+class ViewLinter:
+    """Own copy of a view's document, parsed and validated on the async thread only."""
+
+    def __init__(self) -> None:
+        self.doc: Optional[Document] = None
+        self.linter = Linter(registry().get)
+
+    def update(self, text: str, first_line: int) -> List[Diagnostic]:
+        if self.doc is None:
+            self.doc = Document.from_text(text)
+        else:
+            self.doc.update_text(text, first_line)
+        return self.linter.lint(self.doc)
+
+
+VIEW_LINTERS: Dict[int, ViewLinter] = {}
+"""By view id, only accessed from the async thread."""
+
+LINTED: Dict[int, int] = {}
+"""Change count each view was last sent for validation at, by view id."""
+
+VIEW_DIAGNOSTICS: Dict[str, List[Diagnostic]] = {}
+"""Diagnostics of files open in the editor, by path, these take precedence over the saved contents."""
+
+WORKSPACE_LINTERS: Dict[str, Linter] = {}
+WORKSPACE_DIAGNOSTICS: Dict[str, List[Diagnostic]] = {}
+
+
+def lint_workspace() -> None:
+    """Validate every file of the include graph, must run on the async thread."""
+    global WORKSPACE_DIAGNOSTICS
+
+    diagnostics = {}
+    for path in WORKSPACE.files():
+        doc = WORKSPACE.document(path)
+        if doc is None:
+            continue
+        linter = WORKSPACE_LINTERS.get(path)
+        if linter is None:
+            linter = WORKSPACE_LINTERS[path] = Linter(registry().get)
+        diagnostics[path] = linter.lint(doc)
+
+    for path in list(WORKSPACE_LINTERS.keys()):
+        if path not in diagnostics:
+            del WORKSPACE_LINTERS[path]
+
+    WORKSPACE_DIAGNOSTICS = diagnostics
+
+
+def publish_diagnostics(view: View, diagnostics: List[Diagnostic]) -> None:
+    """Replace diagnostics of the view, one add_regions call per severity."""
+    grouped: Dict[str, Tuple[List[Region], List[str]]] = { severity: ([], []) for severity in DIAGNOSTIC_STYLES }
+    for diagnostic in diagnostics:
+        begin = view.text_point(diagnostic.line, diagnostic.col)
+        end = view.text_point(diagnostic.line, max(diagnostic.end_col, diagnostic.col + 1))
+        regions, annotations = grouped[diagnostic.severity]
+        regions.append(Region(begin, end))
+        annotations.append(html.escape(diagnostic.message))
+
+    for severity, (key, scope) in DIAGNOSTIC_STYLES.items():
+        regions, annotations = grouped[severity]
+        view.add_regions(key, regions, scope=scope, flags=DIAGNOSTIC_FLAGS,
+                         annotations=annotations, annotation_color=view.style_for_scope(scope).get("foreground", ""))
+
+
+def get_module_name_at(view: View, pt: Point) -> Optional[str]:
+    """Return name of a module or module set under the point, if any."""
+    row = view.rowcol(pt)[0]
+    block = document(view).block_at(row)
+    if block is None:
+        return None
+
+    if block.line == row:
+        return block.name or None
+
+    option = block.option_at(row)
+    if option is None or option.key not in MODULE_LIST_OPTIONS:
+        return None
+    if option.line == row and pt < view.text_point(row, option.value_col):
+        return None
+
+    name = view.substr(view.word(pt)).strip()
+    if name:
+        return name
+    return None
+
+
+# Publish streamed modules to the main thread in batches of this size.
+MODULES_BATCH = 50
+
+
+def module_list_cache() -> ModuleListCache:
+    return ModuleListCache(os.path.join(sublime.cache_path(), __package__, "modules.json"))
+
+
+def publish_modules(modules: List[str], replace: bool = False) -> None:
+    """Update MODULES on the main thread, which is where completions iterate over it."""
+    def run_main() -> None:
+        if replace:
+            MODULES.clear()
+        MODULES.update(modules)
+        bump_choices_generation()
+        fill_pending_module_completions()
+
+    sublime.set_timeout(run_main)
+
+
+MODULES_LOADING = True
+"""Whether kdesrc-build might still report more modules, only accessed on the main thread."""
+
+
+def load_modules() -> None:
+    try:
+        query_modules()
+    finally:
+        sublime.set_timeout(finish_loading_modules)
+
+
+def finish_loading_modules() -> None:
+    global MODULES_LOADING
+    MODULES_LOADING = False
+    fill_pending_module_completions()
 
 
 def query_modules():
-    if len(MODULES) != 0:
-        return
+    rc = find_rc_file()
+    cache = module_list_cache()
+    key = None
+
+    if rc is not None:
+        # taken before kdesrc-build runs, so that edits made while it runs invalidate what it lists
+        key = module_list_key(rc)
+        entry = cache.load(rc)
+        if entry is not None:
+            # serve stale data right away, revalidate below if needed
+            publish_modules(entry["modules"])
+            if cache.is_fresh(entry, key):
+                sublime.status_message("kdesrc-build: Loaded list of modules from cache")
+                return
 
+    modules = []  # type: List[str]
     try:
-        stdout = subprocess.check_output(["kdesrc-build", "--list-build", "--no-src"], text=True)
-    except subprocess.SubprocessError as e:
+        with INSTRUMENTATION.timed("subprocess: kdesrc-build --list-build"):
+            for module in stream_module_list(kdesrc_build_executable()):
+                modules.append(module)
+                if len(modules) % MODULES_BATCH == 0:
+                    publish_modules(modules[-MODULES_BATCH:])
+    except (OSError, subprocess.SubprocessError) as e:
         sublime.status_message("kdesrc-build: Failed to fetch list of modules")
         return
 
-    # `head -n 1` because kdesrc-build prints this at the end:
-    # No modules to build, exiting.
-    lines = stdout.splitlines()[:-1]
+    # drop modules which are gone since the cached list was made
+    publish_modules(modules, replace=True)
 
-    # each line looks like this:
-    #  ── gammaray : master
-    # or this:
-    #  ── knotes
-    for line in lines:
+    if rc is not None:
         try:
-            module = line.split()[1]  # cut -d' ' -f 3
-            MODULES.add(module)
-        except IndexError:
-            pass
+            cache.save(rc, key, modules)
+        except OSError as e:
+            print("WARNING: Failed to save list of modules:", e)
 
     sublime.status_message("kdesrc-build: Loaded list of modules")
 
 
+REPO_METADATA: Optional[RepoMetadataIndex] = None
+
+
+def load_projects() -> Dict[str, Project]:
+    """Projects of the repo-metadata checkout, must run on the async thread."""
+    global REPO_METADATA
+    if REPO_METADATA is None:
+        REPO_METADATA = RepoMetadataIndex(os.path.join(sublime.cache_path(), __package__, "repo-metadata.json"))
+    with INSTRUMENTATION.timed("filesystem: index repo-metadata"):
+        REPO_METADATA.refresh(metadata_dir())
+    return REPO_METADATA.projects
+
+
+PROJECTS = ComputedValue(
+    load_projects,
+    ttl=60,
+    schedule=sublime.set_timeout_async,
+    on_ready=lambda value: sublime.set_timeout(fill_pending_module_completions),
+)
+"""Checking whether HEAD of the checkout moved is cheap, it is only walked again if it did."""
+
+LOADED_GRAPH: Optional[Tuple[Any, DependencyGraph]] = None
+"""(cache key, graph) of the last dependency data file read."""
+
+
+def load_dependency_graph() -> Optional[DependencyGraph]:
+    """Dependency graph of the branch-group set in the configuration, must run on the async thread."""
+    global LOADED_GRAPH
+    checkout = metadata_dir()
+    if checkout is None:
+        return None
+
+    branch_group = global_options("branch-group").get("branch-group") or get_option_descriptor("branch-group").get_default()
+    path = dependency_data_file(checkout, branch_group)
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        return None
+
+    projects = load_projects()
+    cached = LOADED_GRAPH
+    if cached is not None and cached[0][:2] == (path, mtime) and cached[0][2] is projects:
+        return cached[1]
+
+    try:
+        with INSTRUMENTATION.timed("filesystem: read dependency data"), \
+                open(path, "r", encoding="utf-8", errors="replace") as f:
+            graph = DependencyGraph.parse(f, { name: project.path for name, project in projects.items() })
+    except OSError as e:
+        print("WARNING: Failed to read dependency data:", e)
+        return None
+
+    LOADED_GRAPH = ((path, mtime, projects), graph)
+    return graph
+
+
+DEPENDENCY_GRAPH = ComputedValue(load_dependency_graph, ttl=60, schedule=sublime.set_timeout_async)
+"""Graph of the active branch-group, reloaded only when its file or the projects change."""
+
+# Modules listed in build order previews, the rest is only counted.
+MAX_BUILD_ORDER = 40
+
+
+def render_build_order(names: Sequence[str]) -> str:
+    """Describe what building the modules pulls in with include-dependencies, empty if nothing."""
+    graph = DEPENDENCY_GRAPH.get()
+    if graph is None or len(names) == 0:
+        return ""
+    order = graph.build_order(names)
+    if len(order) <= len(set(names)):
+        return ""
+
+    shown = ", ".join(html.escape(name) for name in order[:MAX_BUILD_ORDER])
+    if len(order) > MAX_BUILD_ORDER:
+        shown += " and {} more".format(len(order) - MAX_BUILD_ORDER)
+    return "<h2>Builds {} modules with dependencies</h2><p>{}</p>".format(len(order), shown)
+
+
+KIND_MODULE = (sublime.KIND_ID_NAMESPACE, "m", "Module")
+
+MODULE_COMPLETIONS: Optional[Tuple[Any, FuzzyIndex, List[CompletionItem]]] = None
+"""(cache key, index, items) of module name completions."""
+
+
+def module_completions(prefix: str) -> List[CompletionItem]:
+    """
+    Best matches among modules listed by kdesrc-build and projects of
+    repo-metadata, which are indexed again only when either of them changes.
+    """
+    global MODULE_COMPLETIONS
+    projects = PROJECTS.get() or {}
+    cached = MODULE_COMPLETIONS
+    hit = cached is not None and cached[0][0] == CHOICES_GENERATION and cached[0][1] is projects
+    INSTRUMENTATION.count("module completions", hit)
+    if not hit:
+        names = sorted(set(map(str, MODULES)).union(projects))
+        items = []
+        for name in names:
+            item = CompletionItem(name, kind=KIND_MODULE)
+            project = projects.get(name)
+            if project is not None:
+                item.annotation = project.path
+                item.details = html.escape(project.description)
+            items.append(item)
+        cached = MODULE_COMPLETIONS = ((CHOICES_GENERATION, projects), FuzzyIndex(names), items)
+
+    _, index, items = cached
+    return [items[i] for i in index.search(prefix, MAX_COMPLETIONS, RECENT_NAMES)]
+
+
+def modules_loading() -> bool:
+    return MODULES_LOADING or not PROJECTS.is_ready()
+
+
+# Stop waiting for modules after that many milliseconds, and complete with whatever is known by then.
+MODULES_WAIT_TIMEOUT = 10000
+
+
+@dataclass
+class PendingModuleCompletions:
+    completion_list: CompletionList
+    prefix: str
+    point: Point
+
+
+PENDING_MODULE_COMPLETIONS: Dict[int, PendingModuleCompletions] = {}
+"""Incomplete module completions waiting for modules to load, by view id, only accessed on the main thread."""
+
+
+def defer_module_completions(view_id: int, prefix: str, point: Point) -> CompletionList:
+    """Return an empty list to be filled once modules matching the prefix are loaded."""
+    cancel_module_completions(view_id)
+    pending = PENDING_MODULE_COMPLETIONS[view_id] = PendingModuleCompletions(CompletionList(), prefix, point)
+
+    def expire() -> None:
+        if PENDING_MODULE_COMPLETIONS.get(view_id) is pending:
+            del PENDING_MODULE_COMPLETIONS[view_id]
+            pending.completion_list.set_completions(module_completions(prefix), RANKED_COMPLETION_FLAGS)
+
+    sublime.set_timeout(expire, MODULES_WAIT_TIMEOUT)
+    return pending.completion_list
+
+
+def cancel_module_completions(view_id: int) -> None:
+    pending = PENDING_MODULE_COMPLETIONS.pop(view_id, None)
+    if pending is not None:
+        pending.completion_list.set_completions([])
+
+
+def fill_pending_module_completions() -> None:
+    """Answer pending module completions which have matches now, or all of them once loading is done."""
+    loading = modules_loading()
+    for view_id, pending in list(PENDING_MODULE_COMPLETIONS.items()):
+        items = module_completions(pending.prefix)
+        if len(items) != 0 or not loading:
+            del PENDING_MODULE_COMPLETIONS[view_id]
+            pending.completion_list.set_completions(items, RANKED_COMPLETION_FLAGS)
+
+
+@INSTRUMENTATION.instrument(also=("refresh_file_regions", "refresh_diagnostics"))
 class KdesrcBuildCompletionsProvider(sublime_plugin.ViewEventListener):
     def on_query_completions(self, prefix: str, locations: List[Point]) -> Union[None, CompletionList]:
+        global FIRST_COMPLETION_DONE
+        if FIRST_COMPLETION_DONE:
+            return self.query_completions(prefix, locations)
+
+        started = time.perf_counter()
+        result = self.query_completions(prefix, locations)
+        check_budget("First completion", time.perf_counter() - started, FIRST_COMPLETION_BUDGET)
+        FIRST_COMPLETION_DONE = True
+        return result
+
+    def query_completions(self, prefix: str, locations: List[Point]) -> Union[None, CompletionList]:
         if len(locations) == 0 or not self.is_enabled():
             return None
 
@@ -476,55 +1023,29 @@ class KdesrcBuildCompletionsProvider(sublime_plugin.ViewEventListener):
         if self.view.match_selector(loc, "comment"):
             return None
 
-        if not self.view.match_selector(loc, "meta.block"):
-            return self.complete_includes(loc)
-
         region = get_region(self.view, loc)
         if region is None:
-            return None
+            return self.complete_includes(loc)
+
+        if region in (ScopeType.MODULE, ScopeType.OPTIONS) and get_block_header_at(self.view, loc) is not None:
+            return self.complete_modules(prefix, loc)
 
         option_name = get_known_option_name_at_line(self.view, loc)
         if option_name is None:
             return self.complete_option_name(region, prefix, loc,)
 
+        if option_name in MODULE_LIST_OPTIONS and self.view.match_selector(loc, "meta.expected.string.kdesrc-build"):
+            return self.complete_modules(prefix, loc)
+
         option = get_option_descriptor(option_name)
 
         if self.view.match_selector(loc, "meta.expected.bool.kdesrc-build") and option.type is bool:
-            return CompletionList([
-                option.fill(CompletionItem("true", kind=sublime.KIND_VARIABLE), True, short=True),
-                option.fill(CompletionItem("false", kind=sublime.KIND_VARIABLE), False, short=True),
-            ], sublime.INHIBIT_WORD_COMPLETIONS)
+            return CompletionList(option.bool_completions(), sublime.INHIBIT_WORD_COMPLETIONS)
 
         if self.view.match_selector(loc, "meta.expected.string.kdesrc-build") and option.type in (int, str, Path) \
                 and (len(option.choices) > 0 or option.has_default()):
-
-            def key(choice: CompletionData) -> Union[int, str]:
-                if isinstance(choice, int):
-                    assert isinstance(option.type, int)
-                    return choice
-                if isinstance(choice, str):
-                    return choice
-                if isinstance(choice, CompletionItem):
-                    return choice.trigger
-
-            def item(pair: Tuple[Union[int, str], CompletionData]) -> CompletionItem:
-                choice = pair[1]
-                if isinstance(choice, CompletionItem):
-                    return choice
-                else:
-                    assert isinstance(choice, (int, str))
-                    return CompletionItem(str(choice), kind=sublime.KIND_VARIABLE)
-
-            choices = { key(c): c for c in option.choices }
-            if option.has_default():
-                c = option.get_default()
-                choices[key(c)] = c
-            choices = list(map(item, sorted(choices.items())))
-
-            return CompletionList([
-                option.fill(choice, choice.trigger, short=True)
-                for choice in choices
-            ], sublime.INHIBIT_WORD_COMPLETIONS | sublime.INHIBIT_REORDER)
+            return CompletionList(option.value_completions(),
+                                  sublime.INHIBIT_WORD_COMPLETIONS | sublime.INHIBIT_REORDER)
 
         return None
 
@@ -544,27 +1065,34 @@ class KdesrcBuildCompletionsProvider(sublime_plugin.ViewEventListener):
                 return CompletionList(completions, sublime.INHIBIT_WORD_COMPLETIONS)
 
             else:
-                completions = get_filesystem_completions(mine)
-                return CompletionList(completions, sublime.INHIBIT_WORD_COMPLETIONS | sublime.INHIBIT_REORDER)
+                # directory of the path being typed, its last component is the completion prefix
+                folder = expand_path(self.view, os.path.dirname(mine))
+                completion_list = CompletionList()
+
+                def list_folder() -> None:
+                    completions = get_filesystem_completions(folder)
+                    completion_list.set_completions(completions, sublime.INHIBIT_WORD_COMPLETIONS | sublime.INHIBIT_REORDER)
+
+                # large or slow (e.g. network) directories must not block typing
+                sublime.set_timeout_async(list_folder)
+                return completion_list
 
         return CompletionList([
             CompletionItem("include", completion="include ", kind=sublime.KIND_KEYWORD, details="Include other configuration file")
         ], sublime.INHIBIT_WORD_COMPLETIONS)
 
-    def complete_option_name(self, region: ScopeType, prefix: str, loc: Point) -> Union[None, CompletionList]:
-
-        options: List[OptionDescriptor] = []
+    def complete_modules(self, prefix: str, loc: Point) -> CompletionList:
+        items = module_completions(prefix)
+        if len(items) != 0 or not modules_loading():
+            cancel_module_completions(self.view.id())
+            return CompletionList(items, RANKED_COMPLETION_FLAGS)
+        # loading modules takes seconds, typing must not wait for it
+        return defer_module_completions(self.view.id(), prefix, loc)
 
-        for option in registry().values():
-            if (option.name.startswith(prefix) or len(prefix) == 0) and region.may_contain(option.scope):
-                options.append(option)
-
-        if len(options) != 0:
-            options.sort(key=lambda option: option.name)
-            return CompletionList([
-                option.fill(CompletionItem(option.name, completion=option.name + ' ', kind=sublime.KIND_VARIABLE), option.name, short=True)
-                for option in options
-            ], sublime.INHIBIT_WORD_COMPLETIONS | sublime.INHIBIT_REORDER)
+    def complete_option_name(self, region: ScopeType, prefix: str, loc: Point) -> Union[None, CompletionList]:
+        items = name_index(region).complete(prefix)
+        if len(items) != 0:
+            return CompletionList(items, RANKED_COMPLETION_FLAGS)
 
         return None
 
@@ -575,10 +1103,35 @@ class KdesrcBuildCompletionsProvider(sublime_plugin.ViewEventListener):
 
         option = get_known_option_name_at_location(self.view, point)
         if option is None:
+            name = get_module_name_at(self.view, point)
+            if name is not None:
+                self.show_module_popup(name, point)
             return
 
         self.show_popup_for(option)
 
+    def show_module_popup(self, name: str, point: Point):
+        state = PERSISTENT_DATA.get(name)
+        project = (PROJECTS.get() or {}).get(name)
+        build_order = render_build_order([name])
+        if state is None and project is None and not build_order:
+            return
+
+        if state is not None:
+            body = render_module_state(state)
+        else:
+            body = "<h1>module {}</h1>".format(html.escape(name))
+        if project is not None and project.description:
+            body += "<p>{}</p>".format(html.escape(project.description))
+        body += build_order
+
+        self.view.show_popup(
+            content=POPUP_TEMPLATE.format(body),
+            location=self.view.word(point).begin(),
+            max_width=min(1000, int(self.view.viewport_extent()[0]) - 64),
+            flags=sublime.HIDE_ON_MOUSE_MOVE_AWAY | sublime.COOPERATE_WITH_AUTO_COMPLETE
+        )
+
     def show_popup_for(self, region):
         option_name = self.view.substr(region)
 
@@ -587,6 +1140,10 @@ class KdesrcBuildCompletionsProvider(sublime_plugin.ViewEventListener):
             return
 
         body = option.render()
+        if option_name == "use-modules":
+            entry = get_known_option_at_line(self.view, region.begin())
+            if entry is not None:
+                body += render_build_order(entry.value.split())
         window_width = min(1000, int(self.view.viewport_extent()[0]) - 64)
         # offset <h1> padding, if possible
         key_start = region.begin()
@@ -600,25 +1157,129 @@ class KdesrcBuildCompletionsProvider(sublime_plugin.ViewEventListener):
         )
 
     def on_load(self):
+        LINKS_DIRTY.mark_all(self.view)
         self.refresh_file_regions()
+        self.refresh_diagnostics()
 
     def on_activated(self):
+        # files might have been created or removed while the view was inactive
+        LINKS_DIRTY.mark_all(self.view)
         self.refresh_file_regions()
+        self.refresh_diagnostics()
+
+    def on_post_text_command(self, command_name: str, args: Any):
+        if command_name not in COMMIT_COMMANDS or len(self.view.sel()) != 1:
+            return
+        # remember what was picked, so that it ranks higher next time
+        pt = self.view.sel()[0].end()
+        words = self.view.substr(Region(self.view.line(pt).begin(), pt)).split()
+        if len(words) != 0:
+            RECENT_NAMES.touch(words[-1])
+
+    def on_selection_modified(self):
+        pending = PENDING_MODULE_COMPLETIONS.get(self.view.id())
+        if pending is None:
+            return
+        sel = self.view.sel()
+        if len(sel) != 1 or sel[0].end() != pending.point:
+            cancel_module_completions(self.view.id())
 
     def on_modified(self):
-        self.refresh_file_regions()
+        self.schedule_refresh()
+
+    def on_close(self):
+        view_id = self.view.id()
+        cancel_module_completions(view_id)
+        DOCUMENTS.pop(view_id, None)
+        LINTED.pop(view_id, None)
+        sublime.set_timeout_async(lambda: VIEW_LINTERS.pop(view_id, None))
+        path = self.view.file_name()
+        if path is not None:
+            VIEW_DIAGNOSTICS.pop(path, None)
+
+    def on_post_save_async(self):
+        refresh_workspace(self.view.file_name())
+
+    def schedule_refresh(self):
+        """Coalesce bursts of edits: refresh only after the buffer stops changing."""
+        change_count = self.view.change_count()
+
+        def refresh_if_settled() -> None:
+            if self.view.is_valid() and self.view.change_count() == change_count:
+                self.refresh_file_regions()
+                self.refresh_diagnostics()
+
+        sublime.set_timeout(refresh_if_settled, REFRESH_DELAY)
 
     def refresh_file_regions(self):
         if not self.is_enabled():
             return
 
-        regions = []
+        dirty = LINKS_DIRTY.take(self.view)
+        if len(dirty) == 0:
+            return
+
+        # Scope queries must run on the main thread, file system probes must not.
+        candidates = [
+            (region, resolve_path(self.view, region))
+            for region in find_by_selector_in(self.view, LINK_SCOPE, dirty)
+        ]
+        change_count = self.view.change_count()
 
-        for region in self.view.find_by_selector("string.unquoted.kdesrc-build"):
-            path = resolve_path(self.view, region)
+        def probe() -> None:
+            with INSTRUMENTATION.timed("filesystem: probe include paths"):
+                found = [region for region, path in candidates if STAT_CACHE.exists(path)]
+            sublime.set_timeout(lambda: self.apply_file_regions(change_count, dirty, found))
 
-            if os.path.exists(path):
-                regions.append(region)
+        sublime.set_timeout_async(probe)
+
+    def refresh_diagnostics(self):
+        if not self.is_enabled() or not self.view.settings().get("kdesrc_build_diagnostics", True):
+            return
+
+        view_id = self.view.id()
+        change_count = self.view.change_count()
+        if LINTED.get(view_id) == change_count:
+            return
+        LINTED[view_id] = change_count
+
+        dirty = LINT_DIRTY.take(self.view)
+        first_line = self.view.rowcol(dirty[0].begin())[0] if len(dirty) != 0 else 0
+        text = self.view.substr(Region(0, self.view.size()))
+        path = self.view.file_name()
+
+        def lint() -> None:
+            linter = VIEW_LINTERS.get(view_id)
+            if linter is None:
+                linter = VIEW_LINTERS[view_id] = ViewLinter()
+            diagnostics = linter.update(text, first_line)
+            sublime.set_timeout(lambda: apply(diagnostics))
+
+        def apply(diagnostics: List[Diagnostic]) -> None:
+            if path is not None:
+                VIEW_DIAGNOSTICS[path] = diagnostics
+            # newer results are on their way, positions of these ones are stale anyway
+            if self.view.is_valid() and self.view.change_count() == change_count:
+                publish_diagnostics(self.view, diagnostics)
+
+        sublime.set_timeout_async(lint)
+
+    def apply_file_regions(self, change_count: int, dirty: List[Region], found: List[Region]):
+        if not self.view.is_valid():
+            return
+
+        if self.view.change_count() != change_count:
+            # positions are stale, try again once typing settles
+            LINKS_DIRTY.mark(self.view, dirty)
+            self.schedule_refresh()
+            return
+
+        regions = [
+            region for region in self.view.get_regions(INCLUDE_KEY)
+            if not region.empty() and not any(overlaps(region, area) for area in dirty)
+        ]
+        regions.extend(found)
+        regions.sort(key=lambda region: region.begin())
 
         self.view.add_regions(INCLUDE_KEY, regions,
             scope="markup.underline.link.lsp", flags=DOCUMENT_LINK_FLAGS)
@@ -631,11 +1292,28 @@ class KdesrcBuildCompletionsProvider(sublime_plugin.ViewEventListener):
         return is_applicable(settings)
 
 
+@INSTRUMENTATION.instrument
+class KdesrcBuildTextChangeListener(sublime_plugin.TextChangeListener):
+    def on_text_changed(self, changes: List[sublime.TextChange]):
+        regions = None
+        for view in self.buffer.views():
+            if not is_applicable(view.settings()):
+                continue
+            if regions is None:
+                regions = changed_regions(changes)
+            LINKS_DIRTY.mark(view, regions)
+            if view.id() in DOCUMENTS:
+                MODEL_DIRTY.mark(view, regions)
+            if view.id() in LINTED:
+                LINT_DIRTY.mark(view, regions)
+
+
+@INSTRUMENTATION.instrument
 class KdesrcBuildGotoDefinitionEventListener(sublime_plugin.EventListener):
     def on_window_command(self, window: Window, name: str, args: Any):
         if name == 'goto_definition':
             view = window.active_view()
-            if view is not None and is_applicable(view.settings()):
+            if view is not None and (is_applicable(view.settings()) or view.settings().get("syntax") == OUTPUT_SYNTAX):
                 return self._goto(window, view)
 
         return None
@@ -647,16 +1325,31 @@ class KdesrcBuildGotoDefinitionEventListener(sublime_plugin.EventListener):
 
         s = sel[0]
 
-        region = view.expand_to_scope(s.end(), "string.unquoted.kdesrc-build")
+        if view.settings().get("syntax") == OUTPUT_SYNTAX:
+            region = view.expand_to_scope(s.end(), OUTPUT_LINK_SCOPE)
+            if region is not None and os.path.isfile(view.substr(region).strip()):
+                return "kdesrc_build_open_log", { "path": view.substr(region).strip() }
+            return None
+
+        region = view.expand_to_scope(s.end(), LINK_SCOPE)
         if region is not None and not region.empty():
-            return self._goto_filesystem(window, view, region)
+            result = self._goto_filesystem(window, view, region)
+            if result is not None:
+                return result
+
+        name = get_module_name_at(view, s.end())
+        if name is not None:
+            return "kdesrc_build_goto_symbol", { "name": name }
 
         return None
 
     def _goto_filesystem(self, window: Window, view: View, region: Region):
         path = resolve_path(view, region)
 
-        if os.path.isfile(path):
+        if path.endswith(".log") and is_large_log(path):
+            return "kdesrc_build_open_log", { "path": path }
+
+        elif os.path.isfile(path):
             return "open_file", { "file": path }
 
         elif os.path.isdir(path):
@@ -665,8 +1358,100 @@ class KdesrcBuildGotoDefinitionEventListener(sublime_plugin.EventListener):
         else:
             return None
 
+class KdesrcBuildShowDiagnosticsCommand(sublime_plugin.WindowCommand):
+    """List problems found in every file of the configuration."""
+
+    def run(self) -> None:
+        files = dict(WORKSPACE_DIAGNOSTICS)
+        files.update(VIEW_DIAGNOSTICS)
+
+        entries = [
+            (path, diagnostic)
+            for path, diagnostics in sorted(files.items())
+            for diagnostic in diagnostics
+        ]
+        if len(entries) == 0:
+            sublime.status_message("kdesrc-build: No problems found")
+            return
+
+        kinds = {
+            ERROR: (sublime.KIND_ID_COLOR_REDISH, "E", "Error"),
+            WARNING: (sublime.KIND_ID_COLOR_ORANGISH, "W", "Warning"),
+            INFO: (sublime.KIND_ID_COLOR_BLUISH, "I", "Info"),
+        }
+        items = [
+            sublime.QuickPanelItem(
+                diagnostic.message,
+                details="{}:{}".format(path, diagnostic.line + 1),
+                kind=kinds[diagnostic.severity],
+            )
+            for path, diagnostic in entries
+        ]
+
+        def goto(index: int, flags: int = 0) -> None:
+            if index < 0:
+                return
+            path, diagnostic = entries[index]
+            self.window.open_file("{}:{}:{}".format(path, diagnostic.line + 1, diagnostic.col + 1),
+                                  sublime.ENCODED_POSITION | flags)
+
+        self.window.show_quick_panel(items, goto, on_highlight=lambda index: goto(index, sublime.TRANSIENT))
+
+
+class KdesrcBuildGotoSymbolCommand(sublime_plugin.WindowCommand):
+    """Jump to definitions and overrides of a module or module set anywhere in the configuration."""
+
+    def run(self, name: str) -> None:
+        view = self.window.active_view()
+        path = view.file_name() if view is not None else None
+
+        if path is not None and os.path.normpath(path) not in WORKSPACE.graph:
+            def index_then_show() -> None:
+                refresh_workspace(path)
+                sublime.set_timeout(lambda: self.show(name))
+
+            sublime.set_timeout_async(index_then_show)
+        else:
+            self.show(name)
+
+    def show(self, name: str) -> None:
+        symbols = WORKSPACE.lookup(name)
+        if len(symbols) == 0:
+            sublime.status_message("kdesrc-build: No definition found for {}".format(name))
+            return
+
+        if len(symbols) == 1:
+            self.open(symbols[0])
+            return
+
+        state = PERSISTENT_DATA.get(name)
+        items = [
+            sublime.QuickPanelItem(
+                "{} {}".format(symbol.kind, symbol.name),
+                details=symbol.location.encoded(),
+                annotation=state.status if state is not None else "",
+                kind=sublime.KIND_NAMESPACE if symbol.kind == "options" else sublime.KIND_TYPE,
+            )
+            for symbol in symbols
+        ]
+        self.window.show_quick_panel(
+            items,
+            lambda index: self.open(symbols[index]) if index >= 0 else None,
+            on_highlight=lambda index: self.open(symbols[index], transient=True),
+        )
+
+    def open(self, symbol: Symbol, transient: bool = False) -> None:
+        flags = sublime.ENCODED_POSITION
+        if transient:
+            flags |= sublime.TRANSIENT
+        self.window.open_file(symbol.location.encoded(), flags)
+
+
 def resolve_path(view: View, region: Region) -> str:
-    path = view.substr(region)
+    return expand_path(view, view.substr(region))
+
+def expand_path(view: View, path: str) -> str:
+    """Expand user and variables in path, and make it relative to the view's file."""
     path = os.path.expanduser(os.path.expandvars(path))
     if not os.path.isabs(path):
         base = view.file_name()
@@ -675,3 +1460,6 @@ def resolve_path(view: View, region: Region) -> str:
             path = os.path.join(base, path)
 
     return path
+
+
+IMPORT_TIME = time.perf_counter() - IMPORT_STARTED
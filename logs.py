@@ -0,0 +1,201 @@
+import os
+import threading
+from typing import Callable, List, Optional, Tuple
+
+import sublime
+import sublime_plugin
+
+from .build import DEFAULT_SOURCE_DIR
+from .completions import global_options
+from .plugins.lib.logindex import LogEntry, LogFile, LogIndex
+from .plugins.lib.logview import is_large_log
+
+# Same default as kdesrc-build itself.
+DEFAULT_LOG_DIR = "~/kde/log"
+
+LOG_INDEX: Optional[LogIndex] = None
+LOG_INDEX_LOCK = threading.Lock()
+INDEXING = False
+"""Whether logs are being indexed, only accessed on the async thread."""
+
+REFRESH_CALLBACKS: List[Callable[[bool], None]] = []
+"""Waiting for the indexing in progress to finish, only accessed on the async thread."""
+
+
+def log_index() -> LogIndex:
+    global LOG_INDEX
+    with LOG_INDEX_LOCK:
+        if LOG_INDEX is None:
+            LOG_INDEX = LogIndex(os.path.join(sublime.cache_path(), __package__, "logs.json"))
+        return LOG_INDEX
+
+
+def log_dirs() -> List[str]:
+    """Directories with logs of kdesrc-build runs, must run on the async thread."""
+    options = global_options("log-dir", "source-dir")
+    source_dir = os.path.expanduser(options.get("source-dir", DEFAULT_SOURCE_DIR))
+    if "log-dir" in options:
+        # relative paths are relative to the source directory, like in kdesrc-build
+        return [os.path.join(source_dir, os.path.expanduser(options["log-dir"]))]
+    # older versions of kdesrc-build kept logs in the source directory
+    return [os.path.expanduser(DEFAULT_LOG_DIR), os.path.join(source_dir, "log")]
+
+
+def refresh_logs(then: Optional[Callable[[bool], None]] = None) -> None:
+    """
+    Index new logs on a thread of its own, since scanning huge logs would hold up the async thread.
+
+    `then` is called on the main thread with whether the index changed, once
+    indexing finishes. Indexing in progress will pick up new logs anyway, so
+    it is waited for rather than started again.
+    """
+    def run_async() -> None:
+        global INDEXING
+        if then is not None:
+            REFRESH_CALLBACKS.append(then)
+        if INDEXING:
+            return
+        dirs = log_dirs()
+        INDEXING = True
+
+        def run_thread() -> None:
+            changed = False
+            try:
+                changed = log_index().refresh(dirs)
+            finally:
+                sublime.set_timeout_async(lambda: finish_refresh(changed))
+
+        threading.Thread(target=run_thread, name="kdesrc-build log indexer", daemon=True).start()
+
+    sublime.set_timeout_async(run_async)
+
+
+def finish_refresh(changed: bool) -> None:
+    global INDEXING
+    INDEXING = False
+    callbacks = REFRESH_CALLBACKS[:]
+    REFRESH_CALLBACKS.clear()
+    for callback in callbacks:
+        sublime.set_timeout(lambda callback=callback: callback(changed))
+
+
+def plugin_loaded():
+    refresh_logs()
+
+
+def show_entries(window: sublime.Window, entries: List[Tuple[LogFile, LogEntry]], empty: str) -> None:
+    if len(entries) == 0:
+        sublime.status_message("kdesrc-build: {}".format(empty))
+        return
+
+    items = [
+        sublime.QuickPanelItem(
+            entry.message,
+            details="{}: {}{}".format(
+                log.module,
+                entry.path,
+                ":{}".format(entry.line) if entry.line else "",
+            ),
+            annotation=os.path.basename(log.run),
+            kind=(sublime.KIND_ID_COLOR_REDISH, "E", "Error") if entry.severity == "error"
+            else (sublime.KIND_ID_COLOR_ORANGISH, "W", "Warning"),
+        )
+        for log, entry in entries
+    ]
+
+    def goto(index: int, flags: int = 0) -> None:
+        if index < 0:
+            return
+        log, entry = entries[index]
+        if os.path.isabs(entry.path) and os.path.isfile(entry.path):
+            location = "{}:{}:{}".format(entry.path, max(entry.line, 1), max(entry.col, 1))
+            window.open_file(location, sublime.ENCODED_POSITION | flags)
+        elif not flags:
+            window.run_command("kdesrc_build_open_log", { "path": log.path, "line": entry.log_line })
+        elif not is_large_log(log.path):
+            # previewing a huge log would mean indexing it on every highlight
+            window.open_file("{}:{}".format(log.path, entry.log_line + 1), sublime.ENCODED_POSITION | flags)
+
+    window.show_quick_panel(items, goto, on_highlight=lambda index: goto(index, sublime.TRANSIENT))
+
+
+class KdesrcBuildShowLogErrorsCommand(sublime_plugin.WindowCommand):
+    """List errors found in logs of the last kdesrc-build run."""
+
+    def run(self) -> None:
+        # show what is indexed already right away, new logs are only announced once they are scanned
+        shown = self.last_run()
+        if shown is None:
+            sublime.status_message("kdesrc-build: Indexing build logs…")
+            refresh_logs(lambda changed: self.show(self.last_run()))
+            return
+
+        self.show(shown)
+
+        def refreshed(changed: bool) -> None:
+            found = self.last_run()
+            if changed and found != shown:
+                sublime.status_message("kdesrc-build: Build logs changed, show errors again to update the list")
+
+        refresh_logs(refreshed)
+
+    @staticmethod
+    def last_run() -> Optional[Tuple[str, List[Tuple[LogFile, LogEntry]]]]:
+        """The last run and its errors, None when no logs are indexed."""
+        index = log_index()
+        runs = index.runs()
+        if len(runs) == 0:
+            return None
+        return runs[0], index.entries(run=runs[0])
+
+    def show(self, last_run: Optional[Tuple[str, List[Tuple[LogFile, LogEntry]]]]) -> None:
+        if last_run is None:
+            sublime.status_message("kdesrc-build: No build logs found")
+            return
+        run, entries = last_run
+        show_entries(self.window, entries, "No errors in the last run ({})".format(os.path.basename(run)))
+
+
+class KdesrcBuildShowModuleLogErrorsCommand(sublime_plugin.WindowCommand):
+    """List errors of a module across every kdesrc-build run which kept its logs."""
+
+    def run(self, module: Optional[str] = None) -> None:
+        # show what is indexed already right away, new logs are only announced once they are scanned
+        index = log_index()
+        shown = index.entries(module=module) if module is not None else index.modules()
+        if len(shown) == 0:
+            sublime.status_message("kdesrc-build: Indexing build logs…")
+            refresh_logs(lambda changed: self.show(module))
+            return
+
+        self.show(module)
+
+        def refreshed(changed: bool) -> None:
+            found = index.entries(module=module) if module is not None else index.modules()
+            if changed and found != shown:
+                sublime.status_message("kdesrc-build: Build logs changed, show errors again to update the list")
+
+        refresh_logs(refreshed)
+
+    def show(self, module: Optional[str]) -> None:
+        index = log_index()
+        if module is not None:
+            show_entries(self.window, index.entries(module=module), "No errors logged for {}".format(module))
+            return
+
+        modules = sorted(index.modules().items(), key=lambda item: (-item[1], item[0]))
+        if len(modules) == 0:
+            sublime.status_message("kdesrc-build: No build logs found")
+            return
+
+        items = [
+            sublime.QuickPanelItem(name, annotation="{} errors".format(count) if count else "")
+            for name, count in modules
+        ]
+
+        def select(i: int) -> None:
+            if i >= 0:
+                # another quick panel can not be shown while this one is still closing
+                sublime.set_timeout(lambda: self.show(modules[i][0]))
+
+        self.window.show_quick_panel(items, select)
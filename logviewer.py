@@ -0,0 +1,142 @@
+import os
+import threading
+from typing import Dict, Optional
+
+import sublime
+import sublime_plugin
+from sublime import Edit, Region, View
+
+from .plugins.lib.logview import LineIndex, is_large_log
+
+# Lines shown before and after the line of interest.
+CONTEXT = 200
+
+STATUS_KEY = "kdesrc-build-log"
+HIGHLIGHT_KEY = "kdesrc-build-log-line"
+
+
+class LogViewer:
+    def __init__(self, index: LineIndex) -> None:
+        self.index = index
+        self.line = 0
+        """Line of the log which the window is centered on."""
+        self.first = 0
+        """Line of the log shown at the top of the view."""
+
+
+LOG_VIEWERS: Dict[int, LogViewer] = {}
+"""By view id."""
+
+
+class KdesrcBuildOpenLogCommand(sublime_plugin.WindowCommand):
+    """
+    Open a log of kdesrc-build at the line, or at the first error.
+
+    Small logs are opened as usual. Huge ones are memory-mapped, and only a
+    window of lines around the line of interest is put into a scratch view.
+    """
+
+    def run(self, path: str, line: Optional[int] = None) -> None:
+        if not is_large_log(path):
+            self.window.open_file("{}:{}".format(path, (line or 0) + 1), sublime.ENCODED_POSITION)
+            return
+
+        view = self.window.new_file()
+        view.set_scratch(True)
+        view.set_read_only(True)
+        view.set_name(os.path.basename(path) + " (" + os.path.basename(os.path.dirname(path)) + ")")
+        view.settings().set("kdesrc_build_log_viewer", True)
+        view.settings().set("word_wrap", False)
+        view.set_status(STATUS_KEY, "Indexing {}…".format(path))
+
+        def index_log() -> None:
+            try:
+                index = LineIndex(path)
+            except OSError as e:
+                sublime.set_timeout(lambda: view.set_status(STATUS_KEY, "Failed to open {}: {}".format(path, e)))
+                return
+
+            def show() -> None:
+                if not view.is_valid():
+                    index.close()
+                    return
+                LOG_VIEWERS[view.id()] = LogViewer(index)
+                target = line
+                if target is None:
+                    target = index.errors[0] if index.errors else 0
+                view.run_command("kdesrc_build_render_log", { "line": target })
+
+            sublime.set_timeout(show)
+
+        # indexing a huge file takes a while, keep it off the shared async thread
+        threading.Thread(target=index_log, name="kdesrc-build log viewer", daemon=True).start()
+
+
+class KdesrcBuildRenderLogCommand(sublime_plugin.TextCommand):
+    """Replace contents of a log viewer with lines around the given line of the log."""
+
+    def run(self, edit: Edit, line: int) -> None:
+        viewer = LOG_VIEWERS.get(self.view.id())
+        if viewer is None:
+            return
+        index = viewer.index
+        line = max(0, min(line, index.lines - 1))
+        first, last = index.window(line, CONTEXT)
+
+        self.view.set_read_only(False)
+        self.view.replace(edit, Region(0, self.view.size()), index.text(first, last))
+        self.view.set_read_only(True)
+        viewer.line, viewer.first = line, first
+
+        target = self.view.line(self.view.text_point(line - first, 0))
+        self.view.add_regions(HIGHLIGHT_KEY, [target], scope="region.redish",
+                              flags=sublime.DRAW_NO_FILL | sublime.DRAW_NO_OUTLINE | sublime.DRAW_SOLID_UNDERLINE)
+        self.view.sel().clear()
+        self.view.sel().add(target.begin())
+        self.view.show_at_center(target.begin())
+
+        errors = index.errors
+        status = "Lines {}–{} of {}".format(first + 1, last, index.lines)
+        if line in errors:
+            status += ", error {} of {}".format(errors.index(line) + 1, len(errors))
+        else:
+            status += ", {} errors".format(len(errors))
+        self.view.set_status(STATUS_KEY, status)
+
+    def is_enabled(self) -> bool:
+        return self.view.id() in LOG_VIEWERS
+
+
+class KdesrcBuildLogGotoErrorCommand(sublime_plugin.TextCommand):
+    """Show the window around the next or previous error of the log."""
+
+    def run(self, edit: Edit, forward: bool = True) -> None:
+        viewer = LOG_VIEWERS[self.view.id()]
+        target = viewer.index.next_error(self.current_line(viewer), forward)
+        if target is None:
+            sublime.status_message("kdesrc-build: No more errors")
+            return
+        self.view.run_command("kdesrc_build_render_log", { "line": target })
+
+    def current_line(self, viewer: LogViewer) -> int:
+        """Line of the log under the caret, the user might have moved away from the highlighted one."""
+        sel = self.view.sel()
+        if len(sel) == 0:
+            return viewer.line
+        return viewer.first + self.view.rowcol(sel[0].begin())[0]
+
+    def is_enabled(self) -> bool:
+        return self.view.id() in LOG_VIEWERS
+
+
+class KdesrcBuildLogViewerListener(sublime_plugin.EventListener):
+    def on_close(self, view: View) -> None:
+        viewer = LOG_VIEWERS.pop(view.id(), None)
+        if viewer is not None:
+            viewer.index.close()
+
+
+def plugin_unloaded():
+    for viewer in LOG_VIEWERS.values():
+        viewer.index.close()
+    LOG_VIEWERS.clear()
@@ -0,0 +1,282 @@
+"""
+Synthetic configurations and a fixture tokenizer for the benchmark.
+
+The tokenizer assigns scopes roughly the way `kdesrc-build.sublime-syntax`
+does, which is all the plugin ever asks the syntax about: blocks, option
+keys, expected values, include paths and comments.
+"""
+
+from dataclasses import dataclass, field
+import json
+import os
+import re
+from typing import Dict, List, Tuple
+
+__all__ = (
+    'Fixture',
+    'generate_config',
+    'generate_repo_metadata',
+    'tokenize',
+)
+
+SOURCE = "source.kdesrc-build"
+
+COMMENT_RE = re.compile(r"(?:^|(?<=\s))#")
+HEADER_RE = re.compile(r"^(\s*)(global|module-set|module|options)(?=\s|$)(?:([ \t]+)(\S+))?")
+END_RE = re.compile(r"^\s*end(?=\s|$)")
+INCLUDE_RE = re.compile(r"^(\s*)(include)(?=\s|$)([ \t]*)(.*)$")
+OPTION_RE = re.compile(r"^(\s*)(\S+)([ \t]*)(.*)$")
+
+
+def _option_types() -> Dict[str, str]:
+    path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "conf_registry.json")
+    with open(path, "r", encoding="utf-8") as f:
+        table = json.load(f)
+    name, kind = table["fields"].index("name"), table["fields"].index("type")
+    return { row[name]: row[kind] for row in table["options"] }
+
+
+OPTION_TYPES = _option_types()
+
+
+def tokenize(text: str) -> List[Tuple[int, int, str]]:
+    """Split text into (begin, end, scope) tokens which cover all of it, adjacent tokens never share a scope."""
+    tokens = []  # type: List[Tuple[int, int, str]]
+
+    def add(begin: int, end: int, scope: str) -> None:
+        if end <= begin:
+            return
+        if tokens and tokens[-1][1] == begin and tokens[-1][2] == scope:
+            tokens[-1] = (tokens[-1][0], end, scope)
+        else:
+            tokens.append((begin, end, scope))
+
+    block = None
+    continued = None
+    offset = 0
+    for line in text.split("\n"):
+        end_of_line = offset + len(line)
+        base = SOURCE if block is None else "{} meta.block.{}.kdesrc-build".format(SOURCE, block)
+        comment = COMMENT_RE.search(line)
+        code_end = comment.start() if comment is not None else len(line)
+        code = line[:code_end]
+        newline = base
+        closing = False
+
+        header = HEADER_RE.match(code) if block is None and continued is None else None
+        include = INCLUDE_RE.match(code) if continued is None else None
+        option = OPTION_RE.match(code) if block is not None and continued is None else None
+
+        if continued is not None:
+            add(offset, offset + code_end, continued)
+            newline = continued
+            if not code.rstrip().endswith("\\"):
+                continued = None
+        elif header is not None:
+            block = header.group(2)
+            base = "{} meta.block.{}.kdesrc-build".format(SOURCE, block)
+            newline = base
+            add(offset, offset + header.end(1), base)
+            add(offset + header.start(2), offset + header.end(2), base + " keyword.other.region.kdesrc-build")
+            if header.group(4) is not None:
+                add(offset + header.start(3), offset + header.end(3), base)
+                add(offset + header.start(4), offset + header.end(4), base + " entity.name.section.kdesrc-build")
+            add(offset + header.end(0), offset + code_end, base)
+        elif block is not None and END_RE.match(code):
+            add(offset, offset + code_end, base + " keyword.other.region.kdesrc-build")
+            closing = True
+        elif include is not None:
+            path = base + " meta.expect.path.kdesrc-build"
+            add(offset, offset + include.end(1), base)
+            add(offset + include.start(2), offset + include.end(2), base + " keyword.import.kdesrc-build")
+            add(offset + include.start(3), offset + include.end(3), path)
+            add(offset + include.start(4), offset + include.end(4), path + " string.unquoted.kdesrc-build")
+            newline = path
+        elif option is not None:
+            key = option.group(2)
+            kind = OPTION_TYPES.get(key)
+            expected = base + (" meta.expected.bool.kdesrc-build" if kind == "bool" else " meta.expected.string.kdesrc-build")
+            value = expected + (" constant.language.kdesrc-build" if kind == "bool" else " string.unquoted.kdesrc-build")
+            add(offset, offset + option.end(1), base)
+            add(offset + option.start(2), offset + option.end(2),
+                base + (" support.function.kdesrc-build" if kind is not None else " entity.name.function.kdesrc-build"))
+            add(offset + option.start(3), offset + option.end(3), expected)
+            add(offset + option.start(4), offset + option.end(4), value)
+            newline = expected
+            if option.group(4).rstrip().endswith("\\"):
+                continued = value
+        else:
+            add(offset, offset + code_end, base)
+
+        if comment is not None:
+            newline = base + " comment.line.number-sign.kdesrc-build"
+            add(offset + code_end, end_of_line, newline)
+        if end_of_line < len(text):
+            add(end_of_line, end_of_line + 1, newline)
+        if closing:
+            block = None
+        offset = end_of_line + 1
+
+    return tokens
+
+
+@dataclass
+class Fixture:
+    path: str
+    """Main configuration file, which includes the rest."""
+    lines: int
+    modules: int
+    files: List[str] = field(default_factory=list)
+    points: Dict[str, Tuple[int, int]] = field(default_factory=dict)
+    """Interesting (row, col) positions in the main file, by name."""
+
+
+GLOBAL_BLOCK = """\
+# Synthetic configuration generated by the benchmark
+global
+    branch-group kf5-qt5
+    source-dir ~/kde/src
+    build-dir ~/kde/build
+    kdedir ~/kde/usr
+    num-cores 8
+    cmake-options -DCMAKE_BUILD_TYPE=RelWithDebInfo
+    make-options -j8
+    install-after-build true
+    stop-on-failure false
+end global
+
+"""
+
+MODULES_PER_LINE = 8
+
+
+def _chunk(index: int, first_module: int) -> Tuple[List[str], Dict[str, Tuple[int, int]], int]:
+    """Lines of a module set with a couple of module overrides, its points of interest and number of modules."""
+    modules = ["kmod{}".format(first_module + i) for i in range(MODULES_PER_LINE * 2)]
+    lines = [
+        "# module set number {}".format(index),
+        "module-set set{}".format(index),
+        "    repository kde-projects",
+        "    use-modules " + " ".join(modules[:MODULES_PER_LINE]) + " \\",
+        "        " + " ".join(modules[MODULES_PER_LINE:]),
+        "    cmake-options -DBUILD_TESTING=OFF",
+        "    include-dependencies true",
+        "    branch master",
+        "    cm",
+        "end module-set",
+        "",
+        "module {}".format(modules[0]),
+        "    cmake-options -DFOO=ON  # comment",
+        "    log-dir log",
+        "end module",
+        "",
+        "options {}".format(modules[3]),
+        "    make-options -j4",
+        "    run-tests false",
+        "end options",
+        "",
+    ]
+    points = {
+        "comment": (0, len(lines[0])),
+        "module_name": (3, len("    use-modules kmod") + 1),
+        "option_key": (5, len("    cmake")),
+        "bool_value": (6, len(lines[6])),
+        "string_value": (7, len(lines[7])),
+        "option_prefix": (8, len(lines[8])),
+    }
+    return lines, points, len(modules)
+
+
+def generate_config(directory: str, lines: int, include_depth: int = 8) -> Fixture:
+    """Write a configuration of about `lines` lines, with a chain of `include_depth` nested includes."""
+    parts = os.path.join(directory, "parts")
+    os.makedirs(parts, exist_ok=True)
+    fixture = Fixture(os.path.join(directory, "kdesrc-buildrc"), 0, 0)
+
+    # included files get a fifth of all lines, spread over the chain
+    part_lines = max(lines // 5 // max(include_depth, 1), 1)
+    for depth in range(1, include_depth + 1):
+        content = []  # type: List[str]
+        if depth < include_depth:
+            content.append("include part-{}.ksb".format(depth + 1))
+            content.append("")
+        index = 0
+        while len(content) < part_lines:
+            chunk, _, count = _chunk(depth * 100000 + index, fixture.modules)
+            content.extend(chunk)
+            fixture.modules += count
+            index += 1
+        path = os.path.join(parts, "part-{}.ksb".format(depth))
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n".join(content))
+        fixture.files.append(path)
+
+    content = GLOBAL_BLOCK.split("\n")
+    if include_depth > 0:
+        fixture.points["include"] = (len(content) - 1, len("include parts/part-1.ksb"))
+        content[-1:] = ["include parts/part-1.ksb", ""]
+
+    chunks = []  # type: List[Tuple[List[str], Dict[str, Tuple[int, int]]]]
+    total = len(content)
+    while total < lines or not chunks:
+        chunk, points, count = _chunk(len(chunks), fixture.modules)
+        chunks.append((chunk, points))
+        fixture.modules += count
+        total += len(chunk)
+
+    middle = len(chunks) // 2
+    for index, (chunk, points) in enumerate(chunks):
+        if index == middle:
+            for name, (row, col) in points.items():
+                fixture.points[name] = (len(content) + row, col)
+        content.extend(chunk)
+
+    with open(fixture.path, "w", encoding="utf-8") as f:
+        f.write("\n".join(content))
+    fixture.files.insert(0, fixture.path)
+    fixture.lines = len(content)
+    return fixture
+
+
+# About the number of projects in KDE's repo-metadata.
+METADATA_PROJECTS = 1500
+
+PROJECTS_PER_GROUP = 50
+
+
+def generate_repo_metadata(checkout: str, projects: int = METADATA_PROJECTS, branch_group: str = "kf5-qt5") -> List[str]:
+    """
+    Write a repo-metadata checkout with projects named like modules of the
+    configurations, return their names in order. Every project depends on
+    the first one through a wildcard, and on two earlier projects directly.
+    """
+    os.makedirs(os.path.join(checkout, ".git", "refs", "heads"), exist_ok=True)
+    with open(os.path.join(checkout, ".git", "HEAD"), "w") as f:
+        f.write("ref: refs/heads/master\n")
+    with open(os.path.join(checkout, ".git", "refs", "heads", "master"), "w") as f:
+        f.write("{:040x}\n".format(projects))
+
+    names = ["kmod{}".format(index) for index in range(projects)]
+    rules = ["# Synthetic dependency data generated by the benchmark", "*: kmod0"]
+    for index, name in enumerate(names):
+        group = "group{}".format(index // PROJECTS_PER_GROUP)
+        directory = os.path.join(checkout, "projects-invent", group, name)
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, "metadata.yaml"), "w", encoding="utf-8") as f:
+            f.write(
+                "description: Synthetic project number {index}\n"
+                "hasrepo: true\n"
+                "identifier: {name}\n"
+                "name: {name}\n"
+                "projectpath: kde/{group}/{name}\n"
+                "repoactive: true\n"
+                "repopath: {group}/{name}\n".format(index=index, name=name, group=group)
+            )
+        if index > 1:
+            rules.append("kde/{}/{}: kde/{}/{}".format(group, name, group, names[index - 1]))
+            rules.append("kde/{}/{}: {}".format(group, name, names[index // 2]))
+
+    os.makedirs(os.path.join(checkout, "dependencies"), exist_ok=True)
+    with open(os.path.join(checkout, "dependencies", "dependency-data-" + branch_group), "w", encoding="utf-8") as f:
+        f.write("\n".join(rules) + "\n")
+    return names
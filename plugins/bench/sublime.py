@@ -0,0 +1,566 @@
+"""
+Headless stand-in for the `sublime` module, just enough of it to run the plugin's hot paths.
+
+Views keep their text in memory and get their scopes from the fixture
+tokenizer instead of real syntax definitions. Callbacks scheduled with
+`set_timeout` and `set_timeout_async` are queued, and run by `drain()`.
+"""
+
+from bisect import bisect_right
+from collections import deque
+from functools import lru_cache
+import itertools
+import json
+import os
+import tempfile
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Tuple, Union
+from urllib.parse import quote
+
+from fixtures import tokenize
+
+# Flags, values do not matter as long as they are distinct bits.
+HIDDEN = 1 << 0
+HIDE_ON_MINIMAP = 1 << 1
+DRAW_NO_FILL = 1 << 2
+DRAW_NO_OUTLINE = 1 << 3
+DRAW_SOLID_UNDERLINE = 1 << 4
+DRAW_SQUIGGLY_UNDERLINE = 1 << 5
+PERSISTENT = 1 << 6
+COOPERATE_WITH_AUTO_COMPLETE = 1 << 0
+HIDE_ON_MOUSE_MOVE_AWAY = 1 << 1
+INHIBIT_WORD_COMPLETIONS = 1 << 0
+INHIBIT_EXPLICIT_COMPLETIONS = 1 << 1
+DYNAMIC_COMPLETIONS = 1 << 2
+INHIBIT_REORDER = 1 << 3
+ENCODED_POSITION = 1 << 0
+TRANSIENT = 1 << 1
+HOVER_TEXT = 1
+HOVER_GUTTER = 2
+HOVER_MARGIN = 3
+
+KIND_ID_AMBIGUOUS = 0
+KIND_ID_KEYWORD = 1
+KIND_ID_TYPE = 2
+KIND_ID_FUNCTION = 3
+KIND_ID_NAMESPACE = 4
+KIND_ID_NAVIGATION = 5
+KIND_ID_MARKUP = 6
+KIND_ID_VARIABLE = 7
+KIND_ID_SNIPPET = 8
+KIND_ID_COLOR_REDISH = 9
+KIND_ID_COLOR_ORANGISH = 10
+KIND_ID_COLOR_YELLOWISH = 11
+KIND_ID_COLOR_GREENISH = 12
+KIND_ID_COLOR_CYANISH = 13
+KIND_ID_COLOR_BLUISH = 14
+KIND_ID_COLOR_PURPLISH = 15
+KIND_ID_COLOR_PINKISH = 16
+KIND_ID_COLOR_DARK = 17
+KIND_ID_COLOR_LIGHT = 18
+
+KIND_AMBIGUOUS = (KIND_ID_AMBIGUOUS, "", "")
+KIND_KEYWORD = (KIND_ID_KEYWORD, "k", "Keyword")
+KIND_TYPE = (KIND_ID_TYPE, "t", "Type")
+KIND_FUNCTION = (KIND_ID_FUNCTION, "f", "Function")
+KIND_NAMESPACE = (KIND_ID_NAMESPACE, "a", "Namespace")
+KIND_NAVIGATION = (KIND_ID_NAVIGATION, "s", "Navigation")
+KIND_MARKUP = (KIND_ID_MARKUP, "m", "Markup")
+KIND_VARIABLE = (KIND_ID_VARIABLE, "v", "Variable")
+KIND_SNIPPET = (KIND_ID_SNIPPET, "s", "Snippet")
+
+WORD_SEPARATORS = "./\\()\"'-:,.;<>~!@#$%^&*|+=[]{}`~?"
+
+PACKAGES = {}  # type: Dict[str, str]
+"""Directories of packages by name, for `load_resource`."""
+
+CACHE_PATH = tempfile.mkdtemp(prefix="kdesrc-build-bench-")
+
+MAIN_QUEUE = deque()  # type: Deque[Callable[[], None]]
+ASYNC_QUEUE = deque()  # type: Deque[Callable[[], None]]
+
+STATUS_MESSAGES = []  # type: List[str]
+
+
+def set_timeout(callback: Callable[[], None], delay: int = 0) -> None:
+    MAIN_QUEUE.append(callback)
+
+
+def set_timeout_async(callback: Callable[[], None], delay: int = 0) -> None:
+    ASYNC_QUEUE.append(callback)
+
+
+def drain() -> int:
+    """Run every scheduled callback, including the ones they schedule, return how many ran."""
+    count = 0
+    while MAIN_QUEUE or ASYNC_QUEUE:
+        queue = ASYNC_QUEUE if ASYNC_QUEUE else MAIN_QUEUE
+        queue.popleft()()
+        count += 1
+    return count
+
+
+def status_message(message: str) -> None:
+    STATUS_MESSAGES.append(message)
+
+
+def cache_path() -> str:
+    return CACHE_PATH
+
+
+SETTINGS = {}  # type: Dict[str, Settings]
+
+
+def load_settings(name: str) -> 'Settings':
+    return SETTINGS.setdefault(name, Settings())
+
+
+def load_resource(name: str) -> str:
+    _, package, path = name.split("/", 2)
+    with open(os.path.join(PACKAGES[package], path), "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def encode_value(value: Any, pretty: bool = False) -> str:
+    return json.dumps(value, indent=4 if pretty else None)
+
+
+def command_url(command: str, args: Optional[Dict[str, Any]] = None) -> str:
+    if args is None:
+        return "subl:" + command
+    return "subl:{} {}".format(command, quote(json.dumps(args)))
+
+
+@lru_cache(maxsize=4096)
+def score_selector(scope: str, selector: str) -> int:
+    """Simplified selector matching: alternatives with ",", exclusions with " - ", descendants with spaces."""
+    atoms = scope.split()
+    best = 0
+    for alternative in selector.split(","):
+        include, *excludes = alternative.split(" - ")
+        score = _match_path(atoms, include.split())
+        if score > 0 and not any(_match_path(atoms, exclude.split()) for exclude in excludes):
+            best = max(best, score)
+    return best
+
+
+def _match_path(atoms: Sequence[str], path: Sequence[str]) -> int:
+    if not path:
+        return 0
+    i = 0
+    score = 0
+    for depth, atom in enumerate(atoms):
+        if i < len(path) and (atom == path[i] or atom.startswith(path[i] + ".")):
+            score += (depth + 1) * len(path[i].split("."))
+            i += 1
+    return score if i == len(path) else 0
+
+
+class Region:
+    __slots__ = ("a", "b", "xpos")
+
+    def __init__(self, a: int, b: Optional[int] = None, xpos: int = -1) -> None:
+        self.a = a
+        self.b = a if b is None else b
+        self.xpos = xpos
+
+    def __repr__(self) -> str:
+        return "Region({}, {})".format(self.a, self.b)
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, Region) and self.a == other.a and self.b == other.b
+
+    def __hash__(self) -> int:
+        return hash((self.a, self.b))
+
+    def __len__(self) -> int:
+        return self.size()
+
+    def __iter__(self):
+        return iter((self.a, self.b))
+
+    def begin(self) -> int:
+        return min(self.a, self.b)
+
+    def end(self) -> int:
+        return max(self.a, self.b)
+
+    def size(self) -> int:
+        return abs(self.b - self.a)
+
+    def empty(self) -> bool:
+        return self.a == self.b
+
+    def cover(self, other: 'Region') -> 'Region':
+        return Region(min(self.begin(), other.begin()), max(self.end(), other.end()))
+
+    def contains(self, x: Union['Region', int]) -> bool:
+        if isinstance(x, Region):
+            return self.begin() <= x.begin() and x.end() <= self.end()
+        return self.begin() <= x <= self.end()
+
+    def intersects(self, other: 'Region') -> bool:
+        return self.begin() < other.end() and other.begin() < self.end()
+
+
+class Selection:
+    def __init__(self) -> None:
+        self._regions = []  # type: List[Region]
+
+    def __len__(self) -> int:
+        return len(self._regions)
+
+    def __getitem__(self, index: int) -> Region:
+        return self._regions[index]
+
+    def __iter__(self):
+        return iter(list(self._regions))
+
+    def clear(self) -> None:
+        self._regions = []
+
+    def add(self, region: Union[Region, int]) -> None:
+        self._regions.append(region if isinstance(region, Region) else Region(region))
+
+
+class Settings:
+    def __init__(self, values: Optional[Dict[str, Any]] = None) -> None:
+        self._values = dict(values or {})
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self._values.get(key, default)
+
+    def set(self, key: str, value: Any) -> None:
+        self._values[key] = value
+
+    def has(self, key: str) -> bool:
+        return key in self._values
+
+    def erase(self, key: str) -> None:
+        self._values.pop(key, None)
+
+
+class HistoricPosition:
+    def __init__(self, pt: int, row: int, col: int) -> None:
+        self.pt = pt
+        self.row = row
+        self.col = col
+
+
+class TextChange:
+    def __init__(self, a: HistoricPosition, b: HistoricPosition, str: str) -> None:
+        self.a = a
+        self.b = b
+        self.str = str
+
+
+class Edit:
+    pass
+
+
+class CompletionItem:
+    def __init__(self, trigger: str, annotation: str = "", completion: str = "", completion_format: int = 0,
+                 kind: Tuple[int, str, str] = KIND_AMBIGUOUS, details: str = "") -> None:
+        self.trigger = trigger
+        self.annotation = annotation
+        self.completion = completion
+        self.completion_format = completion_format
+        self.kind = kind
+        self.details = details
+
+
+class CompletionList:
+    def __init__(self, completions: Optional[Sequence[Any]] = None, flags: int = 0) -> None:
+        self.completions = completions
+        self.flags = flags
+
+    def set_completions(self, completions: Sequence[Any], flags: int = 0) -> None:
+        self.completions = completions
+        self.flags = flags
+
+
+class QuickPanelItem:
+    def __init__(self, trigger: str, details: Any = "", annotation: str = "",
+                 kind: Tuple[int, str, str] = KIND_AMBIGUOUS) -> None:
+        self.trigger = trigger
+        self.details = details
+        self.annotation = annotation
+        self.kind = kind
+
+
+_ids = itertools.count(1)
+
+WINDOWS = []  # type: List[Window]
+
+
+def windows() -> List['Window']:
+    return list(WINDOWS)
+
+
+class Buffer:
+    def __init__(self) -> None:
+        self.buffer_id = next(_ids)
+        self._views = []  # type: List[View]
+        self.listeners = []  # type: List[Any]
+        """Text change listeners attached to the buffer."""
+
+    def id(self) -> int:
+        return self.buffer_id
+
+    def views(self) -> List['View']:
+        return list(self._views)
+
+
+class Window:
+    def __init__(self) -> None:
+        self.window_id = next(_ids)
+        self._views = []  # type: List[View]
+        self.opened = []  # type: List[Tuple[str, int]]
+        WINDOWS.append(self)
+
+    def id(self) -> int:
+        return self.window_id
+
+    def views(self) -> List['View']:
+        return list(self._views)
+
+    def active_view(self) -> Optional['View']:
+        return self._views[-1] if self._views else None
+
+    def open_file(self, path: str, flags: int = 0) -> None:
+        self.opened.append((path, flags))
+
+    def show_quick_panel(self, items: Sequence[Any], on_select: Callable[[int], None], **kwargs: Any) -> None:
+        pass
+
+    def run_command(self, command: str, args: Optional[Dict[str, Any]] = None) -> None:
+        pass
+
+
+class View:
+    """A view of an in-memory buffer, scopes come from `fixtures.tokenize`."""
+
+    def __init__(self, text: str = "", file_name: Optional[str] = None, settings: Optional[Dict[str, Any]] = None,
+                 window: Optional[Window] = None) -> None:
+        self.view_id = next(_ids)
+        self._text = text
+        self._file_name = file_name
+        self._settings = Settings(settings)
+        self._window = window
+        self._buffer = Buffer()
+        self._buffer._views.append(self)
+        self._change_count = 0
+        self._regions = {}  # type: Dict[str, List[Region]]
+        self._sel = Selection()
+        self._lines = None  # type: Optional[List[int]]
+        self._tokens = None  # type: Optional[Tuple[List[int], List[int], List[str]]]
+        self.popups = []  # type: List[str]
+        if window is not None:
+            window._views.append(self)
+
+    def id(self) -> int:
+        return self.view_id
+
+    def buffer(self) -> Buffer:
+        return self._buffer
+
+    def window(self) -> Optional[Window]:
+        return self._window
+
+    def is_valid(self) -> bool:
+        return True
+
+    def file_name(self) -> Optional[str]:
+        return self._file_name
+
+    def settings(self) -> Settings:
+        return self._settings
+
+    def change_count(self) -> int:
+        return self._change_count
+
+    def size(self) -> int:
+        return len(self._text)
+
+    def sel(self) -> Selection:
+        return self._sel
+
+    def substr(self, x: Union[Region, int]) -> str:
+        if isinstance(x, Region):
+            return self._text[x.begin():x.end()]
+        return self._text[x:x + 1]
+
+    # Lines
+
+    def _line_starts(self) -> List[int]:
+        if self._lines is None:
+            starts = [0]
+            find = self._text.find
+            pos = find("\n")
+            while pos != -1:
+                starts.append(pos + 1)
+                pos = find("\n", pos + 1)
+            self._lines = starts
+        return self._lines
+
+    def rowcol(self, pt: int) -> Tuple[int, int]:
+        starts = self._line_starts()
+        row = bisect_right(starts, pt) - 1
+        return row, pt - starts[row]
+
+    def text_point(self, row: int, col: int) -> int:
+        starts = self._line_starts()
+        row = max(0, min(row, len(starts) - 1))
+        return min(starts[row] + col, self.size())
+
+    def line(self, x: Union[Region, int]) -> Region:
+        begin, end = (x.begin(), x.end()) if isinstance(x, Region) else (x, x)
+        starts = self._line_starts()
+        first = starts[bisect_right(starts, begin) - 1]
+        last = self._text.find("\n", end)
+        return Region(first, self.size() if last == -1 else last)
+
+    def full_line(self, x: Union[Region, int]) -> Region:
+        region = self.line(x)
+        return Region(region.begin(), min(region.end() + 1, self.size()))
+
+    def word(self, x: Union[Region, int]) -> Region:
+        pt = x.begin() if isinstance(x, Region) else x
+        line = self.line(pt)
+        begin = pt
+        while begin > line.begin() and not self._is_separator(begin - 1):
+            begin -= 1
+        end = pt
+        while end < line.end() and not self._is_separator(end):
+            end += 1
+        return Region(begin, end)
+
+    def _is_separator(self, pt: int) -> bool:
+        char = self._text[pt]
+        return char.isspace() or char in WORD_SEPARATORS
+
+    # Scopes
+
+    def _scopes(self) -> Tuple[List[int], List[int], List[str]]:
+        if self._tokens is None:
+            tokens = tokenize(self._text)
+            self._tokens = ([begin for begin, _, _ in tokens], [end for _, end, _ in tokens],
+                            [scope for _, _, scope in tokens])
+        return self._tokens
+
+    def _token_at(self, pt: int) -> int:
+        begins, _, _ = self._scopes()
+        return max(bisect_right(begins, pt) - 1, 0)
+
+    def scope_name(self, pt: int) -> str:
+        begins, _, scopes = self._scopes()
+        if not begins:
+            return "source.kdesrc-build "
+        return scopes[self._token_at(pt)] + " "
+
+    def match_selector(self, pt: int, selector: str) -> bool:
+        return score_selector(self.scope_name(pt), selector) > 0
+
+    def extract_tokens_with_scopes(self, region: Region) -> List[Tuple[Region, str]]:
+        begins, ends, scopes = self._scopes()
+        found = []
+        index = self._token_at(region.begin())
+        while index < len(begins) and begins[index] < region.end():
+            found.append((Region(begins[index], ends[index]), scopes[index] + " "))
+            index += 1
+        return found
+
+    def expand_to_scope(self, pt: int, selector: str) -> Optional[Region]:
+        begins, ends, scopes = self._scopes()
+        if not begins:
+            return None
+        index = self._token_at(pt)
+        if score_selector(scopes[index], selector) == 0:
+            return None
+        first = last = index
+        while first > 0 and ends[first - 1] == begins[first] and score_selector(scopes[first - 1], selector) > 0:
+            first -= 1
+        while last + 1 < len(begins) and begins[last + 1] == ends[last] and score_selector(scopes[last + 1], selector) > 0:
+            last += 1
+        return Region(begins[first], ends[last])
+
+    def find_by_selector(self, selector: str) -> List[Region]:
+        begins, ends, scopes = self._scopes()
+        found = []  # type: List[Region]
+        for begin, end, scope in zip(begins, ends, scopes):
+            if score_selector(scope, selector) == 0:
+                continue
+            if found and found[-1].end() == begin:
+                found[-1] = Region(found[-1].begin(), end)
+            else:
+                found.append(Region(begin, end))
+        return found
+
+    def style_for_scope(self, scope: str) -> Dict[str, str]:
+        return {"foreground": "#cccccc"}
+
+    # Regions
+
+    def add_regions(self, key: str, regions: Sequence[Region], scope: str = "", icon: str = "", flags: int = 0,
+                    annotations: Sequence[str] = (), annotation_color: str = "", **kwargs: Any) -> None:
+        self._regions[key] = list(regions)
+
+    def get_regions(self, key: str) -> List[Region]:
+        return list(self._regions.get(key, ()))
+
+    def erase_regions(self, key: str) -> None:
+        self._regions.pop(key, None)
+
+    # Popups
+
+    def show_popup(self, content: str, flags: int = 0, location: int = -1, max_width: int = 320,
+                   max_height: int = 240, **kwargs: Any) -> None:
+        self.popups.append(content)
+
+    def update_popup(self, content: str) -> None:
+        self.popups.append(content)
+
+    def is_popup_visible(self) -> bool:
+        return False
+
+    def viewport_extent(self) -> Tuple[float, float]:
+        return (1200.0, 800.0)
+
+    # Editing
+
+    def replace(self, edit: Optional[Edit], region: Region, text: str) -> None:
+        """Replace text and notify text change listeners, like typing would."""
+        begin, end = region.begin(), region.end()
+        a = HistoricPosition(begin, *self.rowcol(begin))
+        b = HistoricPosition(end, *self.rowcol(end))
+        self._text = self._text[:begin] + text + self._text[end:]
+        self._change_count += 1
+        self._lines = None
+        self._tokens = None
+        self._shift_regions(begin, end, len(text))
+        change = TextChange(a, b, text)
+        for listener in self._buffer.listeners:
+            listener.on_text_changed([change])
+
+    def insert(self, edit: Optional[Edit], pt: int, text: str) -> int:
+        self.replace(edit, Region(pt), text)
+        return len(text)
+
+    def run_command(self, command: str, args: Optional[Dict[str, Any]] = None) -> None:
+        pass
+
+    def _shift_regions(self, begin: int, end: int, length: int) -> None:
+        delta = length - (end - begin)
+        for key, regions in self._regions.items():
+            shifted = []
+            for region in regions:
+                a, b = region.begin(), region.end()
+                if a >= end:
+                    a += delta
+                elif a > begin:
+                    a = begin
+                if b >= end:
+                    b += delta
+                elif b > begin:
+                    b = begin + length
+                shifted.append(Region(a, b))
+            self._regions[key] = shifted
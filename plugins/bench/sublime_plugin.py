@@ -0,0 +1,51 @@
+"""
+Headless stand-in for the `sublime_plugin` module.
+
+Only base classes are provided, commands and listeners are never discovered
+or dispatched automatically: the benchmark instantiates and calls them.
+"""
+
+from typing import Any
+
+import sublime
+
+
+class Command:
+    def is_enabled(self, *args: Any, **kwargs: Any) -> bool:
+        return True
+
+
+class ApplicationCommand(Command):
+    pass
+
+
+class WindowCommand(Command):
+    def __init__(self, window: sublime.Window) -> None:
+        self.window = window
+
+
+class TextCommand(Command):
+    def __init__(self, view: sublime.View) -> None:
+        self.view = view
+
+
+class EventListener:
+    pass
+
+
+class ViewEventListener:
+    def __init__(self, view: sublime.View) -> None:
+        self.view = view
+
+    @classmethod
+    def is_applicable(cls, settings: sublime.Settings) -> bool:
+        return True
+
+
+class TextChangeListener:
+    def __init__(self) -> None:
+        self.buffer = None  # type: Any
+
+    def attach(self, buffer: sublime.Buffer) -> None:
+        self.buffer = buffer
+        buffer.listeners.append(self)
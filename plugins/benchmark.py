@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+Headless benchmark of the plugin's hot paths. Navigate to this file's directory, and run it like this:
+
+    $ python benchmark.py --output results.json
+
+Sublime Text is replaced with the stand-in modules from bench/, and views
+are opened on synthetic configurations of various sizes. Every scenario is
+timed a number of times, results are written as JSON. To gate a change,
+compare it with results of the previous revision:
+
+    $ python benchmark.py --baseline before.json --threshold 0.5
+
+The exit status is 1 if any scenario got slower than the threshold allows.
+
+Older revisions of the plugin can be benchmarked with `--root`. Scenarios
+which need internals that a revision lacks are recorded as skipped, and
+only scenarios measured in both runs are compared.
+"""
+
+import argparse
+from contextlib import redirect_stdout
+import gc
+import importlib
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import types
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "bench"))
+
+import sublime  # noqa: E402, the stand-in from bench/
+from fixtures import Fixture, generate_config, generate_repo_metadata  # noqa: E402
+
+PACKAGE = "kdesrc-build"
+
+RESULTS_VERSION = 1
+
+DEFAULT_SIZES = (100, 1000, 10000, 50000)
+
+# Differences below this many milliseconds are noise, whatever the ratio.
+MIN_DELTA_MS = 0.05
+
+
+def load_plugin(root: str) -> types.ModuleType:
+    """Import the plugin as a package, the way Sublime Text does."""
+    package = types.ModuleType(PACKAGE)
+    package.__path__ = [root]  # type: ignore
+    sys.modules[PACKAGE] = package
+    sublime.PACKAGES[PACKAGE] = root
+    return importlib.import_module(PACKAGE + ".completions")
+
+
+def isolate_environment(home: str) -> None:
+    """Keep the benchmark away from the user's configuration, caches and state."""
+    os.environ["HOME"] = home
+    os.environ["XDG_CONFIG_HOME"] = os.path.join(home, ".config")
+    os.environ["XDG_STATE_HOME"] = os.path.join(home, ".local", "state")
+    os.makedirs(os.environ["XDG_CONFIG_HOME"], exist_ok=True)
+
+
+def measure(run: Callable[[], Any], repeat: int, setup: Optional[Callable[[], None]] = None) -> List[float]:
+    """Wall time of each run in milliseconds, setup and scheduled callbacks before the run are not counted."""
+    timings = []
+    gc.collect()
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        sublime.drain()
+        started = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - started) * 1000)
+    sublime.drain()
+    return timings
+
+
+def missing(completions: types.ModuleType, names: Sequence[str]) -> List[str]:
+    """Names which the benchmarked revision of the plugin does not have."""
+    return [name for name in names if not hasattr(completions, name)]
+
+
+def summarize(scenario: str, lines: int, timings: List[float]) -> Dict[str, Any]:
+    ordered = sorted(timings)
+    return {
+        "scenario": scenario,
+        "lines": lines,
+        "runs": len(timings),
+        "median_ms": round(statistics.median(ordered), 4),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 4),
+        "min_ms": round(ordered[0], 4),
+        "mean_ms": round(statistics.mean(ordered), 4),
+    }
+
+
+class Session:
+    """A view of the main file of a fixture, with the plugin's listeners attached."""
+
+    def __init__(self, completions: types.ModuleType, fixture: Fixture) -> None:
+        self.completions = completions
+        self.fixture = fixture
+        with open(fixture.path, "r", encoding="utf-8") as f:
+            text = f.read()
+        self.window = sublime.Window()
+        self.view = sublime.View(text, fixture.path, {"syntax": completions.KDESRC_BUILD_SYNTAX}, self.window)
+        self.listener = completions.KdesrcBuildCompletionsProvider(self.view)
+        if hasattr(completions, "KdesrcBuildTextChangeListener"):
+            completions.KdesrcBuildTextChangeListener().attach(self.view.buffer())
+        self.typed = False
+
+    def point(self, name: str) -> int:
+        row, col = self.fixture.points[name]
+        return self.view.text_point(row, col)
+
+    def type_character(self) -> None:
+        """Type or delete a character at the end of a comment, like a keystroke would."""
+        pt = self.point("comment")
+        if self.typed:
+            self.view.replace(None, sublime.Region(pt, pt + 1), "")
+        else:
+            self.view.insert(None, pt, "x")
+        self.typed = not self.typed
+        # Sublime Text tokenizes in the background, the fixture tokenizer is not what is being measured
+        self.view.scope_name(0)
+
+    def forget_document(self) -> None:
+        self.completions.DOCUMENTS.pop(self.view.id(), None)
+
+    def complete(self, name: str, prefix: str = "") -> Any:
+        return self.listener.on_query_completions(prefix, [self.point(name)])
+
+    def complete_and_wait(self, name: str) -> Any:
+        result = self.complete(name)
+        sublime.drain()
+        return result
+
+    def hover(self, name: str) -> None:
+        self.listener.on_hover(self.point(name), sublime.HOVER_TEXT)
+
+    def refresh_links(self) -> None:
+        self.listener.refresh_file_regions()
+        sublime.drain()
+
+
+def write_persistent_data(fixture: Fixture) -> None:
+    """Pretend that every module of the fixture was built, every tenth one failed."""
+    modules = {
+        "kmod{}".format(index): {
+            "failure-count": 1 if index % 10 == 0 else 0,
+            "last-build-rev": "{:040x}".format(index),
+        }
+        for index in range(fixture.modules)
+    }
+    state_home = os.environ["XDG_STATE_HOME"]
+    os.makedirs(state_home, exist_ok=True)
+    with open(os.path.join(state_home, "kdesrc-build-data"), "w") as f:
+        json.dump(modules, f)
+
+
+def reset_registry(completions: types.ModuleType) -> None:
+    completions.OPTION_DESCRIPTOR_REGISTRY = {}
+    # caches derived from the registry, as far as the revision has them
+    if hasattr(completions, "NAME_INDEXES"):
+        completions.NAME_INDEXES.clear()
+    if hasattr(completions, "DOCS_LINES"):
+        completions.DOCS_LINES = None
+
+
+class GraphScenario:
+    """Resolution of the dependency graph of the generated repo-metadata, from a freshly parsed file."""
+
+    REQUIRES = ("DependencyGraph", "dependency_data_file", "load_projects", "metadata_dir")
+
+    def __init__(self, completions: types.ModuleType, names: List[str]) -> None:
+        self.completions = completions
+        self.names = names
+        self.path = completions.dependency_data_file(completions.metadata_dir(), "kf5-qt5")
+        self.paths = { name: project.path for name, project in completions.load_projects().items() }
+        self.graph = self.parse()
+
+    def parse(self) -> Any:
+        with open(self.path, "r", encoding="utf-8") as f:
+            return self.completions.DependencyGraph.parse(f, self.paths)
+
+    def reparse(self) -> None:
+        self.graph = self.parse()
+
+    def build_order(self) -> Any:
+        return self.graph.build_order(self.names)
+
+
+def run_scenarios(completions: types.ModuleType, sizes: List[int], repeat: int, workdir: str,
+                  include_depth: int) -> List[Dict[str, Any]]:
+    results = []  # type: List[Dict[str, Any]]
+
+    def supported(scenario: str, lines: int, requires: Sequence[str]) -> bool:
+        absent = missing(completions, requires)
+        if absent:
+            results.append({ "scenario": scenario, "lines": lines, "skipped": "missing " + ", ".join(absent) })
+            print("{:<40} {:>7} lines  skipped, missing {}".format(scenario, lines, ", ".join(absent)),
+                  file=sys.stderr)
+        return not absent
+
+    def record(scenario: str, lines: int, run: Callable[[], Any], setup: Optional[Callable[[], None]] = None,
+               requires: Sequence[str] = ()) -> None:
+        if not supported(scenario, lines, requires):
+            return
+        result = summarize(scenario, lines, measure(run, repeat, setup))
+        results.append(result)
+        print("{:<40} {:>7} lines  median {:>9.3f} ms  p95 {:>9.3f} ms".format(
+            scenario, lines, result["median_ms"], result["p95_ms"]), file=sys.stderr)
+
+    record("ensure_registry", 0, completions.ensure_registry, setup=lambda: reset_registry(completions))
+    getattr(completions, "warm_registry", completions.ensure_registry)()
+
+    names = generate_repo_metadata(os.path.join(os.environ["XDG_STATE_HOME"], "sysadmin-repo-metadata"))
+    requires = GraphScenario.REQUIRES
+    graph = GraphScenario(completions, names) if not missing(completions, requires) else None
+    record("dependency_graph.parse", len(names), lambda: graph.parse(), requires=requires)
+    record("dependency_graph.build_order.cold", len(names), lambda: graph.build_order(),
+           setup=lambda: graph.reparse(), requires=requires)
+    record("dependency_graph.build_order", len(names), lambda: graph.build_order(), requires=requires)
+
+    for lines in sizes:
+        directory = os.path.join(workdir, "rc-{}".format(lines))
+        fixture = generate_config(directory, lines, include_depth)
+        # kdesrc-build, and thus the plugin, look for the configuration there
+        rc = os.path.join(os.environ["XDG_CONFIG_HOME"], "kdesrc-buildrc")
+        if os.path.lexists(rc):
+            os.remove(rc)
+        os.symlink(fixture.path, rc)
+
+        write_persistent_data(fixture)
+        if hasattr(completions, "PERSISTENT_DATA"):
+            completions.PERSISTENT_DATA.revalidate()
+
+        session = Session(completions, fixture)
+        if hasattr(completions, "refresh_workspace"):
+            completions.refresh_workspace(fixture.path)
+
+        # the first query parses the whole document, every other one reuses it
+        record("on_query_completions.cold", lines, lambda: session.complete("option_prefix", "cm"),
+               setup=session.forget_document, requires=("DOCUMENTS",))
+        record("on_query_completions.option_name", lines, lambda: session.complete("option_prefix", "cm"))
+        record("on_query_completions.after_edit", lines, lambda: session.complete("option_prefix", "cm"),
+               setup=session.type_character)
+        if hasattr(completions, "RECENT_NAMES"):
+            completions.RECENT_NAMES.touch("kmod12")
+        record("on_query_completions.module_name", lines, lambda: session.complete("module_name", "kmod1"))
+        record("on_query_completions.module_name.typing", lines,
+               lambda: [session.complete("module_name", prefix) for prefix in ("k", "km", "kmo", "kmod", "kmod1")])
+        record("on_query_completions.bool_value", lines, lambda: session.complete("bool_value"))
+        record("on_query_completions.string_value", lines, lambda: session.complete("string_value"))
+        record("on_hover.option", lines, lambda: session.hover("option_key"))
+        record("on_hover.module", lines, lambda: session.hover("module_name"))
+        record("refresh_file_regions.all", lines, session.refresh_links,
+               setup=lambda: completions.LINKS_DIRTY.mark_all(session.view), requires=("LINKS_DIRTY",))
+        record("refresh_file_regions.after_edit", lines, session.refresh_links, setup=session.type_character)
+        record("complete_includes", lines, lambda: session.complete_and_wait("include"))
+
+    return results
+
+
+def comparable(results: List[Dict[str, Any]], baseline: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Results of scenarios which were measured in both runs."""
+    measured = { (entry["scenario"], entry["lines"]) for entry in baseline if "skipped" not in entry }
+    return [entry for entry in results if "skipped" not in entry and (entry["scenario"], entry["lines"]) in measured]
+
+
+def compare(results: List[Dict[str, Any]], baseline: List[Dict[str, Any]], threshold: float,
+            metric: str = "min_ms") -> List[str]:
+    """Describe every scenario which got slower than the baseline by more than the threshold."""
+    before = { (entry["scenario"], entry["lines"]): entry for entry in baseline }
+    regressions = []
+    for entry in comparable(results, baseline):
+        old = before[(entry["scenario"], entry["lines"])]
+        before_ms, after_ms = old[metric], entry[metric]
+        if after_ms > before_ms * (1 + threshold) and after_ms - before_ms > MIN_DELTA_MS:
+            regressions.append("{} ({} lines): {:.3f} ms -> {:.3f} ms, +{:.0f}%".format(
+                entry["scenario"], entry["lines"], before_ms, after_ms,
+                (after_ms / before_ms - 1) * 100 if before_ms else float("inf")))
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="comma-separated sizes of generated configurations, in lines")
+    parser.add_argument("--repeat", type=int, default=20, help="timed runs of each scenario")
+    parser.add_argument("--include-depth", type=int, default=8, help="length of the chain of nested includes")
+    parser.add_argument("--root", default=os.path.dirname(HERE), help="root of the package to benchmark")
+    parser.add_argument("--output", help="write results as JSON to this file, instead of standard output")
+    parser.add_argument("--baseline", help="JSON results to compare with")
+    parser.add_argument("--threshold", type=float, default=0.5,
+                        help="allowed slowdown against the baseline, as a fraction")
+    parser.add_argument("--instrument", action="store_true",
+                        help="enable the plugin's latency instrumentation, and print its summary at the end")
+    parser.add_argument("--metric", default="min_ms", choices=("min_ms", "median_ms", "mean_ms", "p95_ms"),
+                        help="statistic to compare with the baseline, the minimum is the least noisy one")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="kdesrc-build-bench-")
+    isolate_environment(os.path.join(workdir, "home"))
+    # keep standard output clean for results, the plugin prints its warnings there
+    with redirect_stdout(sys.stderr):
+        completions = load_plugin(os.path.abspath(args.root))
+        if args.instrument:
+            instrumentation = importlib.import_module(PACKAGE + ".plugins.lib.instrumentation").INSTRUMENTATION
+            instrumentation.configure(True, threshold_ms=float("inf"))
+        results = run_scenarios(completions, [int(size) for size in args.sizes.split(",")], args.repeat, workdir,
+                                args.include_depth)
+        if args.instrument:
+            print(instrumentation.summary())
+    document = {
+        "version": RESULTS_VERSION,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(document, f, indent=1)
+            f.write("\n")
+    else:
+        json.dump(document, sys.stdout, indent=1)
+        print()
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        compared = len(comparable(results, baseline["results"]))
+        print("Compared {} of {} results with the baseline, the others were not measured in both runs".format(
+            compared, len(results)), file=sys.stderr)
+        regressions = compare(results, baseline["results"], args.threshold, args.metric)
+        for regression in regressions:
+            print("REGRESSION:", regression, file=sys.stderr)
+        if regressions:
+            return 1
+        print("No regressions above {:.0f}%".format(args.threshold * 100), file=sys.stderr)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -4,20 +4,33 @@ Navigate to this file's directory, and run it like this:
 
     $ python gen_conf_options.py /home/ratijas/projects/KDE/sdk/kdesrc-build
 
+Nothing is regenerated when neither the documentation nor this generator
+changed since the last run, pass --force to regenerate anyway. Pass
+--benchmark to compare the streaming extractor with the BeautifulSoup one.
+
 """
 
+from dataclasses import replace
+import glob
+import hashlib
 import json
 import os
 import sys
 import subprocess
 import shutil
 import tempfile
-from typing import Iterable, Optional
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 from urllib.parse import urljoin
 
-from bs4 import BeautifulSoup, Tag
-
 from lib import *
+from lib.docextract import extract_options, simplelist_metadata
+
+try:
+    from bs4 import BeautifulSoup, Tag
+except ImportError:
+    # only needed to --benchmark against the old extractor
+    BeautifulSoup = Tag = None
 
 TOOL = "meinproc5"
 
@@ -26,6 +39,81 @@ BASE_DIR = "~/kdesrc-build"
 INDEX = "doc/index.docbook"
 FILENAME = "conf-options-table.html"
 
+REGISTRY_FILE = "conf_registry.json"
+DOCS_FILE = "conf_docs.jsonl"
+
+CMAKE_GENERATORS = (
+    "Unix Makefiles",
+    "Ninja",
+    "Ninja Multi-Config",
+    "CodeBlocks - Ninja",
+    "CodeBlocks - Unix Makefiles",
+    "CodeLite - Ninja",
+    "CodeLite - Unix Makefiles",
+    "Eclipse CDT4 - Ninja",
+    "Eclipse CDT4 - Unix Makefiles",
+    "Kate - Ninja",
+    "Kate - Unix Makefiles",
+    "Sublime Text 2 - Ninja",
+    "Sublime Text 2 - Unix Makefiles",
+)
+
+# Values of "Type" in the documentation.
+DOC_TYPES = {
+    "Boolean": "bool",
+    "Integer": "int",
+    "String": "str",
+}
+
+# Defaults which are described rather than given in the documentation.
+VAGUE_DEFAULTS = ("Auto detected", "Depends on system")
+
+# Documentation does not tell paths apart from other strings.
+PATH_OPTIONS = (
+    "binpath",
+    "build-dir",
+    "kdedir",
+    "libpath",
+    "log-dir",
+    "make-install-prefix",
+    "persistent-data-file",
+    "prefix",
+    "qtdir",
+    "source-dir",
+    "ssh-identity-file",
+)
+
+# Corrections and additions to what is extracted from the documentation.
+# Choices which depend on the machine or on the user's setup (list of
+# modules, languages, number of CPU cores, git identity) are filled in at
+# runtime by completions.py.
+OVERRIDES = {
+    "branch-group":                 dict(default="kf5-qt5", choices=("kf5-qt5",)),
+    "cmake-generator":              dict(choices=CMAKE_GENERATORS, strict=True),
+    "directory-layout":             dict(default="metadata"),  # docs lie about "flat" being the default one
+    "git-desired-protocol":         dict(choices=("git", "https"), since="1.16", strict=True),
+    "install-after-build":          dict(type="bool", default=True),
+    "kdedir":                       dict(choices=("/usr/local/kde",)),
+    "niceness":                     dict(choices=tuple(range(0, 20 + 1))),
+    "num-cores":                    dict(default=4),
+    "num-cores-low-mem":            dict(default=2),
+    "persistent-data-file":         dict(default="~/.local/state/kdesrc-build-data", choices=("~/.config/kdesrc-build-data", "~/.local/state/kdesrc-build-data")),
+    "use-inactive-modules":         dict(since="1.12"),
+}  # type: Dict[str, Dict[str, Any]]
+
+# Options which kdesrc-build still accepts, but which are not documented.
+UNDOCUMENTED = [
+    # apidox: Removed in 1.6.3
+    # apply-qt-patches: Removed in 1.10
+    OptionSchema("checkout-only",                   type="bool"),
+    OptionSchema("ignore-kde-structure",            type="bool", deprecated=True),
+    OptionSchema("kde-languages",                   type="str"),
+    OptionSchema("module-base-path",                type="str", choices=("trunk/$module", "trunk/KDE/$module")),
+    OptionSchema("no-svn",                          type="bool", default=False),
+    OptionSchema("override-url",                    type="str"),
+    OptionSchema("svn-server",                      type="str"),
+]
+
 
 def parse_region(name, text) -> ScopeRestriction:
     # special case, documentation seem to be wrong about it
@@ -44,8 +132,9 @@ def parse_region(name, text) -> ScopeRestriction:
     return ScopeRestriction.ANY
 
 
-def convert_table(soup: BeautifulSoup, table: Tag):
+def convert_table(soup: BeautifulSoup, table: Tag) -> Dict[str, str]:
     replacement = soup.new_tag("div")
+    rows = []
 
     for tr in table.find_all("tr"):
         assert isinstance(tr, Tag) and tr.name == "tr"
@@ -53,6 +142,8 @@ def convert_table(soup: BeautifulSoup, table: Tag):
         assert isinstance(key, Tag) and key.name == "td"
         assert isinstance(value, Tag) and value.name == "td"
 
+        rows.append([key.text, value.text])
+
         key_text = key.text
         if not key_text.endswith(":"):
             key_text += ":"
@@ -72,6 +163,7 @@ def convert_table(soup: BeautifulSoup, table: Tag):
         replacement.append(line_tag)
 
     table.replace_with(replacement)
+    return simplelist_metadata(rows)
 
 
 def parse_option(soup: BeautifulSoup, scope: ScopeRestriction, tr: Tag) -> Optional[Option]:
@@ -110,13 +202,14 @@ def parse_option(soup: BeautifulSoup, scope: ScopeRestriction, tr: Tag) -> Optio
 
         a.attrs["href"] = urljoin(DOC_BASE_URL, href)
 
+    metadata = {}
     for table in description.find_all("table", class_="simplelist"):
         assert isinstance(table, Tag)
-        convert_table(soup, table)
+        metadata.update(convert_table(soup, table))
 
     notes = ''.join(map(str, description.contents)).strip()
 
-    return Option(name=name.text, anchor=anchor.attrs["name"], scope=scope, notes=notes)
+    return Option(name=name.text, anchor=anchor.attrs["name"], scope=scope, notes=notes, metadata=metadata)
 
 
 def parse_options(soup: BeautifulSoup) -> Iterable[Option]:
@@ -140,10 +233,221 @@ def parse_options(soup: BeautifulSoup) -> Iterable[Option]:
                 yield option
 
 
+def parse_value(name: str, type: str, text: Optional[str]) -> Any:
+    if text is None or text in VAGUE_DEFAULTS:
+        return None
+    if type == "bool":
+        if text not in ("True", "False"):
+            print("WARNING: Not a boolean value of option", name, repr(text))
+            return None
+        return text == "True"
+    if type == "int":
+        try:
+            return int(text)
+        except ValueError:
+            print("WARNING: Not an integer value of option", name, repr(text))
+            return None
+    return text
+
+
+def extract_schema(option: Option) -> OptionSchema:
+    """
+    Schema of the option as documented in its meta-data table:
+
+        Type            Boolean
+        Default value   True
+        Valid values    none, builddir, all
+        Available since 1.6
+
+    Listed valid values are the only ones supported.
+    """
+    metadata = option.metadata
+    doc_type = metadata.get("Type")
+    type = DOC_TYPES.get(doc_type or "String")
+    if type is None:
+        print("WARNING: Unknown type of option", option.name, repr(doc_type))
+        type = "str"
+    if option.name in PATH_OPTIONS:
+        type = "path"
+
+    choices = ()  # type: Tuple[Any, ...]
+    if "Valid values" in metadata:
+        choices = tuple(parse_value(option.name, type, value.strip()) for value in metadata["Valid values"].split(","))
+
+    return OptionSchema(
+        option.name,
+        type=type,
+        default=parse_value(option.name, type, metadata.get("Default value")),
+        choices=choices,
+        since=metadata.get("Available since", ""),
+        strict=len(choices) != 0,
+    )
+
+
+def merge_schema(options: Iterable[Option]) -> List[Tuple[OptionSchema, Optional[Option]]]:
+    """Extract schema of each documented option, apply overrides, and report mismatches between the two."""
+    entries = []  # type: List[Tuple[OptionSchema, Optional[Option]]]
+    overrides = dict(OVERRIDES)
+    seen = set()
+
+    for option in options:
+        if option.name in seen:
+            print("WARNING: Duplicated option", option.name)
+            continue
+        seen.add(option.name)
+
+        schema = extract_schema(option)
+        fields = overrides.pop(option.name, {})
+        for key, value in fields.items():
+            if getattr(schema, key) == value:
+                print("WARNING: Override of {} {} matches documentation now".format(option.name, key))
+        entries.append((replace(schema, **fields), option))
+
+    for schema in UNDOCUMENTED:
+        if schema.name in seen:
+            print("WARNING: Option", schema.name, "is documented now")
+            continue
+        entries.append((schema, None))
+
+    if len(overrides) != 0:
+        print("WARNING: Overrides of unknown options", list(overrides.keys()))
+
+    entries.sort(key=lambda entry: entry[0].name)
+    return entries
+
+
+def source_hash(basedir: str) -> str:
+    """
+    Hash of everything the registry is generated from.
+
+    index.docbook includes other docbook files as entities, so all of them
+    are hashed, together with this generator and the registry format.
+    """
+    digest = hashlib.sha256()
+    here = os.path.dirname(os.path.abspath(__file__))
+    docbooks = sorted(glob.glob(os.path.join(basedir, os.path.dirname(INDEX), "*.docbook")))
+    for path in docbooks + [os.path.join(here, "gen_conf_options.py"), os.path.join(here, "lib", "__init__.py")]:
+        digest.update(os.path.basename(path).encode("utf-8") + b"\0")
+        with open(path, "rb") as f:
+            digest.update(hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()
+
+
+def read_registry() -> Tuple[Optional[str], Dict[str, Dict[str, Any]]]:
+    """Source hash and options of the previously generated registry, with docs inlined."""
+    try:
+        with open(REGISTRY_FILE, "r") as f:
+            registry = f.read()
+        with open(DOCS_FILE, "r") as f:
+            docs = f.read()
+        return decode_registry(registry, docs)
+    except (OSError, ValueError, KeyError) as e:
+        print("WARNING: Failed to read previous registry:", e)
+        return None, {}
+
+
+def decode_registry(registry: str, docs: str) -> Tuple[Optional[str], Dict[str, Dict[str, Any]]]:
+    table = json.loads(registry)
+    doc_lines = [json.loads(line) for line in docs.splitlines() if line.strip()]
+    options = {}
+    for row in table["options"]:
+        option = dict(zip(table["fields"], row))
+        doc = option.get("doc", -1)
+        line = doc_lines[doc] if 0 <= doc < len(doc_lines) else None
+        # lines used to be bare strings, before option names were added to them
+        option["doc"] = line[1] if isinstance(line, list) else line
+        options[option["name"]] = option
+    return table.get("source"), options
+
+
+def report_changes(old: Dict[str, Dict[str, Any]], new: Dict[str, Dict[str, Any]]) -> None:
+    added = sorted(new.keys() - old.keys())
+    removed = sorted(old.keys() - new.keys())
+    changed = []
+    for name in sorted(old.keys() & new.keys()):
+        fields = [field for field in REGISTRY_FIELDS if old[name].get(field) != new[name].get(field)]
+        if fields:
+            changed.append((name, fields))
+
+    if not (added or removed or changed):
+        print("No options changed")
+    for name in added:
+        print("Added option", name)
+    for name in removed:
+        print("Removed option", name)
+    for name, fields in changed:
+        print("Changed option", name + ":", ", ".join(fields))
+
+
+def check_registry(registry: str, docs: str) -> None:
+    """Every documented option must be in the registry, or the linter reports it as unknown."""
+    _, options = decode_registry(registry, docs)
+    documented = [json.loads(line)[0] for line in docs.splitlines() if line.strip()]
+    missing = [name for name in documented if name not in options]
+    if missing:
+        raise ValueError("Documented options missing from the registry: {}".format(", ".join(missing)))
+
+
+def write_registry(options: Iterable[Option], source: Optional[str] = None) -> None:
+    registry, docs = encode_registry(merge_schema(options), source)
+    check_registry(registry, docs)
+
+    _, old = read_registry()
+    _, new = decode_registry(registry, docs)
+    report_changes(old, new)
+
+    with open(REGISTRY_FILE, "w") as f:
+        f.write(registry)
+
+    with open(DOCS_FILE, "w") as f:
+        f.write(docs)
+
+
+def benchmark(path: str, repeat: int = 5) -> None:
+    if BeautifulSoup is None:
+        print("WARNING: BeautifulSoup is not installed, nothing to compare with")
+        return
+
+    def run_soup() -> List[Option]:
+        with open(path, "r") as f:
+            return list(parse_options(BeautifulSoup(f, features="lxml")))
+
+    def run_stream() -> List[Option]:
+        with open(path, "r") as f:
+            return extract_options(f)[0]
+
+    results = {}
+    for label, run in (("BeautifulSoup", run_soup), ("streaming", run_stream)):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            options = run()
+            timings.append(time.perf_counter() - started)
+        results[label] = options
+        print("{:>14}: best {:.1f} ms, mean {:.1f} ms, {} options".format(
+            label, min(timings) * 1000, sum(timings) / len(timings) * 1000, len(options)))
+
+    expected, actual = results["BeautifulSoup"], results["streaming"]
+    mismatches = [a.name for a, b in zip(expected, actual) if a != b]
+    if len(expected) != len(actual) or mismatches:
+        print("WARNING: Extractors disagree on options", mismatches or "count")
+    else:
+        print("Extractors agree on all options")
+
+
 def main(basedir: str = BASE_DIR, *argv):
+    basedir = os.path.expanduser(basedir)
+    force = "--force" in argv
+    benchmarking = "--benchmark" in argv
+
+    source = source_hash(basedir)
+    if not (force or benchmarking) and read_registry()[0] == source:
+        print("Registry is up to date, use --force to regenerate")
+        return
+
     tmpdir = tempfile.mkdtemp()
 
-    INPUT = os.path.join(os.path.expanduser(basedir), INDEX)
+    INPUT = os.path.join(basedir, INDEX)
     OUTPUT = os.path.join(tmpdir, FILENAME)
 
     print("Temp dir:", tmpdir)
@@ -152,13 +456,17 @@ def main(basedir: str = BASE_DIR, *argv):
     try:
         proc = subprocess.run([TOOL, INPUT], cwd=tmpdir, check=True)
 
+        if benchmarking:
+            benchmark(OUTPUT)
+            return
+
         with open(OUTPUT, 'r') as f:
-            soup = BeautifulSoup(f, features="lxml")
+            options, skipped = extract_options(f)
 
-        options = list(parse_options(soup))
+        for name in skipped:
+            print("Skipping deprecated and removed option", name)
 
-        with open("conf_options.json", "w") as f:
-            json.dump(options, f, cls=OptionEncoder, indent=2)
+        write_registry(options, source)
 
     finally:
         shutil.rmtree(tmpdir)
@@ -1,14 +1,16 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from enum import Enum, IntFlag
 import json
-from typing import Any, Dict
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
 
 __all__ = (
     'ScopeRestriction',
+    'ScopeType',
     'Option',
-    'OptionEncoder',
-    'OptionDecoder',
+    'OptionSchema',
+    'encode_registry',
     'DOC_BASE_URL',
+    'REGISTRY_FIELDS',
 )
 
 DOC_BASE_URL = "https://docs.kde.org/trunk5/en/kdesrc-build/kdesrc-build/conf-options-table.html"
@@ -20,36 +22,89 @@ class ScopeRestriction(IntFlag):
     MODULE_SET = 2
 
 
+class ScopeType(Enum):
+    GLOBAL = "global"
+    MODULE_SET = "module-set"
+    MODULE = "module"
+    OPTIONS = "options"
+
+    def may_contain(self, restricted: ScopeRestriction):
+        if restricted == ScopeRestriction.ANY:
+            return True
+        elif restricted == (ScopeRestriction.GLOBAL | ScopeRestriction.MODULE_SET):
+            return self in (ScopeType.MODULE_SET, ScopeType.OPTIONS)
+        elif restricted == ScopeRestriction.GLOBAL:
+            return self == ScopeType.GLOBAL
+        elif restricted == ScopeRestriction.MODULE_SET:
+            return self == ScopeType.MODULE_SET
+        else:
+            return True
+
+
 @dataclass
 class Option:
     name: str
     anchor: str
     scope: ScopeRestriction
     notes: str
+    metadata: Dict[str, str] = field(default_factory=dict)
+    """Structured meta-data table of the option, e.g. "Type" → "Boolean"."""
+
+
+@dataclass
+class OptionSchema:
+    name: str
+    type: str  # one of "bool", "int", "str", "path"
+    default: Any = None
+    choices: Sequence[Any] = ()
+    since: str = ""
+    deprecated: bool = False
+    strict: bool = False
+    """Whether choices are the only supported values, rather than mere suggestions."""
+
+
+# Columns of each row in the precompiled registry. The last one is a line
+# number in the docs file, or -1 for undocumented options.
+REGISTRY_FIELDS = ("name", "scope", "anchor", "type", "default", "choices", "since", "deprecated", "strict", "doc")
+
+
+def encode_registry(entries: Iterable[Tuple[OptionSchema, Optional[Option]]],
+                    source: Optional[str] = None) -> Tuple[str, str]:
+    """
+    Serialize merged option schemas and docs into registry and docs files contents.
+
+    Registry is a single compact table which is cheap to decode at startup.
+    Docs are kept in a separate file with a JSON array of the option's name
+    and HTML per line, so that they are only decoded when an option is
+    actually looked at, yet can be checked against the registry. `source` is
+    a hash of whatever the registry was generated from, it is only used by
+    the generator to skip unnecessary runs.
+    """
+    rows = []  # type: List[str]
+    docs = []  # type: List[str]
+
+    for schema, doc in entries:
+        if doc is not None:
+            doc_line = len(docs)
+            docs.append(json.dumps([schema.name, doc.notes]))
+        else:
+            doc_line = -1
 
+        row = [
+            schema.name,
+            int(doc.scope) if doc is not None else int(ScopeRestriction.ANY),
+            doc.anchor if doc is not None else "",
+            schema.type,
+            schema.default,
+            list(schema.choices),
+            schema.since,
+            schema.deprecated,
+            schema.strict,
+            doc_line,
+        ]
+        rows.append(json.dumps(row, ensure_ascii=False))
 
-class OptionEncoder(json.JSONEncoder):
-    def default(self, obj: Any):
-        if isinstance(obj, Option):
-            return {
-                "name": obj.name,
-                "anchor": obj.anchor,
-                "scope": int(obj.scope),
-                "notes": obj.notes,
-            }
-
-        return json.JSONEncoder.default(self, obj)
-
-
-class OptionDecoder(json.JSONDecoder):
-    def __init__(self) -> None:
-        def object_hook(obj: Dict) -> Any:
-            if all(key in obj for key in ("name", "anchor", "scope", "notes",)):
-                return Option(
-                    name=obj["name"],
-                    anchor=obj["anchor"],
-                    scope=ScopeRestriction(obj["scope"]),
-                    notes=obj["notes"],
-                )
-            return obj
-        super().__init__(object_hook=object_hook)
+    header = '"source": {},\n'.format(json.dumps(source)) if source is not None else ""
+    registry = '{{\n{}"fields": {},\n"options": [\n{}\n]\n}}\n'.format(
+        header, json.dumps(REGISTRY_FIELDS), ",\n".join(rows))
+    return registry, "\n".join(docs) + "\n"
@@ -0,0 +1,231 @@
+"""
+Structured events parsed from kdesrc-build output as it is being printed.
+
+The parser consumes text in arbitrary chunks and only ever holds the
+current incomplete line, so memory stays constant however long the build
+runs. It recognises the same lines as `kdesrc-build - output.sublime-syntax`.
+"""
+
+from dataclasses import dataclass, field
+import re
+import time
+from typing import Dict, Generator, Iterator, List, Optional, Union
+
+__all__ = (
+    'BuildFinished',
+    'BuildProgress',
+    'Event',
+    'LogDirectory',
+    'ModuleFailed',
+    'ModuleStarted',
+    'OutputParser',
+    'PhaseFinished',
+    'UpdateResult',
+    'format_duration',
+    'parse_lines',
+)
+
+ANSI_RE = re.compile(r"\x1b\[[0-9;]*m")
+STARTED_RE = re.compile(r"^Building (\S+) from (\S+) \((\d+)/(\d+)\)")
+UPDATE_RE = re.compile(r"^\s*Source update complete for (\S+): (.*)$")
+FILES_RE = re.compile(r"(\d+) files? affected")
+PHASE_RE = re.compile(r"^\s*(\w+)\.\.\.? (succeeded|failed)(?: \(after (\d+) seconds?\))?")
+FAILED_HEADER = "<<<  PACKAGES FAILED TO BUILD  >>>"
+FAILED_RE = re.compile(r"^(\S+) - (?:file://)?(.*?)\s*$")
+LOGS_RE = re.compile(r"Your logs are saved in (?:file://)?(.*?)\s*$")
+
+
+@dataclass(frozen=True)
+class ModuleStarted:
+    module: str
+    source: str
+    """Module set or group which the module comes from."""
+    index: int
+    total: int
+
+
+@dataclass(frozen=True)
+class UpdateResult:
+    module: str
+    files_affected: Optional[int]
+    skipped: bool = False
+    failed: bool = False
+
+
+@dataclass(frozen=True)
+class PhaseFinished:
+    module: str
+    phase: str
+    """Lower-cased verb as printed, e.g. "compiling" or "installing"."""
+    succeeded: bool
+    seconds: Optional[int]
+
+
+@dataclass(frozen=True)
+class ModuleFailed:
+    module: str
+    log_path: str
+
+
+@dataclass(frozen=True)
+class LogDirectory:
+    path: str
+
+
+@dataclass(frozen=True)
+class BuildFinished:
+    succeeded: bool
+
+
+Event = Union[ModuleStarted, UpdateResult, PhaseFinished, ModuleFailed, LogDirectory, BuildFinished]
+
+
+class OutputParser:
+    def __init__(self) -> None:
+        self._tail = ""
+        self._states = self._parse()
+        next(self._states)
+
+    def feed(self, text: str) -> Iterator[Event]:
+        """Consume a chunk of output, yield events of the lines it completes."""
+        lines = (self._tail + text).split("\n")
+        self._tail = lines.pop()
+        for line in lines:
+            yield from self._states.send(line)
+
+    def close(self) -> Iterator[Event]:
+        """Flush the last line, if the output did not end with a newline."""
+        if self._tail:
+            line, self._tail = self._tail, ""
+            yield from self._states.send(line)
+
+    def _parse(self) -> Generator[List[Event], str, None]:
+        events = []  # type: List[Event]
+        module = ""
+        while True:
+            line = yield events
+            events = []
+            line = ANSI_RE.sub("", line.rstrip("\r"))
+
+            match = STARTED_RE.match(line)
+            if match is not None:
+                module = match.group(1)
+                events.append(ModuleStarted(module, match.group(2), int(match.group(3)), int(match.group(4))))
+                continue
+
+            match = UPDATE_RE.match(line)
+            if match is not None:
+                result = match.group(2)
+                files = FILES_RE.search(result)
+                events.append(UpdateResult(
+                    match.group(1),
+                    int(files.group(1)) if files is not None else None,
+                    skipped=result.strip().lower().startswith("skipped"),
+                    failed="conflicts present" in result or "update failed" in result,
+                ))
+                continue
+
+            match = PHASE_RE.match(line)
+            if match is not None:
+                seconds = match.group(3)
+                events.append(PhaseFinished(module, match.group(1).lower(), match.group(2) == "succeeded",
+                                            int(seconds) if seconds is not None else None))
+                continue
+
+            if FAILED_HEADER in line:
+                # summary lasts until the first empty line
+                while True:
+                    line = yield events
+                    events = []
+                    line = ANSI_RE.sub("", line.rstrip("\r"))
+                    if not line.strip():
+                        break
+                    match = FAILED_RE.match(line)
+                    if match is not None:
+                        events.append(ModuleFailed(match.group(1), match.group(2)))
+                continue
+
+            match = LOGS_RE.search(line)
+            if match is not None:
+                events.append(LogDirectory(match.group(1)))
+                continue
+
+            if line.startswith(":-)"):
+                events.append(BuildFinished(True))
+            elif line.startswith(":-("):
+                events.append(BuildFinished(False))
+
+
+def parse_lines(lines: Iterator[str]) -> Iterator[Event]:
+    """Parse complete output, such as a saved log, line by line."""
+    parser = OutputParser()
+    for line in lines:
+        yield from parser.feed(line if line.endswith("\n") else line + "\n")
+    yield from parser.close()
+
+
+@dataclass
+class BuildProgress:
+    """Progress of one kdesrc-build run, updated from its events."""
+    started: float = field(default_factory=time.monotonic)
+    module: str = ""
+    index: int = 0
+    total: int = 0
+    module_started: float = 0.0
+    durations: Dict[str, float] = field(default_factory=dict)
+    """Wall time of every module which is done, in seconds."""
+    failures: List[ModuleFailed] = field(default_factory=list)
+    phases: List[PhaseFinished] = field(default_factory=list)
+    failed_phases: List[PhaseFinished] = field(default_factory=list)
+    log_dir: Optional[str] = None
+    finished: Optional[bool] = None
+
+    def update(self, event: Event) -> None:
+        now = time.monotonic()
+        if isinstance(event, ModuleStarted):
+            self._module_done(now)
+            self.module, self.index, self.total = event.module, event.index, event.total
+            self.module_started = now
+        elif isinstance(event, PhaseFinished):
+            self.phases.append(event)
+            if not event.succeeded:
+                self.failed_phases.append(event)
+        elif isinstance(event, ModuleFailed):
+            self.failures.append(event)
+        elif isinstance(event, LogDirectory):
+            self.log_dir = event.path
+        elif isinstance(event, BuildFinished):
+            self._module_done(now)
+            self.finished = event.succeeded
+
+    def eta(self) -> Optional[float]:
+        """Seconds until all modules are done, extrapolated from the average duration so far."""
+        if not self.durations or self.total == 0:
+            return None
+        average = sum(self.durations.values()) / len(self.durations)
+        remaining = self.total - self.index + 1
+        return max(average * remaining - (time.monotonic() - self.module_started), 0.0)
+
+    def status(self) -> str:
+        if self.total == 0:
+            return "kdesrc-build: starting"
+        text = "kdesrc-build: {}/{} {}".format(self.index, self.total, self.module)
+        if self.failed_phases:
+            text += ", {} failed".format(len({phase.module for phase in self.failed_phases}))
+        eta = self.eta()
+        if eta is not None:
+            text += ", ETA {}".format(format_duration(eta))
+        return text
+
+    def _module_done(self, now: float) -> None:
+        if self.module and self.module not in self.durations:
+            self.durations[self.module] = now - self.module_started
+
+
+def format_duration(seconds: float) -> str:
+    seconds = int(seconds)
+    if seconds < 60:
+        return "{}s".format(seconds)
+    if seconds < 3600:
+        return "{}m {:02}s".format(seconds // 60, seconds % 60)
+    return "{}h {:02}m".format(seconds // 3600, seconds % 3600 // 60)
@@ -0,0 +1,119 @@
+import os
+import threading
+import time
+from typing import Any, Callable, Optional, Sequence, Tuple
+
+__all__ = ('ComputedValue',)
+
+
+class ComputedValue:
+    """
+    Memoized result of an expensive function, such as one spawning a subprocess.
+
+    `get()` never blocks and never touches the file system: it returns the
+    last known value (or None if there is none yet), and schedules
+    revalidation in the background at most every `check_interval` seconds.
+    Revalidation recomputes the value when it is older than `ttl` seconds or
+    any of the watched files changed its mtime. A failed computation is not
+    retried before `ttl` seconds pass either, unless a watched file changes.
+    `on_ready` is called from the background with every new value.
+    """
+
+    def __init__(self, fn: Callable[[], Any], ttl: float = 300.0, watch: Sequence[str] = (),
+                 schedule: Optional[Callable[[Callable[[], None]], None]] = None,
+                 on_ready: Optional[Callable[[Any], None]] = None, check_interval: float = 5.0) -> None:
+        self.fn = fn
+        self.ttl = ttl
+        self.watch = tuple(os.path.expanduser(path) for path in watch)
+        self.schedule = schedule or _spawn
+        self.on_ready = on_ready
+        # without files to watch there is nothing to check before the value expires
+        self.check_interval = min(check_interval, ttl) if self.watch else ttl
+        self._lock = threading.Lock()
+        self._value = None  # type: Any
+        self._computed_at = None  # type: Optional[float]
+        """When the value was last computed, or failed to be."""
+        self._checked_at = None  # type: Optional[float]
+        self._mtimes = ()  # type: Tuple[Optional[float], ...]
+        self._pending = False
+
+    def get(self) -> Any:
+        with self._lock:
+            value = self._value
+            checked_at = self._checked_at
+
+        if checked_at is None or time.monotonic() - checked_at >= self.check_interval:
+            self._schedule(self._revalidate)
+        return value
+
+    def is_ready(self) -> bool:
+        """Whether the value was computed, or failed to be, at least once."""
+        return self._computed_at is not None
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._computed_at = None
+            self._checked_at = None
+
+    def refresh(self) -> None:
+        """Recompute the value in the background, regardless of its age."""
+        self._schedule(self._compute)
+
+    def _schedule(self, task: Callable[[], None]) -> None:
+        with self._lock:
+            if self._pending:
+                return
+            self._pending = True
+        self.schedule(task)
+
+    def _revalidate(self) -> None:
+        with self._lock:
+            computed_at = self._computed_at
+            mtimes = self._mtimes
+
+        now = time.monotonic()
+        if computed_at is None or now - computed_at >= self.ttl or self._watched_mtimes() != mtimes:
+            self._compute()
+            return
+        with self._lock:
+            self._checked_at = now
+            self._pending = False
+
+    def _compute(self) -> None:
+        # snapshot before computing, so that changes made meanwhile trigger another round
+        mtimes = self._watched_mtimes()
+        started = time.monotonic()
+        try:
+            value = self.fn()
+        except Exception as e:
+            print("WARNING: Failed to compute value:", e)
+            # keep the last value, and do not try again before it expires or a watched file changes
+            with self._lock:
+                self._computed_at = started
+                self._checked_at = started
+                self._mtimes = mtimes
+                self._pending = False
+            return
+
+        with self._lock:
+            self._value = value
+            self._computed_at = started
+            self._checked_at = started
+            self._mtimes = mtimes
+            self._pending = False
+
+        if self.on_ready is not None:
+            self.on_ready(value)
+
+    def _watched_mtimes(self) -> Tuple[Optional[float], ...]:
+        mtimes = []
+        for path in self.watch:
+            try:
+                mtimes.append(os.stat(path).st_mtime)
+            except OSError:
+                mtimes.append(None)
+        return tuple(mtimes)
+
+
+def _spawn(task: Callable[[], None]) -> None:
+    threading.Thread(target=task, daemon=True).start()
@@ -0,0 +1,177 @@
+"""
+Dependency graph of KDE projects, read from dependency-data files of the
+repo-metadata checkout.
+
+Each line of such a file says that one project depends on another:
+
+    kde/kdeutils/kcalc: frameworks/kconfig
+    kde/kdegraphics/*: frameworks/kio
+    kde/kdegraphics/okular: -frameworks/kio
+
+Dependent items are project paths, possibly ending with a wildcard, while
+dependencies are referred to by their module names, i.e. the last component
+of their path. A leading minus removes a dependency added by a wildcard.
+Rules restricted to particular branches are ignored, just like kdesrc-build
+ignores them for branches other than the one being built.
+
+Direct dependencies, transitive closures and build orders are memoized, so
+that only the first query of a module walks the graph.
+"""
+
+import os
+import re
+from typing import Dict, FrozenSet, Iterable, List, Optional, Sequence, Set, Tuple
+
+__all__ = (
+    'DependencyGraph',
+    'dependency_data_file',
+)
+
+# Same as the dependency atom of kdesrc-build's DependencyResolver.
+DEPENDENCY_RE = re.compile(r"""
+    ^\s*([^\[:\s]+)\s*          # dependent item
+    (?:\[([^\]:\s]+)\])?\s*     # its branch
+    :\s*([^\s\[]+)              # dependency
+    (?:\s*\[([^\]\s]+)\])?\s*$  # its branch
+""", re.VERBOSE)
+
+ANY_BRANCH = "*"
+
+
+def dependency_data_file(checkout: str, branch_group: str) -> str:
+    return os.path.join(checkout, "dependencies", "dependency-data-" + branch_group)
+
+
+def _module_name(item: str) -> str:
+    return item.rstrip("/").rsplit("/", 1)[-1]
+
+
+class DependencyGraph:
+    """
+    `paths` maps module names to their project paths, which wildcard rules are
+    matched against. When it is not empty, dependencies on anything but known
+    modules (such as third-party libraries) are dropped, because kdesrc-build
+    does not build those either.
+    """
+
+    def __init__(self, paths: Optional[Dict[str, str]] = None) -> None:
+        self.paths = paths or {}
+        # dependent module name or wildcard path -> (added, removed)
+        self.rules = {}  # type: Dict[str, Tuple[List[str], List[str]]]
+        self.wildcards = []  # type: List[str]
+        self._direct = {}  # type: Dict[str, Tuple[str, ...]]
+        self._closures = {}  # type: Dict[str, FrozenSet[str]]
+        self._orders = {}  # type: Dict[Tuple[str, ...], Tuple[str, ...]]
+
+    @classmethod
+    def parse(cls, lines: Iterable[str], paths: Optional[Dict[str, str]] = None) -> 'DependencyGraph':
+        graph = cls(paths)
+        for line in lines:
+            line = line.split("#", 1)[0]
+            if not line.strip():
+                continue
+            match = DEPENDENCY_RE.match(line)
+            if match is None:
+                continue
+            item, item_branch, dependency, dependency_branch = match.groups()
+            if (item_branch or ANY_BRANCH) != ANY_BRANCH or (dependency_branch or ANY_BRANCH) != ANY_BRANCH:
+                continue
+            # catch-all dependencies make no sense
+            if dependency.endswith("*"):
+                continue
+            graph.add_rule(item, dependency)
+        return graph
+
+    def add_rule(self, item: str, dependency: str) -> None:
+        if not item.endswith("*"):
+            item = _module_name(item)
+        elif item not in self.rules:
+            self.wildcards.append(item)
+        added, removed = self.rules.setdefault(item, ([], []))
+        if dependency.startswith("-"):
+            removed.append(_module_name(dependency[1:]))
+        else:
+            added.append(_module_name(dependency))
+
+    def dependencies(self, name: str) -> Tuple[str, ...]:
+        """Direct dependencies of a module, sorted by name."""
+        found = self._direct.get(name)
+        if found is not None:
+            return found
+
+        path = self.paths.get(name, name)
+        added = set()  # type: Set[str]
+        removed = set()  # type: Set[str]
+        for key in [pattern for pattern in self.wildcards if _matches(pattern, path)] + [name]:
+            rule = self.rules.get(key)
+            if rule is not None:
+                added.update(rule[0])
+                removed.update(rule[1])
+        added -= removed
+        added.discard(name)
+        if self.paths:
+            added = { dependency for dependency in added if dependency in self.paths }
+
+        found = self._direct[name] = tuple(sorted(added))
+        return found
+
+    def closure(self, name: str) -> FrozenSet[str]:
+        """Every module the module depends on, directly or not, excluding itself."""
+        found = self._closures.get(name)
+        if found is not None:
+            return found
+
+        seen = set()  # type: Set[str]
+        pending = list(self.dependencies(name))
+        while pending:
+            dependency = pending.pop()
+            if dependency in seen:
+                continue
+            seen.add(dependency)
+            known = self._closures.get(dependency)
+            if known is not None:
+                seen.update(known)
+            else:
+                pending.extend(self.dependencies(dependency))
+        seen.discard(name)
+
+        found = self._closures[name] = frozenset(seen)
+        return found
+
+    def build_order(self, names: Sequence[str]) -> Tuple[str, ...]:
+        """
+        Modules along with all of their dependencies, in an order where every
+        module comes after the ones it depends on. Otherwise modules keep the
+        order they were given in, and dependency cycles are broken arbitrarily.
+        """
+        key = tuple(names)
+        found = self._orders.get(key)
+        if found is not None:
+            return found
+
+        order = []  # type: List[str]
+        done = set()  # type: Set[str]
+        for root in key:
+            if root in done:
+                continue
+            # iterative post-order walk, a stack of (module, its remaining dependencies)
+            done.add(root)
+            stack = [(root, list(reversed(self.dependencies(root))))]
+            while stack:
+                module, remaining = stack[-1]
+                while remaining and remaining[-1] in done:
+                    remaining.pop()
+                if remaining:
+                    dependency = remaining.pop()
+                    done.add(dependency)
+                    stack.append((dependency, list(reversed(self.dependencies(dependency)))))
+                else:
+                    stack.pop()
+                    order.append(module)
+
+        found = self._orders[key] = tuple(order)
+        return found
+
+
+def _matches(pattern: str, path: str) -> bool:
+    return pattern == "*" or path.startswith(pattern[:-1])
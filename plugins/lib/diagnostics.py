@@ -0,0 +1,138 @@
+"""
+Validation of kdesrc-buildrc documents against the options registry.
+
+Results are cached per block, keyed by the block's contents relative to its
+header line, so after an edit only blocks which actually changed are
+validated again; the rest are merely shifted to their new lines.
+"""
+
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from . import ScopeType
+from .rcparser import Block, Document, OptionEntry
+
+__all__ = (
+    'Diagnostic',
+    'Linter',
+    'ERROR',
+    'WARNING',
+    'INFO',
+)
+
+ERROR = "error"
+WARNING = "warning"
+INFO = "info"
+
+BOOL_VALUES = ("true", "false", "1", "0")
+
+
+@dataclass(frozen=True)
+class Diagnostic:
+    line: int
+    col: int
+    end_col: int
+    severity: str
+    message: str
+
+    def shifted(self, lines: int) -> 'Diagnostic':
+        return Diagnostic(self.line + lines, self.col, self.end_col, self.severity, self.message)
+
+
+# Anything with the attributes of completions.OptionDescriptor: type, scope, choices, strict, deprecated.
+OptionSpec = Any
+
+
+class Linter:
+    """
+    Validates documents of one file.
+
+    `lookup` returns an option specification by name, or None for unknown options.
+    """
+
+    def __init__(self, lookup: Callable[[str], Optional[OptionSpec]]) -> None:
+        self.lookup = lookup
+        self._cache = {}  # type: Dict[Hashable, List[Diagnostic]]
+        self.validated = 0
+        self.reused = 0
+
+    def lint(self, doc: Document) -> List[Diagnostic]:
+        results = []  # type: List[Diagnostic]
+        cache = {}  # type: Dict[Hashable, List[Diagnostic]]
+
+        for block in doc.blocks:
+            signature = block_signature(block)
+            relative = self._cache.get(signature)
+            if relative is None:
+                relative = self.lint_block(block)
+                self.validated += 1
+            else:
+                self.reused += 1
+            cache[signature] = relative
+            results.extend(d.shifted(block.line) for d in relative)
+
+            if block.end_line is None:
+                results.append(Diagnostic(block.line, block.col, block.col + len(block.kind.value), ERROR,
+                                          "Missing 'end {}'".format(block.kind.value)))
+
+        # only keep what is still in use, so that the cache does not grow with every edit
+        self._cache = cache
+
+        for error in doc.errors:
+            results.append(Diagnostic(error.line, error.col, len(doc.lines[error.line].rstrip()), ERROR, error.message))
+
+        results.sort(key=lambda d: (d.line, d.col))
+        return results
+
+    def lint_block(self, block: Block) -> List[Diagnostic]:
+        """Validate options of the block, with line numbers relative to its header."""
+        results = []  # type: List[Diagnostic]
+        for option in block.options:
+            for severity, message, on_value in self.check_option(block.kind, option):
+                if on_value and option.parts and option.parts[0]:
+                    col, end_col = option.value_col, option.value_col + len(option.parts[0])
+                else:
+                    col, end_col = option.col, option.col + len(option.key)
+                results.append(Diagnostic(option.line - block.line, col, end_col, severity, message))
+        return results
+
+    def check_option(self, kind: ScopeType, option: OptionEntry) -> List[Tuple[str, str, bool]]:
+        """Return list of (severity, message, whether it is about the value rather than the key)."""
+        spec = self.lookup(option.key)
+        if spec is None:
+            if option.key.startswith("_"):
+                # user-defined variable
+                return []
+            return [(WARNING, "Unknown option '{}'".format(option.key), False)]
+
+        problems = []  # type: List[Tuple[str, str, bool]]
+        if not kind.may_contain(spec.scope):
+            problems.append((ERROR, "Option '{}' is not allowed in {} block".format(option.key, kind.value), False))
+        if spec.deprecated:
+            problems.append((WARNING, "Option '{}' is deprecated".format(option.key), False))
+
+        value = option.value
+        if "${" in value:
+            # only known once kdesrc-build expands the variable
+            pass
+        elif spec.type is bool:
+            if value.lower() not in BOOL_VALUES:
+                problems.append((ERROR, "Expected a boolean value: true or false", True))
+        elif spec.type is int:
+            if not value.lstrip("-").isdigit():
+                problems.append((ERROR, "Expected an integer value", True))
+        elif spec.strict and value and value not in {str(choice) for choice in spec.choices}:
+            problems.append((WARNING, "Unsupported value, expected one of: {}".format(
+                ", ".join(str(choice) for choice in spec.choices)), True))
+
+        return problems
+
+
+def block_signature(block: Block) -> Hashable:
+    return (
+        block.kind,
+        tuple(
+            (option.key, option.line - block.line, option.col, option.value_col, tuple(option.parts))
+            for option in block.options
+        ),
+    )
@@ -0,0 +1,189 @@
+"""
+Streaming extractor of option tables from the HTML of kdesrc-build documentation.
+
+Only the three option tables are processed, the rest of the page is merely
+tokenized, and reading stops right after the last table. The output matches
+what the BeautifulSoup pipeline in gen_conf_options.py produces: relative
+links are made absolute and `simplelist` tables of metadata are flattened
+into paragraphs.
+"""
+
+from html import escape
+from html.parser import HTMLParser
+from typing import Dict, IO, List, Optional, Tuple
+from urllib.parse import urljoin
+
+from . import DOC_BASE_URL, Option, ScopeRestriction
+
+__all__ = (
+    'OptionTableExtractor',
+    'extract_options',
+    'simplelist_metadata',
+)
+
+# In order of appearance in the documentation.
+TABLE_SCOPES = (ScopeRestriction.GLOBAL, ScopeRestriction.ANY, ScopeRestriction.MODULE_SET)
+
+CHUNK_SIZE = 64 * 1024
+
+VOID_ELEMENTS = frozenset((
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param", "source", "track", "wbr",
+))
+
+
+class OptionTableExtractor(HTMLParser):
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.options = []  # type: List[Option]
+        self.skipped = []  # type: List[str]
+        """Names of deprecated and removed options, which have no anchor."""
+        self.done = False
+        self._tables = 0
+        """Option tables seen so far."""
+        self._depth = 0
+        """Nesting level of tables within the current option table."""
+        self._cell = -1
+        """Index of the current cell in an option row, -1 outside of rows."""
+        self._name = []  # type: List[str]
+        self._anchor = None  # type: Optional[str]
+        self._notes = []  # type: List[str]
+        self._metadata = {}  # type: Dict[str, str]
+        # (key, value) cells of the simplelist table being flattened, if any
+        self._simplelist = None  # type: Optional[List[List[str]]]
+
+    def handle_starttag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]) -> None:
+        if self.done:
+            return
+        attributes = dict(attrs)
+
+        if tag == "table":
+            if self._depth == 0:
+                if "table" in (attributes.get("class") or "").split():
+                    self._tables += 1
+                    self._depth = 1
+                return
+            self._depth += 1
+            if self._cell == 1 and self._simplelist is None and "simplelist" in (attributes.get("class") or "").split():
+                self._simplelist = []
+                return
+
+        if self._depth == 0:
+            return
+
+        if self._simplelist is not None:
+            if tag == "tr":
+                self._simplelist.append([])
+            elif tag == "td" and self._simplelist:
+                self._simplelist[-1].append("")
+            return
+
+        if self._depth == 1 and tag == "tr":
+            self._cell = -1
+            self._name, self._anchor, self._notes, self._metadata = [], None, [], {}
+            return
+        if self._depth == 1 and tag == "td":
+            self._cell += 1
+            return
+
+        if self._cell == 0 and tag == "a" and "name" in attributes and self._anchor is None:
+            self._anchor = attributes["name"]
+        elif self._cell == 1:
+            self._notes.append(self._start_tag(tag, attrs, tag in VOID_ELEMENTS))
+
+    def handle_startendtag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]) -> None:
+        if self.done or self._depth == 0:
+            return
+        if self._cell == 1 and self._simplelist is None:
+            self._notes.append(self._start_tag(tag, attrs, True))
+        elif self._cell == 0 and tag == "a" and self._anchor is None:
+            self._anchor = dict(attrs).get("name")
+
+    def handle_endtag(self, tag: str) -> None:
+        if self.done or self._depth == 0:
+            return
+
+        if tag == "table":
+            self._depth -= 1
+            if self._simplelist is not None and self._depth == 1:
+                self._notes.append(flatten_simplelist(self._simplelist))
+                self._metadata.update(simplelist_metadata(self._simplelist))
+                self._simplelist = None
+            elif self._depth == 0:
+                self.done = self._tables == len(TABLE_SCOPES)
+            elif self._cell == 1 and self._simplelist is None:
+                self._notes.append("</table>")
+            return
+
+        if self._simplelist is not None:
+            return
+
+        if self._depth == 1 and tag == "tr":
+            self._finish_row()
+            self._cell = -1
+            return
+        if self._depth == 1 and tag == "td":
+            return
+
+        if self._cell == 1 and tag not in VOID_ELEMENTS:
+            self._notes.append("</{}>".format(tag))
+
+    def handle_data(self, data: str) -> None:
+        if self.done or self._depth == 0:
+            return
+        if self._simplelist is not None:
+            if self._simplelist and self._simplelist[-1]:
+                self._simplelist[-1][-1] += data
+        elif self._cell == 0:
+            self._name.append(data)
+        elif self._cell == 1:
+            self._notes.append(escape(data, quote=False))
+
+    def _start_tag(self, tag: str, attrs: List[Tuple[str, Optional[str]]], void: bool) -> str:
+        parts = [tag]
+        for key, value in attrs:
+            if tag == "a" and key == "href" and value is not None and not value.startswith(("http://", "https://")):
+                value = urljoin(DOC_BASE_URL, value)
+            parts.append('{}="{}"'.format(key, escape(value or "", quote=False).replace('"', "&quot;")))
+        return "<{}{}>".format(" ".join(parts), "/" if void else "")
+
+    def _finish_row(self) -> None:
+        if self._cell < 1:
+            return
+        name = "".join(self._name)
+        if self._anchor is None:
+            self.skipped.append(name)
+            return
+        scope = TABLE_SCOPES[self._tables - 1]
+        self.options.append(Option(name=name, anchor=self._anchor, scope=scope, notes="".join(self._notes).strip(),
+                                   metadata=self._metadata))
+
+
+def flatten_simplelist(rows: List[List[str]]) -> str:
+    lines = []
+    for cells in rows:
+        if len(cells) != 2:
+            continue
+        key, value = cells
+        if not key.endswith(":"):
+            key += ":"
+        lines.append("<p><b>{}</b> <span>{}</span></p>".format(escape(key, quote=False), escape(value, quote=False)))
+    return "<div>{}</div>".format("".join(lines))
+
+
+def simplelist_metadata(rows: List[List[str]]) -> Dict[str, str]:
+    return {
+        " ".join(cells[0].split()).rstrip(":"): " ".join(cells[1].split())
+        for cells in rows if len(cells) == 2
+    }
+
+
+def extract_options(f: IO[str]) -> Tuple[List[Option], List[str]]:
+    """Read HTML in chunks until all option tables are parsed, return options and names of skipped ones."""
+    parser = OptionTableExtractor()
+    while not parser.done:
+        chunk = f.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        parser.feed(chunk)
+    parser.close()
+    return parser.options, parser.skipped
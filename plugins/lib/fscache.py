@@ -0,0 +1,179 @@
+from collections import OrderedDict
+import os
+import stat
+import threading
+import time
+from typing import List, NamedTuple, Optional, Tuple
+
+__all__ = (
+    'DirectoryCache',
+    'DirectoryListing',
+    'DIRECTORY_CACHE',
+    'StatCache',
+    'STAT_CACHE',
+)
+
+
+class StatCache:
+    """
+    Thread-safe LRU cache of `os.stat` results.
+
+    Entries are trusted for `ttl` seconds. After that they are revalidated
+    against the mtime of their parent directory: an entry can not appear in,
+    disappear from or change type within a directory without bumping its
+    mtime, so as long as the parent is unchanged the cached answer still holds
+    and the path itself does not have to be probed again.
+
+    Only the existence and type of an entry are guaranteed to be fresh,
+    other fields of the cached stat result may be up to `ttl` seconds old.
+    """
+
+    def __init__(self, ttl: float = 5.0, max_entries: int = 4096) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # path -> (checked at, parent mtime, stat result)
+        self._entries = OrderedDict()  # type: OrderedDict[str, Tuple[float, Optional[float], Optional[os.stat_result]]]
+
+    def stat(self, path: str) -> Optional[os.stat_result]:
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None:
+                self._entries.move_to_end(path)
+                if now - entry[0] < self.ttl:
+                    self.hits += 1
+                    return entry[2]
+
+        if entry is not None:
+            _, parent_mtime, result = entry
+            if parent_mtime is not None and _mtime(os.path.dirname(path)) == parent_mtime:
+                self._store(path, now, parent_mtime, result, hit=True)
+                return result
+
+        parent_mtime = _mtime(os.path.dirname(path))
+        try:
+            result = os.stat(path)  # type: Optional[os.stat_result]
+        except (OSError, ValueError):
+            result = None
+        self._store(path, now, parent_mtime, result, hit=False)
+        return result
+
+    def exists(self, path: str) -> bool:
+        return self.stat(path) is not None
+
+    def isdir(self, path: str) -> bool:
+        result = self.stat(path)
+        return result is not None and stat.S_ISDIR(result.st_mode)
+
+    def isfile(self, path: str) -> bool:
+        result = self.stat(path)
+        return result is not None and stat.S_ISREG(result.st_mode)
+
+    def invalidate(self, path: Optional[str] = None) -> None:
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(path, None)
+
+    def _store(self, path: str, checked: float, parent_mtime: Optional[float],
+               result: Optional[os.stat_result], hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+            self._entries[path] = (checked, parent_mtime, result)
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class DirectoryListing(NamedTuple):
+    path: str
+    mtime: float
+    dirs: List[str]
+    files: List[str]
+    others: List[str]
+
+
+class DirectoryCache:
+    """
+    Thread-safe LRU cache of sorted directory listings.
+
+    Listings are made with `os.scandir`, which gets entry types from the same
+    syscall that reads the directory on most file systems, instead of probing
+    each entry separately. A cached listing stays valid as long as the mtime
+    of its directory does not change, so a hit costs a single `stat`.
+    """
+
+    def __init__(self, max_entries: int = 32) -> None:
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # type: OrderedDict[str, DirectoryListing]
+
+    def listing(self, path: str) -> Optional[DirectoryListing]:
+        mtime = _mtime(path)
+        if mtime is None:
+            return None
+
+        with self._lock:
+            cached = self._entries.get(path)
+            if cached is not None and cached.mtime == mtime:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return cached
+            self.misses += 1
+
+        dirs, files, others = [], [], []
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir():
+                            dirs.append(entry.name)
+                        elif entry.is_file():
+                            files.append(entry.name)
+                        else:
+                            others.append(entry.name)
+                    except OSError:
+                        pass
+        except OSError:
+            return None
+        dirs.sort()
+        files.sort()
+        others.sort()
+
+        listing = DirectoryListing(path, mtime, dirs, files, others)
+        with self._lock:
+            self._entries[path] = listing
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return listing
+
+    def invalidate(self, path: Optional[str] = None) -> None:
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(path, None)
+
+
+def _mtime(path: str) -> Optional[float]:
+    try:
+        return os.stat(path).st_mtime
+    except (OSError, ValueError):
+        return None
+
+
+STAT_CACHE = StatCache()
+"""Shared by all views, so that switching between tabs does not probe the same paths again."""
+
+DIRECTORY_CACHE = DirectoryCache()
@@ -0,0 +1,202 @@
+"""
+Ranked fuzzy matching over names of options and modules.
+
+A query matches a name if its characters appear in the name in the same
+order. Matches are ranked, best first: names starting with the query, names
+with a `-` separated word starting with it, names containing it, and then
+other subsequences, favouring those which match at word boundaries. Names
+used recently get a boost on top of that, and only the best few are returned,
+so that the editor never has to filter and sort thousands of items itself.
+
+Short queries match most names by their prefix, and recency can not lift
+anything above a prefix match, so whenever there are enough of those they are
+looked up by bisection and nothing else is scored. Otherwise candidates are
+narrowed down with a bitset of names per character before any string is
+scored, and successive queries which extend the previous one only look at
+what the previous one matched, which is how queries come while typing.
+"""
+
+from bisect import bisect_left
+from collections import OrderedDict
+import heapq
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+__all__ = (
+    'FuzzyIndex',
+    'RecentNames',
+)
+
+# Base scores of kinds of matches, anything in between comes from bonuses.
+PREFIX = 3.0
+WORD_PREFIX = 2.0
+SUBSTRING = 1.0
+SUBSEQUENCE = 0.0
+
+RECENCY_WEIGHT = 0.75
+
+
+class RecentNames:
+    """Names which were recently completed, the most recent one weighs 1, forgotten ones weigh 0."""
+
+    def __init__(self, max_entries: int = 100) -> None:
+        self.max_entries = max_entries
+        self._clock = 0
+        self._entries = OrderedDict()  # type: OrderedDict[str, int]
+
+    def touch(self, name: str) -> None:
+        self._clock += 1
+        self._entries[name] = self._clock
+        self._entries.move_to_end(name)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def weight(self, name: str) -> float:
+        used = self._entries.get(name)
+        if used is None:
+            return 0.0
+        return 1.0 - (self._clock - used) / self.max_entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._entries)
+
+
+def _subsequence_score(query: str, name: str) -> Optional[float]:
+    """Score of the query as a subsequence of the name in [0, 1), or None if it is not one."""
+    pos = 0
+    boundaries = 0
+    first = -1
+    for i, ch in enumerate(query):
+        found = name.find(ch, pos)
+        if found < 0:
+            return None
+        if found != 0 and name[found - 1] != "-":
+            # prefer a later occurrence which starts a word, as long as the rest still fits after it
+            word = name.find("-" + ch, max(pos - 1, 0))
+            if word >= 0 and _fits(query[i + 1:], name, word + 2):
+                found = word + 1
+        if found == 0 or name[found - 1] == "-":
+            boundaries += 1
+        if first < 0:
+            first = found
+        pos = found + 1
+    span = pos - first
+    return 0.5 * boundaries / len(query) + 0.49 * len(query) / span
+
+
+def _fits(query: str, name: str, start: int) -> bool:
+    """Whether the query is a subsequence of the name from `start` on."""
+    pos = start
+    for ch in query:
+        pos = name.find(ch, pos)
+        if pos < 0:
+            return False
+        pos += 1
+    return True
+
+
+class FuzzyIndex:
+    """
+    Names to match queries against, best matches are returned as indices into
+    `names`. Names are expected to be sorted, ties are broken by their order.
+    """
+
+    def __init__(self, names: Sequence[str]) -> None:
+        self.names = list(names)
+        self._lower = [name.lower() for name in self.names]
+        self._dashed = ["-" + name for name in self._lower]
+        self._lengths = [len(name) for name in self._lower]
+        self._positions = { name: index for index, name in enumerate(self.names) }
+        # indices ordered by lowercase name, for bisect prefix lookups
+        self._sorted = sorted(range(len(self.names)), key=self._lower.__getitem__)
+        self._sorted_lower = [self._lower[index] for index in self._sorted]
+        # character -> bitset of names which contain it
+        self._masks = {}  # type: Dict[str, int]
+        for index, name in enumerate(self._lower):
+            bit = 1 << index
+            for ch in set(name):
+                self._masks[ch] = self._masks.get(ch, 0) | bit
+        # last query and indices of the names it matched
+        self._last = None  # type: Optional[Tuple[str, List[int]]]
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def matches(self, query: str) -> List[int]:
+        """Indices of all names which contain the query as a subsequence, in order."""
+        return [index for index, _ in self._match(query.lower())]
+
+    def _match(self, query: str) -> List[Tuple[int, float]]:
+        last = self._last
+        if last is not None and query.startswith(last[0]):
+            candidates = last[1]
+        else:
+            mask = (1 << len(self.names)) - 1
+            for ch in set(query):
+                mask &= self._masks.get(ch, 0)
+                if mask == 0:
+                    break
+            bits = bin(mask)[:1:-1]
+            candidates = []
+            index = bits.find("1")
+            while index >= 0:
+                candidates.append(index)
+                index = bits.find("1", index + 1)
+
+        found = []  # type: List[Tuple[int, float]]
+        for index in candidates:
+            score = self._score(query, index)
+            if score is not None:
+                found.append((index, score))
+        self._last = (query, [index for index, _ in found])
+        return found
+
+    def search(self, query: str, limit: int, recent: Optional[RecentNames] = None) -> List[int]:
+        """Indices of the best `limit` matches of the query, best first."""
+        query = query.lower()
+        begin = bisect_left(self._sorted_lower, query)
+        end = bisect_left(self._sorted_lower, query + "\U0010ffff", lo=begin)
+        if end - begin >= limit:
+            return self._search_prefixed(query, self._sorted[begin:end], limit, recent)
+
+        scored = []  # type: List[Tuple[float, int]]
+        for index, score in self._match(query):
+            if recent is not None:
+                score += RECENCY_WEIGHT * recent.weight(self.names[index])
+            scored.append((score, -index))
+        return [-index for _, index in heapq.nlargest(limit, scored)]
+
+    def _search_prefixed(self, query: str, prefixed: List[int], limit: int,
+                         recent: Optional[RecentNames]) -> List[int]:
+        """Best matches when there are enough names starting with the query, which all score the same but for length."""
+        boosted = []  # type: List[Tuple[float, int]]
+        if recent is not None:
+            for name in recent:
+                index = self._positions.get(name)
+                if index is not None and self._lower[index].startswith(query):
+                    boosted.append((RECENCY_WEIGHT * recent.weight(name) - self._lengths[index] / 1000, -index))
+        found = [-index for _, index in heapq.nlargest(limit, boosted)]
+
+        if len(found) < limit:
+            skip = set(found)
+            prefixed.sort()
+            shortest = heapq.nsmallest(limit, prefixed, key=self._lengths.__getitem__)
+            found.extend(index for index in shortest if index not in skip)
+        return found[:limit]
+
+    def _score(self, query: str, index: int) -> Optional[float]:
+        name = self._lower[index]
+        # shorter names are slightly better among matches of the same kind
+        brevity = -len(name) / 1000
+        if name.startswith(query):
+            return PREFIX + brevity
+        if ("-" + query) in self._dashed[index]:
+            return WORD_PREFIX + brevity
+        if query in name:
+            return SUBSTRING + brevity
+        score = _subsequence_score(query, name)
+        if score is None:
+            return None
+        return SUBSEQUENCE + score + brevity
@@ -0,0 +1,282 @@
+"""
+Opt-in latency instrumentation of event handlers.
+
+Handlers wrapped with `Instrumentation.instrument` cost a single attribute
+check while instrumentation is disabled. Once enabled, every call is timed
+into a histogram per handler, and calls slower than the threshold are kept
+in a bounded log along with the size of the view they ran on. Subprocesses
+and file system probes are timed the same way. Hit rates of caches are
+either counted here, or read from counters of the caches themselves.
+"""
+
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+import functools
+import threading
+import time
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple, Type
+
+__all__ = (
+    'BUCKETS',
+    'Histogram',
+    'Instrumentation',
+    'INSTRUMENTATION',
+    'SlowCall',
+)
+
+BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000)
+"""Upper bounds of histogram buckets, in milliseconds. The last bucket takes everything above."""
+
+DEFAULT_THRESHOLD_MS = 50.0
+
+MAX_SLOW_CALLS = 200
+
+
+class Histogram:
+    """Counts of durations by bucket, along with their exact total and maximum."""
+
+    def __init__(self) -> None:
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, ms: float) -> None:
+        index = 0
+        while index < len(BUCKETS) and ms > BUCKETS[index]:
+            index += 1
+        self.buckets[index] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, q: float) -> float:
+        """Upper bound of the bucket which holds the q-th quantile, capped by the maximum."""
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank and count != 0:
+                return min(BUCKETS[index], self.max_ms) if index < len(BUCKETS) else self.max_ms
+        return self.max_ms
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "total_ms": round(self.total_ms, 3),
+            "mean_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+            "max_ms": round(self.max_ms, 3),
+            "buckets": dict(zip([str(bound) for bound in BUCKETS] + ["inf"], self.buckets)),
+        }
+
+
+@dataclass
+class SlowCall:
+    handler: str
+    size: Optional[int]
+    """Size of the view the handler ran on, in characters, if there was one."""
+    duration_ms: float
+    time: float
+    """Wall clock time of the call."""
+
+
+class Instrumentation:
+    """
+    Thread-safe registry of handler latencies, call durations and cache counters.
+
+    `size` is called with the wrapped listener or command to find out how big
+    its view is, it is only called for slow calls.
+    """
+
+    def __init__(self, size: Optional[Callable[[Any], Optional[int]]] = None) -> None:
+        self.enabled = False
+        self.threshold_ms = DEFAULT_THRESHOLD_MS
+        self.size = size
+        self.started = time.time()
+        self.handlers = {}  # type: Dict[str, Histogram]
+        self.calls = {}  # type: Dict[str, Histogram]
+        self.slow_calls = deque(maxlen=MAX_SLOW_CALLS)  # type: Deque[SlowCall]
+        self._caches = {}  # type: Dict[str, Callable[[], Tuple[int, int]]]
+        # [hits, misses] of caches without counters of their own, by name
+        self._counted = {}  # type: Dict[str, List[int]]
+        # counters of caches at the last reset, by name
+        self._cache_offsets = {}  # type: Dict[str, Tuple[int, int]]
+        self._lock = threading.Lock()
+
+    def configure(self, enabled: bool, threshold_ms: Optional[float] = None) -> None:
+        self.enabled = bool(enabled)
+        if threshold_ms is not None:
+            self.threshold_ms = float(threshold_ms)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.started = time.time()
+            self.handlers.clear()
+            self.calls.clear()
+            self.slow_calls.clear()
+            self._counted.clear()
+            self._cache_offsets = { name: counters() for name, counters in self._caches.items() }
+
+    def instrument(self, cls: Optional[Type] = None, *, also: Tuple[str, ...] = ()) -> Any:
+        """
+        Class decorator which times every `on_*` event handler and `run` method
+        of the class, along with methods named in `also`.
+        """
+        def decorate(cls: Type) -> Type:
+            for attr, fn in list(vars(cls).items()):
+                if callable(fn) and (attr.startswith("on_") or attr == "run" or attr in also):
+                    setattr(cls, attr, self._wrap("{}.{}".format(cls.__name__, attr), fn))
+            return cls
+
+        return decorate if cls is None else decorate(cls)
+
+    def _wrap(self, name: str, fn: Callable[..., Any]) -> Callable[..., Any]:
+        @functools.wraps(fn)
+        def wrapper(this: Any, *args: Any, **kwargs: Any) -> Any:
+            if not self.enabled:
+                return fn(this, *args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return fn(this, *args, **kwargs)
+            finally:
+                self.record_handler(name, (time.perf_counter() - started) * 1000, this)
+
+        return wrapper
+
+    def record_handler(self, name: str, ms: float, owner: Any = None) -> None:
+        slow = ms >= self.threshold_ms
+        size = None
+        if slow and owner is not None and self.size is not None:
+            try:
+                size = self.size(owner)
+            except Exception:
+                pass
+
+        with self._lock:
+            histogram = self.handlers.get(name)
+            if histogram is None:
+                histogram = self.handlers[name] = Histogram()
+            histogram.add(ms)
+            if slow:
+                self.slow_calls.append(SlowCall(name, size, ms, time.time()))
+
+        if slow:
+            print("kdesrc-build: Slow call of {} took {:.1f} ms{}".format(
+                name, ms, "" if size is None else ", view has {} characters".format(size)))
+
+    @contextmanager
+    def timed(self, name: str) -> Iterator[None]:
+        """Time a subprocess or a file system call, `name` should start with its category."""
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            ms = (time.perf_counter() - started) * 1000
+            with self._lock:
+                histogram = self.calls.get(name)
+                if histogram is None:
+                    histogram = self.calls[name] = Histogram()
+                histogram.add(ms)
+
+    def watch_cache(self, name: str, counters: Callable[[], Tuple[int, int]]) -> None:
+        """Report hit rate of a cache, `counters` returns its (hits, misses) since creation."""
+        with self._lock:
+            self._caches[name] = counters
+            self._cache_offsets[name] = counters()
+
+    def count(self, name: str, hit: bool) -> None:
+        """Count a lookup in a cache which does not keep counters of its own."""
+        if not self.enabled:
+            return
+        with self._lock:
+            counters = self._counted.get(name)
+            if counters is None:
+                counters = self._counted[name] = [0, 0]
+            counters[0 if hit else 1] += 1
+
+    def cache_stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            counted = { name: tuple(counters) for name, counters in self._counted.items() }
+        for name, counters in self._caches.items():
+            hits, misses = counters()
+            hits_offset, misses_offset = self._cache_offsets.get(name, (0, 0))
+            counted[name] = (hits - hits_offset, misses - misses_offset)
+
+        stats = {}
+        for name, (hits, misses) in sorted(counted.items()):
+            total = hits + misses
+            stats[name] = {
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": round(hits / total, 4) if total else None,
+            }
+        return stats
+
+    def to_json(self) -> Dict[str, Any]:
+        with self._lock:
+            handlers = { name: histogram.to_json() for name, histogram in sorted(self.handlers.items()) }
+            calls = { name: histogram.to_json() for name, histogram in sorted(self.calls.items()) }
+            slow_calls = [
+                { "handler": call.handler, "size": call.size, "duration_ms": round(call.duration_ms, 3), "time": call.time }
+                for call in self.slow_calls
+            ]
+        return {
+            "enabled": self.enabled,
+            "since": self.started,
+            "threshold_ms": self.threshold_ms,
+            "handlers": handlers,
+            "calls": calls,
+            "caches": self.cache_stats(),
+            "slow_calls": slow_calls,
+        }
+
+    def summary(self) -> str:
+        data = self.to_json()
+        lines = []  # type: List[str]
+        if not data["enabled"]:
+            lines.append("Instrumentation is disabled, set \"kdesrc_build_instrumentation\" to true to enable it.")
+            lines.append("")
+
+        for title, section in (("Event handlers", data["handlers"]), ("Subprocess and file system calls", data["calls"])):
+            lines.append("{:<56} {:>7} {:>9} {:>9} {:>9} {:>9}".format(title, "calls", "mean ms", "p50 ms", "p95 ms", "max ms"))
+            for name, stats in section.items():
+                lines.append("{:<56} {:>7} {:>9.2f} {:>9.2f} {:>9.2f} {:>9.2f}".format(
+                    name, stats["count"], stats["mean_ms"], stats["p50_ms"], stats["p95_ms"], stats["max_ms"]))
+            if len(section) == 0:
+                lines.append("    none recorded")
+            lines.append("")
+
+        lines.append("{:<56} {:>7} {:>9} {:>9}".format("Caches", "hits", "misses", "hit rate"))
+        for name, stats in data["caches"].items():
+            rate = "-" if stats["hit_rate"] is None else "{:.0%}".format(stats["hit_rate"])
+            lines.append("{:<56} {:>7} {:>9} {:>9}".format(name, stats["hits"], stats["misses"], rate))
+        lines.append("")
+
+        lines.append("Calls slower than {:g} ms, most recent last".format(data["threshold_ms"]))
+        for call in data["slow_calls"]:
+            lines.append("    {}  {:<48} {:>9.1f} ms  {}".format(
+                time.strftime("%H:%M:%S", time.localtime(call["time"])), call["handler"], call["duration_ms"],
+                "" if call["size"] is None else "{} chars".format(call["size"])))
+        if len(data["slow_calls"]) == 0:
+            lines.append("    none recorded")
+        return "\n".join(lines) + "\n"
+
+
+def _listener_size(owner: Any) -> Optional[int]:
+    view = getattr(owner, "view", None)
+    if view is None:
+        buffer = getattr(owner, "buffer", None)
+        view = buffer.primary_view() if buffer is not None else None
+    return view.size() if view is not None else None
+
+
+INSTRUMENTATION = Instrumentation(_listener_size)
+"""Shared by all plugins of the package, disabled until the settings say otherwise."""
@@ -0,0 +1,240 @@
+"""
+Index of errors and warnings across historical kdesrc-build logs.
+
+kdesrc-build keeps logs of every run in `log-dir/<run>/<module>/<phase>.log`,
+where run directories are named after the date, so that they sort in
+chronological order. Every log is memory-mapped and scanned with
+precompiled patterns, without decoding or splitting it into lines, and only
+the locations of matches are kept. Results are stored per log file along
+with its mtime and size, so a log is only ever scanned again if it changes.
+"""
+
+from dataclasses import dataclass
+import heapq
+import json
+import mmap
+import os
+import re
+import threading
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+__all__ = (
+    'LogEntry',
+    'LogIndex',
+    'scan_log',
+)
+
+# Keep the index compact, nobody reads through more than that many messages of a single log.
+MAX_ENTRIES_PER_LOG = 200
+
+# Bump whenever patterns or the format change, to discard stored indexes.
+INDEX_VERSION = 1
+
+PATTERNS = (
+    # GCC, Clang, moc, uic...: path:line:col: error: message
+    re.compile(rb"^(?P<path>[^\s:][^:\n]*):(?P<line>\d+):(?:(?P<col>\d+):)? "
+               rb"(?P<severity>fatal error|error|warning): (?P<message>[^\n]*)", re.MULTILINE),
+    # CMake Error at path/CMakeLists.txt:12 (find_package):
+    re.compile(rb"^CMake (?P<severity>Error|Warning)(?: \(dev\))? at (?P<path>[^:\n]+):(?P<line>\d+) ?"
+               rb"(?P<message>[^\n]*)", re.MULTILINE),
+    # path/file.cpp:(.text+0x12): undefined reference to `symbol'
+    re.compile(rb"^(?P<path>[^\s:][^:\n]*):\([^)\n]*\): (?P<message>undefined reference to [^\n]*)", re.MULTILINE),
+)
+
+
+class LogEntry(NamedTuple):
+    severity: str
+    """Either "error" or "warning"."""
+    message: str
+    path: str
+    """Source file as printed by the tool, relative paths are relative to the build directory."""
+    line: int
+    col: int
+    log_line: int
+    """0-based line of the log where the message is."""
+
+
+@dataclass
+class LogFile:
+    run: str
+    module: str
+    path: str
+    mtime: float
+    size: int
+    entries: List[LogEntry]
+
+
+def scan_log(path: str, limit: int = MAX_ENTRIES_PER_LOG) -> List[LogEntry]:
+    """Find errors and warnings in the log, errors first, in order of appearance."""
+    try:
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return []
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return _scan(mm, limit)
+    except (OSError, ValueError):
+        return []
+
+
+def _scan(data: mmap.mmap, limit: int) -> List[LogEntry]:
+    # matches of all patterns in order of appearance, found lazily
+    matches = heapq.merge(*(pattern.finditer(data) for pattern in PATTERNS),  # type: ignore
+                          key=lambda match: match.start())
+
+    errors = []  # type: List[LogEntry]
+    warnings = []  # type: List[LogEntry]
+    line, position = 0, 0
+    for match in matches:
+        groups = match.groupdict()
+        severity = (groups.get("severity") or b"error").decode("ascii").lower()
+        found = warnings if severity == "warning" else errors
+        # warnings only make it past the limit if there are few errors, so stop keeping them early
+        if len(found) >= limit:
+            continue
+
+        # count lines incrementally between matches, so the whole scan stays linear
+        offset = match.start()
+        line += data[position:offset].count(b"\n")
+        position = offset
+
+        found.append(LogEntry(
+            "warning" if found is warnings else "error",
+            groups["message"].decode("utf-8", "replace").strip(),
+            groups["path"].decode("utf-8", "replace"),
+            int(groups["line"]) if groups.get("line") else 0,
+            int(groups["col"]) if groups.get("col") else 0,
+            line,
+        ))
+        if len(errors) >= limit:
+            # nothing else would be kept
+            break
+
+    return (errors + warnings)[:limit]
+
+
+class LogIndex:
+    """
+    Thread-safe index of all logs under a log directory.
+
+    `refresh()` is meant to run in the background, readers get whatever
+    has been indexed so far.
+    """
+
+    def __init__(self, cache_path: Optional[str] = None) -> None:
+        self.cache_path = cache_path
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._files = {}  # type: Dict[str, LogFile]
+        self.scanned = 0
+        self._load()
+
+    def refresh(self, log_dirs: Sequence[str]) -> bool:
+        """Scan new and changed logs of every run, forget logs which are gone. Return whether anything changed."""
+        with self._refresh_lock:
+            changed = False
+            seen = set()
+            for run, module, path in self._walk(log_dirs):
+                seen.add(path)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                cached = self._files.get(path)
+                if cached is not None and cached.mtime == st.st_mtime and cached.size == st.st_size:
+                    continue
+                entries = scan_log(path)
+                self.scanned += 1
+                changed = True
+                with self._lock:
+                    self._files[path] = LogFile(run, module, path, st.st_mtime, st.st_size, entries)
+
+            with self._lock:
+                for path in list(self._files.keys()):
+                    if path not in seen:
+                        del self._files[path]
+                        changed = True
+            if changed:
+                self._save()
+            return changed
+
+    def runs(self) -> List[str]:
+        """Run directories, newest first."""
+        with self._lock:
+            runs = {log.run for log in self._files.values()}
+        return sorted(runs, key=os.path.basename, reverse=True)
+
+    def modules(self) -> Dict[str, int]:
+        """Number of errors by module, across all runs."""
+        counts = {}  # type: Dict[str, int]
+        with self._lock:
+            for log in self._files.values():
+                errors = sum(1 for entry in log.entries if entry.severity == "error")
+                counts[log.module] = counts.get(log.module, 0) + errors
+        return counts
+
+    def entries(self, run: Optional[str] = None, module: Optional[str] = None,
+                errors_only: bool = True) -> List[Tuple[LogFile, LogEntry]]:
+        """Messages matching the run and module, newest runs first."""
+        with self._lock:
+            logs = [
+                log for log in self._files.values()
+                if (run is None or log.run == run) and (module is None or log.module == module)
+            ]
+        logs.sort(key=lambda log: (os.path.basename(log.run), log.module, log.path), reverse=True)
+        return [
+            (log, entry)
+            for log in logs
+            for entry in log.entries
+            if not errors_only or entry.severity == "error"
+        ]
+
+    def _walk(self, log_dirs: Sequence[str]) -> Iterator[Tuple[str, str, str]]:
+        """Yield (run, module, path) of every log, skipping symlinks such as `latest`."""
+        for log_dir in log_dirs:
+            for run in _subdirs(log_dir):
+                for module in _subdirs(run):
+                    try:
+                        with os.scandir(module) as it:
+                            for entry in it:
+                                if entry.name.endswith(".log") and entry.is_file(follow_symlinks=False):
+                                    yield run, os.path.basename(module), entry.path
+                    except OSError:
+                        pass
+
+    def _load(self) -> None:
+        if self.cache_path is None:
+            return
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != INDEX_VERSION:
+                return
+            for run, module, path, mtime, size, entries in data["files"]:
+                self._files[path] = LogFile(run, module, path, mtime, size, [LogEntry(*entry) for entry in entries])
+        except (OSError, ValueError, KeyError, TypeError):
+            self._files.clear()
+
+    def _save(self) -> None:
+        if self.cache_path is None:
+            return
+        with self._lock:
+            files = [
+                [log.run, log.module, log.path, log.mtime, log.size, [list(entry) for entry in log.entries]]
+                for log in self._files.values()
+            ]
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            tmp = self.cache_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({ "version": INDEX_VERSION, "files": files }, f, separators=(",", ":"))
+            os.replace(tmp, self.cache_path)
+        except OSError as e:
+            print("WARNING: Failed to save index of build logs:", e)
+
+
+def _subdirs(path: str) -> List[str]:
+    try:
+        with os.scandir(path) as it:
+            return [entry.path for entry in it if entry.is_dir(follow_symlinks=False)]
+    except OSError:
+        return []
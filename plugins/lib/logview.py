@@ -0,0 +1,116 @@
+"""
+Random access to lines of huge log files.
+
+The file is memory-mapped rather than read, and indexed in one pass which
+only remembers where every `STRIDE`-th line starts. Any line is then found
+by jumping to the nearest checkpoint and scanning at most `STRIDE` lines,
+so memory stays proportional to the number of lines divided by the stride,
+plus whatever is actually displayed.
+"""
+
+from array import array
+from bisect import bisect_right
+from itertools import accumulate
+import mmap
+import os
+from typing import List, Optional, Tuple
+
+from .logindex import PATTERNS
+
+__all__ = (
+    'LineIndex',
+    'is_large_log',
+)
+
+# Logs bigger than that are not loaded into a view as a whole.
+LARGE_LOG_SIZE = 16 * 1024 * 1024
+
+STRIDE = 256
+
+# Bytes read at once while indexing.
+CHUNK_SIZE = 8 * 1024 * 1024
+
+
+def is_large_log(path: str) -> bool:
+    try:
+        return os.path.getsize(path) > LARGE_LOG_SIZE
+    except OSError:
+        return False
+
+
+class LineIndex:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._file = open(path, "rb")
+        self.size = os.fstat(self._file.fileno()).st_size
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b""  # type: ignore
+        self._checkpoints = array("q", [0])
+        """Offsets where lines number 0, STRIDE, 2*STRIDE... start."""
+        self.lines = 0
+        self.errors = []  # type: List[int]
+        """Lines which have errors or warnings on them, in order."""
+        self._build()
+
+    def close(self) -> None:
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._file.close()
+
+    def _build(self) -> None:
+        data = self._data
+        line = 0
+        for start in range(0, self.size, CHUNK_SIZE):
+            chunk = data[start:start + CHUNK_SIZE]
+            # offsets after every newline in the chunk, i.e. where each next line starts
+            starts = list(accumulate(len(part) + 1 for part in chunk.split(b"\n")[:-1]))
+            first = -(line + 1) % STRIDE
+            for offset in starts[first::STRIDE]:
+                self._checkpoints.append(start + offset)
+            line += len(starts)
+        # the last line counts even when it does not end with a newline
+        self.lines = line + (1 if self.size and data[self.size - 1:self.size] != b"\n" else 0)
+
+        offsets = sorted(match.start() for pattern in PATTERNS for match in pattern.finditer(data))  # type: ignore
+        errors = []  # type: List[int]
+        for offset in offsets:
+            row = self.line_of(offset)
+            if not errors or errors[-1] != row:
+                errors.append(row)
+        self.errors = errors
+
+    def offset_of(self, line: int) -> int:
+        """Offset where the line starts, or the size of the file past the last line."""
+        line = max(0, line)
+        checkpoint = line // STRIDE
+        if checkpoint >= len(self._checkpoints):
+            checkpoint = len(self._checkpoints) - 1
+        offset = self._checkpoints[checkpoint]
+        for _ in range(line - checkpoint * STRIDE):
+            found = self._data.find(b"\n", offset)
+            if found == -1:
+                return self.size
+            offset = found + 1
+        return offset
+
+    def line_of(self, offset: int) -> int:
+        checkpoint = bisect_right(self._checkpoints, offset) - 1
+        start = self._checkpoints[checkpoint]
+        return checkpoint * STRIDE + self._data[start:offset].count(b"\n")
+
+    def text(self, first: int, last: int) -> str:
+        """Decoded text of lines from first to last, exclusive."""
+        return self._data[self.offset_of(first):self.offset_of(last)].decode("utf-8", "replace")
+
+    def window(self, line: int, context: int) -> Tuple[int, int]:
+        """Range of lines around the line, clamped to the file."""
+        first = max(0, line - context)
+        last = min(self.lines, line + context + 1)
+        return first, last
+
+    def next_error(self, line: int, forward: bool = True) -> Optional[int]:
+        """First error after the line, or last one before it, if any."""
+        if forward:
+            i = bisect_right(self.errors, line)
+            return self.errors[i] if i < len(self.errors) else None
+        i = bisect_right(self.errors, line - 1) - 1
+        return self.errors[i] if i >= 0 else None
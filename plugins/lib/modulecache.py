@@ -0,0 +1,194 @@
+"""
+On-disk cache for the list of modules reported by `kdesrc-build --list-build`.
+
+Listing modules makes kdesrc-build resolve metadata and dependencies, which
+takes tens of seconds, so results are persisted per configuration file. A
+cached list is considered fresh while the configuration files it was built
+from and the repo-metadata checkout stay the same.
+"""
+
+import json
+import os
+import re
+import subprocess
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+__all__ = (
+    'ModuleListCache',
+    'find_rc_file',
+    'included_files',
+    'metadata_dir',
+    'metadata_head',
+    'module_list_key',
+    'parse_module_line',
+    'stream_module_list',
+)
+
+INCLUDE_RE = re.compile(r"^\s*include\s+(\S[^#\n]*?)\s*(?:#.*)?$")
+
+# Box drawing characters which prefix module names in the tree printed by `--list-build`.
+TREE_CHARS = set("─│├└ ")
+
+# Even if nothing seems to have changed, do not trust the cache for longer than that, in seconds.
+MAX_AGE = 24 * 60 * 60
+
+
+def find_rc_file() -> Optional[str]:
+    """Locate configuration file the same way kdesrc-build does when run outside of a source directory."""
+    config_home = os.environ.get("XDG_CONFIG_HOME") or os.path.expanduser("~/.config")
+    for candidate in (os.path.join(config_home, "kdesrc-buildrc"), os.path.expanduser("~/.kdesrc-buildrc")):
+        if os.path.isfile(candidate):
+            return candidate
+    return None
+
+
+def resolve_include(path: str, base: str) -> str:
+    path = os.path.expanduser(os.path.expandvars(path))
+    if not os.path.isabs(path):
+        path = os.path.join(os.path.dirname(base), path)
+    return os.path.normpath(path)
+
+
+def included_files(rc: str) -> List[str]:
+    """Return the configuration file followed by every file it includes, transitively."""
+    seen = []  # type: List[str]
+    pending = [os.path.normpath(rc)]
+    while pending:
+        path = pending.pop()
+        if path in seen:
+            continue
+        seen.append(path)
+        try:
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                for line in f:
+                    match = INCLUDE_RE.match(line)
+                    if match is not None:
+                        pending.append(resolve_include(match.group(1), path))
+        except OSError:
+            pass
+    return seen
+
+
+def metadata_dir() -> Optional[str]:
+    state_home = os.environ.get("XDG_STATE_HOME") or os.path.expanduser("~/.local/state")
+    path = os.path.join(state_home, "sysadmin-repo-metadata")
+    if os.path.isdir(path):
+        return path
+    return None
+
+
+def metadata_head(path: Optional[str] = None) -> Optional[str]:
+    """Return commit hash of the repo-metadata checkout without spawning git."""
+    if path is None:
+        path = metadata_dir()
+        if path is None:
+            return None
+
+    git_dir = os.path.join(path, ".git")
+    try:
+        with open(os.path.join(git_dir, "HEAD"), "r") as f:
+            head = f.read().strip()
+        if not head.startswith("ref: "):
+            return head
+
+        ref = head[len("ref: "):]
+        try:
+            with open(os.path.join(git_dir, ref), "r") as f:
+                return f.read().strip()
+        except OSError:
+            pass
+
+        with open(os.path.join(git_dir, "packed-refs"), "r") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 2 and parts[1] == ref:
+                    return parts[0]
+    except OSError:
+        pass
+    return None
+
+
+def module_list_key(rc: str) -> Dict[str, Any]:
+    mtimes = {}
+    for path in included_files(rc):
+        try:
+            mtimes[path] = os.stat(path).st_mtime
+        except OSError:
+            mtimes[path] = None
+    return {
+        "rc": rc,
+        "mtimes": mtimes,
+        "metadata": metadata_head(),
+    }
+
+
+def parse_module_line(line: str) -> Optional[str]:
+    """
+    Each module line looks like this:
+
+         ── gammaray : master
+
+    or this:
+
+         ── knotes
+    """
+    parts = line.split()
+    if len(parts) >= 2 and all(c in TREE_CHARS for c in parts[0]):
+        return parts[1]
+    return None
+
+
+def stream_module_list(executable: str) -> Iterator[str]:
+    """Yield module names as soon as kdesrc-build prints them."""
+    command = [executable, "--list-build", "--no-src"]
+    proc = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                            stdin=subprocess.DEVNULL, text=True, bufsize=1)
+    try:
+        assert proc.stdout is not None
+        for line in proc.stdout:
+            module = parse_module_line(line)
+            if module is not None:
+                yield module
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+        proc.wait()
+
+    if proc.returncode != 0:
+        raise subprocess.CalledProcessError(proc.returncode, command)
+
+
+class ModuleListCache:
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    def _read(self) -> Dict[str, Any]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def load(self, rc: str) -> Optional[Dict[str, Any]]:
+        entry = self._read().get(rc)
+        if not isinstance(entry, dict) or not isinstance(entry.get("modules"), list):
+            return None
+        return entry
+
+    def is_fresh(self, entry: Dict[str, Any], key: Dict[str, Any]) -> bool:
+        return entry.get("key") == key and time.time() - entry.get("time", 0) < MAX_AGE
+
+    def save(self, rc: str, key: Dict[str, Any], modules: Iterable[str]) -> None:
+        data = self._read()
+        data[rc] = {
+            "key": key,
+            "time": time.time(),
+            "modules": sorted(modules),
+        }
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, self.path)
@@ -0,0 +1,127 @@
+"""
+Reader for the `persistent-data-file` of kdesrc-build.
+
+kdesrc-build stores per-module state between runs in a JSON file: how many
+times in a row a module failed to build, and which revisions were last
+built and installed. The file is parsed once into a dictionary of module
+states, and parsed again in the background only when its mtime changes,
+so looking up a module never touches the disk.
+"""
+
+from dataclasses import dataclass
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+__all__ = (
+    'ModuleState',
+    'PersistentData',
+    'default_persistent_data_files',
+)
+
+
+@dataclass(frozen=True)
+class ModuleState:
+    name: str
+    failure_count: int = 0
+    """Number of consecutive failed builds, 0 after a successful one."""
+    last_build_rev: str = ""
+    last_install_rev: str = ""
+
+    @property
+    def status(self) -> str:
+        if self.failure_count > 0:
+            return "failed"
+        if self.last_build_rev or self.last_install_rev:
+            return "succeeded"
+        return "unknown"
+
+    @classmethod
+    def from_json(cls, name: str, data: Dict[str, Any]) -> 'ModuleState':
+        try:
+            failure_count = int(data.get("failure-count") or 0)
+        except (TypeError, ValueError):
+            failure_count = 0
+        return cls(
+            name,
+            failure_count,
+            str(data.get("last-build-rev") or ""),
+            str(data.get("last-install-rev") or ""),
+        )
+
+
+def default_persistent_data_files(rc: Optional[str]) -> Tuple[str, ...]:
+    """Where kdesrc-build keeps its data when the option is not set, newest location first."""
+    state_home = os.environ.get("XDG_STATE_HOME") or os.path.expanduser("~/.local/state")
+    paths = [os.path.join(state_home, "kdesrc-build-data")]
+    if rc is not None:
+        paths.append(os.path.join(os.path.dirname(rc), ".kdesrc-build-data"))
+    return tuple(paths)
+
+
+class PersistentData:
+    """
+    Never-blocking cache of module states.
+
+    `locate()` returns the path of the data file, it is called together with
+    the revalidation scheduled through `schedule`, at most once per `ttl`
+    seconds, and only on lookups.
+    """
+
+    def __init__(self, locate: Callable[[], Optional[str]], schedule: Callable[[Callable[[], None]], None],
+                 ttl: float = 5.0, on_ready: Optional[Callable[[], None]] = None) -> None:
+        self.locate = locate
+        self.schedule = schedule
+        self.ttl = ttl
+        self.on_ready = on_ready
+        self._lock = threading.Lock()
+        self._modules = {}  # type: Dict[str, ModuleState]
+        self._key = None  # type: Optional[Tuple[str, float]]
+        self._checked = None  # type: Optional[float]
+        self.loads = 0
+
+    def get(self, module: str) -> Optional[ModuleState]:
+        now = time.monotonic()
+        with self._lock:
+            stale = self._checked is None or now - self._checked >= self.ttl
+            if stale:
+                self._checked = now
+        if stale:
+            self.schedule(self.revalidate)
+        return self._modules.get(module)
+
+    def revalidate(self) -> None:
+        path = self.locate()
+        try:
+            mtime = os.stat(path).st_mtime if path is not None else None
+        except OSError:
+            mtime = None
+
+        if path is None or mtime is None:
+            key = None
+        else:
+            key = (path, mtime)
+        if key == self._key:
+            return
+
+        modules = {}  # type: Dict[str, ModuleState]
+        if key is not None:
+            try:
+                with open(path, "r", encoding="utf-8") as f:  # type: ignore
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                print("WARNING: Failed to read persistent data of kdesrc-build:", e)
+                data = {}
+            if isinstance(data, dict):
+                for name, state in data.items():
+                    if isinstance(state, dict) and name != "global":
+                        modules[name] = ModuleState.from_json(name, state)
+
+        # swap the whole table, lookups from other threads never see a half-loaded one
+        self._modules = modules
+        self._key = key
+        self.loads += 1
+        if self.on_ready is not None:
+            self.on_ready()
@@ -0,0 +1,295 @@
+"""
+Editor-independent parser for kdesrc-buildrc configuration files.
+
+Produces a document model of blocks (global, module-set, module, options),
+their options (with line continuations joined), top-level includes and
+comments. Lines and columns are 0-based, like Sublime Text's `rowcol`.
+
+The parser is line-oriented, so after an edit the document is re-parsed
+starting from the first changed line only, reusing everything before it.
+"""
+
+from bisect import bisect_right
+from dataclasses import dataclass, field
+import re
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+from . import ScopeType
+
+__all__ = (
+    'Block',
+    'Comment',
+    'Document',
+    'Include',
+    'OptionEntry',
+    'ParseError',
+    'parse',
+    'strip_comment',
+)
+
+# Same as kdesrc-build: comment starts at "#" at the beginning of a line or after whitespace.
+COMMENT_RE = re.compile(r"(?:^|(?<=\s))#")
+HEADER_RE = re.compile(r"^(\s*)(global|module-set|module|options)(?=\s|$)(?:[ \t]+(\S+))?(.*)$")
+END_RE = re.compile(r"^\s*end(?=\s|$)(?:[ \t]+(\S+))?(.*)$")
+INCLUDE_RE = re.compile(r"^(\s*)include(?=\s|$)[ \t]*(.*)$")
+OPTION_RE = re.compile(r"^(\s*)(\S+)(?:[ \t]+(.*))?$")
+
+KINDS = { kind.value: kind for kind in ScopeType }
+
+
+@dataclass
+class Comment:
+    line: int
+    col: int
+    text: str
+
+
+@dataclass
+class ParseError:
+    line: int
+    col: int
+    message: str
+
+
+@dataclass
+class Include:
+    line: int
+    col: int
+    path: str
+    path_col: int
+
+
+@dataclass
+class OptionEntry:
+    key: str
+    line: int
+    col: int
+    value_col: int
+    parts: List[str] = field(default_factory=list)
+    """Raw value on each line, comments stripped, continuation backslashes kept."""
+
+    @property
+    def end_line(self) -> int:
+        return self.line + max(len(self.parts), 1) - 1
+
+    @property
+    def continued(self) -> bool:
+        return len(self.parts) != 0 and self.parts[-1].endswith("\\")
+
+    @property
+    def value(self) -> str:
+        return " ".join(
+            part[:-1].strip() if part.endswith("\\") else part.strip()
+            for part in self.parts
+        ).strip()
+
+
+@dataclass
+class Block:
+    kind: ScopeType
+    name: str
+    line: int
+    col: int
+    end_line: Optional[int] = None
+    """Line of the matching `end`, or None for blocks which are not closed (yet)."""
+    options: List[OptionEntry] = field(default_factory=list)
+    option_lines: List[int] = field(default_factory=list, repr=False)
+
+    def contains_line(self, line: int) -> bool:
+        return self.line <= line and (self.end_line is None or line <= self.end_line)
+
+    def add_option(self, option: OptionEntry) -> None:
+        self.options.append(option)
+        self.option_lines.append(option.line)
+
+    def option_at(self, line: int) -> Optional[OptionEntry]:
+        """Return the option which spans over the line, including its continuation lines."""
+        i = bisect_right(self.option_lines, line) - 1
+        if i >= 0 and line <= self.options[i].end_line:
+            return self.options[i]
+        return None
+
+    def get(self, key: str) -> Optional[OptionEntry]:
+        """Return the last occurrence of the option, which is the one that takes effect."""
+        for option in reversed(self.options):
+            if option.key == key:
+                return option
+        return None
+
+
+class Document:
+    def __init__(self, lines: Sequence[str] = ()) -> None:
+        self.lines = []  # type: List[str]
+        self.blocks = []  # type: List[Block]
+        self.includes = []  # type: List[Include]
+        self.comments = []  # type: List[Comment]
+        self.errors = []  # type: List[ParseError]
+        self.block_lines = []  # type: List[int]
+        self.update(list(lines), 0)
+
+    @classmethod
+    def from_text(cls, text: str) -> 'Document':
+        return cls(text.split("\n"))
+
+    def update(self, lines: List[str], first_line: int = 0) -> None:
+        """
+        Replace contents with new lines, where nothing has changed before `first_line`.
+
+        Everything parsed before that line is kept as is, and parsing resumes
+        with the state the parser had at that line.
+        """
+        first_line = max(0, min(first_line, len(self.lines), len(lines)))
+        self.lines = lines
+        block, option = self._truncate(first_line)
+        self._parse(first_line, block, option)
+
+    def update_text(self, text: str, first_line: int = 0) -> None:
+        self.update(text.split("\n"), first_line)
+
+    def block_at(self, line: int) -> Optional[Block]:
+        i = bisect_right(self.block_lines, line) - 1
+        if i >= 0 and self.blocks[i].contains_line(line):
+            return self.blocks[i]
+        return None
+
+    def option_at(self, line: int) -> Optional[OptionEntry]:
+        block = self.block_at(line)
+        if block is not None:
+            return block.option_at(line)
+        return None
+
+    def include_at(self, line: int) -> Optional[Include]:
+        for include in reversed(self.includes):
+            if include.line == line:
+                return include
+            if include.line < line:
+                break
+        return None
+
+    def blocks_of(self, kind: ScopeType) -> Iterator[Block]:
+        return (block for block in self.blocks if block.kind == kind)
+
+    def unterminated(self) -> List[Block]:
+        return [block for block in self.blocks if block.end_line is None]
+
+    def _truncate(self, line: int) -> Tuple[Optional[Block], Optional[OptionEntry]]:
+        """Forget everything at or after the line, return parser state at the start of that line."""
+        for items in (self.includes, self.comments, self.errors):
+            while items and items[-1].line >= line:  # type: ignore
+                items.pop()
+
+        while self.blocks and self.blocks[-1].line >= line:
+            self.blocks.pop()
+            self.block_lines.pop()
+
+        if not self.blocks:
+            return None, None
+
+        block = self.blocks[-1]
+        if block.end_line is not None and block.end_line < line:
+            return None, None
+
+        # block was open at that line, reopen it
+        block.end_line = None
+        while block.options and block.options[-1].line >= line:
+            block.options.pop()
+            block.option_lines.pop()
+
+        if not block.options:
+            return block, None
+
+        option = block.options[-1]
+        del option.parts[line - option.line:]
+        if option.end_line == line - 1 and option.continued:
+            return block, option
+        return block, None
+
+    def _parse(self, first_line: int, block: Optional[Block], option: Optional[OptionEntry]) -> None:
+        lines = self.lines
+        for row in range(first_line, len(lines)):
+            code, comment_col = strip_comment(lines[row])
+            if comment_col is not None:
+                self.comments.append(Comment(row, comment_col, lines[row][comment_col:]))
+
+            if option is not None:
+                option.parts.append(code.strip())
+                if not option.continued:
+                    option = None
+                continue
+
+            if not code.strip():
+                continue
+
+            if block is None:
+                block = self._parse_top_level(row, code)
+                continue
+
+            match = END_RE.match(code)
+            if match is not None:
+                kind, rest = match.group(1), match.group(2)
+                col = code.index("end")
+                if kind == block.kind.value:
+                    block.end_line = row
+                    block = None
+                    if rest.strip():
+                        self.errors.append(ParseError(row, col, "Unexpected text after end of block"))
+                elif kind is None:
+                    self.errors.append(ParseError(row, col, "Expected kind of block to end"))
+                else:
+                    self.errors.append(ParseError(row, col, "Stray 'end {}' in {} block".format(kind, block.kind.value)))
+                continue
+
+            match = OPTION_RE.match(code)
+            assert match is not None
+            value = match.group(3)
+            option = OptionEntry(
+                key=match.group(2),
+                line=row,
+                col=len(match.group(1)),
+                value_col=match.start(3) if value is not None else match.end(2),
+                parts=[value.rstrip() if value is not None else ""],
+            )
+            block.add_option(option)
+            if not option.continued:
+                option = None
+
+    def _parse_top_level(self, row: int, code: str) -> Optional[Block]:
+        match = HEADER_RE.match(code)
+        if match is not None:
+            indent, kind, name, rest = match.groups()
+            block = Block(kind=KINDS[kind], name=name or "", line=row, col=len(indent))
+            if rest.strip():
+                self.errors.append(ParseError(row, match.start(4), "Unexpected text after block header"))
+            self.blocks.append(block)
+            self.block_lines.append(row)
+            return block
+
+        match = INCLUDE_RE.match(code)
+        if match is not None:
+            path = match.group(2).strip()
+            if path:
+                self.includes.append(Include(row, len(match.group(1)), path, match.start(2)))
+            else:
+                self.errors.append(ParseError(row, len(match.group(1)), "Expected path to include"))
+            return None
+
+        col = len(code) - len(code.lstrip())
+        if END_RE.match(code) is not None:
+            self.errors.append(ParseError(row, col, "'end' outside of any block"))
+        else:
+            self.errors.append(ParseError(row, col, "Expected a block or an include"))
+        return None
+
+
+def strip_comment(line: str) -> Tuple[str, Optional[int]]:
+    """Split comment off the line, return the code part and the column where comment starts."""
+    if "#" not in line:
+        return line, None
+    match = COMMENT_RE.search(line)
+    if match is None:
+        return line, None
+    return line[:match.start()], match.start()
+
+
+def parse(text: str) -> Document:
+    return Document.from_text(text)
@@ -0,0 +1,204 @@
+"""
+Index of projects described by kdesrc-build's sysadmin-repo-metadata checkout.
+
+Every KDE project has a `metadata.yaml` file in that checkout, with its
+identifier, path in the project hierarchy, description and repository.
+Reading a thousand small files is too slow to do on every start, so the
+result is persisted along with the commit it was made at. The checkout is
+only walked again when its HEAD moves, and even then only files whose mtime
+changed are parsed again.
+"""
+
+import json
+import os
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from .modulecache import metadata_head
+
+__all__ = (
+    'Project',
+    'RepoMetadataIndex',
+    'parse_metadata',
+    'read_project',
+)
+
+INDEX_VERSION = 1
+
+# Directories of the checkout with project metadata, the first one wins for duplicates.
+PROJECT_DIRS = ("projects-invent", "projects")
+
+METADATA_FILE = "metadata.yaml"
+
+REPO_BASE_URL = "https://invent.kde.org/"
+
+BLOCK_SCALARS = (">", ">-", ">+", "|", "|-", "|+")
+
+
+class Project(NamedTuple):
+    name: str
+    """Identifier of the project, which is what modules are called in the configuration."""
+    path: str
+    """Path in the project hierarchy, e.g. kde/kdeutils/kcalc."""
+    description: str
+    url: str
+
+
+def parse_metadata(text: str) -> Dict[str, str]:
+    """
+    Top-level scalar fields of a metadata.yaml file.
+
+    These files are flat and machine-generated, so a full YAML parser is not
+    needed: nested mappings and lists are skipped, quoted and block scalars
+    are unwrapped.
+    """
+    fields = {}  # type: Dict[str, str]
+    lines = text.splitlines()
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        i += 1
+        if not line or line[0] in " \t#-":
+            continue
+        key, sep, value = line.partition(":")
+        if not sep:
+            continue
+        value = value.strip()
+        if value in BLOCK_SCALARS:
+            block = []  # type: List[str]
+            while i < len(lines) and (not lines[i] or lines[i][0] in " \t"):
+                block.append(lines[i].strip())
+                i += 1
+            value = (" " if value.startswith(">") else "\n").join(block).strip()
+        elif len(value) >= 2 and value[0] == value[-1] and value[0] in "'\"":
+            value = value[1:-1]
+        fields[key.strip()] = value
+    return fields
+
+
+def read_project(path: str) -> Optional[Project]:
+    """Project described by a metadata.yaml file, None for inactive projects and unreadable files."""
+    try:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            fields = parse_metadata(f.read())
+    except OSError:
+        return None
+
+    if fields.get("repoactive") == "false" or fields.get("hasrepo") == "false":
+        return None
+    repopath = fields.get("repopath", "")
+    name = fields.get("identifier") or os.path.basename(repopath) or os.path.basename(os.path.dirname(path))
+    return Project(
+        name=name,
+        path=fields.get("projectpath", ""),
+        description=fields.get("description", ""),
+        url=REPO_BASE_URL + repopath if repopath else "",
+    )
+
+
+class RepoMetadataIndex:
+    """
+    Projects of a repo-metadata checkout, persisted to `path`.
+
+    `refresh()` does the walking and must not run on the main thread.
+    `projects` is replaced as a whole whenever it changes, so other threads
+    may keep reading the dictionary they got.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.checkout = None  # type: Optional[str]
+        self.head = None  # type: Optional[str]
+        self.projects = {}  # type: Dict[str, Project]
+        # relative path of metadata file -> (mtime, project)
+        self._files = {}  # type: Dict[str, Tuple[float, Optional[Project]]]
+        self._loaded = False
+
+    def load(self) -> None:
+        self._loaded = True
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if not isinstance(data, dict) or data.get("version") != INDEX_VERSION:
+            return
+
+        files = {}
+        for rel, row in data.get("files", {}).items():
+            files[rel] = (row[0], Project(*row[1:]) if len(row) == 5 else None)
+        self.checkout = data.get("checkout")
+        self.head = data.get("head")
+        self._files = files
+        self.projects = self._collect(files)
+
+    def save(self) -> None:
+        data = {
+            "version": INDEX_VERSION,
+            "checkout": self.checkout,
+            "head": self.head,
+            "files": {
+                rel: [mtime] + (list(project) if project is not None else [])
+                for rel, (mtime, project) in self._files.items()
+            },
+        }
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(tmp, self.path)
+
+    def refresh(self, checkout: Optional[str]) -> bool:
+        """Bring the index up to date with the checkout, return whether any project changed."""
+        if not self._loaded:
+            self.load()
+
+        head = metadata_head(checkout) if checkout is not None else None
+        if checkout == self.checkout and head == self.head:
+            return False
+
+        previous = self._files if checkout == self.checkout else {}
+        files = {}  # type: Dict[str, Tuple[float, Optional[Project]]]
+        if checkout is not None:
+            for rel, full in _metadata_files(checkout):
+                try:
+                    mtime = os.stat(full).st_mtime
+                except OSError:
+                    continue
+                cached = previous.get(rel)
+                files[rel] = cached if cached is not None and cached[0] == mtime else (mtime, read_project(full))
+
+        changed = files != self._files
+        self.checkout = checkout
+        self.head = head
+        self._files = files
+        if changed:
+            self.projects = self._collect(files)
+        try:
+            self.save()
+        except OSError as e:
+            print("WARNING: Failed to save repo-metadata index:", e)
+        return changed
+
+    @staticmethod
+    def _collect(files: Dict[str, Tuple[float, Optional[Project]]]) -> Dict[str, Project]:
+        projects = {}  # type: Dict[str, Project]
+        for rel in sorted(files, key=_precedence):
+            project = files[rel][1]
+            if project is not None and project.name not in projects:
+                projects[project.name] = project
+        return projects
+
+
+def _precedence(rel: str) -> Tuple[int, str]:
+    top = rel.split(os.sep, 1)[0]
+    return (PROJECT_DIRS.index(top) if top in PROJECT_DIRS else len(PROJECT_DIRS), rel)
+
+
+def _metadata_files(checkout: str) -> Iterator[Tuple[str, str]]:
+    """Yield (relative, full) paths of every metadata file in the checkout."""
+    for base in PROJECT_DIRS:
+        for dirpath, dirnames, filenames in os.walk(os.path.join(checkout, base)):
+            dirnames.sort()
+            if METADATA_FILE in filenames:
+                full = os.path.join(dirpath, METADATA_FILE)
+                yield os.path.relpath(full, checkout), full
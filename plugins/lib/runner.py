@@ -0,0 +1,195 @@
+"""
+Sequential queue of kdesrc-build invocations.
+
+kdesrc-build holds a lock on its state while running, so builds can not run
+concurrently: further requests are queued and started one after another.
+Every build runs on a dedicated worker thread, which is the only one ever
+blocked on process I/O. Output is delivered in chunks as soon as the process
+writes it, through callbacks invoked from the worker thread.
+"""
+
+import codecs
+from collections import deque
+from dataclasses import dataclass, field
+import os
+import signal
+import subprocess
+import threading
+import time
+from typing import Callable, Deque, Iterable, List, Optional, Sequence
+
+__all__ = (
+    'BuildJob',
+    'BuildRunner',
+    'owning_module',
+)
+
+# Maximum number of bytes to read from the process at once.
+CHUNK_SIZE = 64 * 1024
+
+
+@dataclass
+class BuildJob:
+    module: str
+    cmd: List[str]
+    cwd: Optional[str] = None
+    tag: int = 0
+    """Opaque to the runner, e.g. id of the window which requested the build."""
+    started: Optional[float] = field(default=None, compare=False)
+    cancelled: bool = field(default=False, compare=False)
+    returncode: Optional[int] = field(default=None, compare=False)
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started if self.started is not None else 0.0
+
+
+class BuildRunner:
+    """
+    Runs queued jobs one at a time.
+
+    `on_start(job)`, `on_output(job, text)` and `on_finish(job)` are called
+    from the worker thread, they should hand data over to the UI thread
+    rather than touch the UI themselves.
+    """
+
+    def __init__(self, on_start: Callable[[BuildJob], None], on_output: Callable[[BuildJob, str], None],
+                 on_finish: Callable[[BuildJob], None]) -> None:
+        self.on_start = on_start
+        self.on_output = on_output
+        self.on_finish = on_finish
+        self._lock = threading.Lock()
+        self._queue = deque()  # type: Deque[BuildJob]
+        self._current = None  # type: Optional[BuildJob]
+        self._process = None  # type: Optional[subprocess.Popen]
+        self._worker = None  # type: Optional[threading.Thread]
+
+    @property
+    def current(self) -> Optional[BuildJob]:
+        return self._current
+
+    def queued(self) -> List[BuildJob]:
+        with self._lock:
+            return list(self._queue)
+
+    def submit(self, job: BuildJob) -> bool:
+        """Queue the job, unless the same module is already waiting. Return whether it was queued."""
+        with self._lock:
+            if any(queued.module == job.module for queued in self._queue):
+                return False
+            self._queue.append(job)
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="kdesrc-build runner", daemon=True)
+                self._worker.start()
+        return True
+
+    def cancel(self, drop_queue: bool = True) -> List[BuildJob]:
+        """Stop the running build, and optionally forget queued ones. Return jobs which were cancelled."""
+        with self._lock:
+            cancelled = []  # type: List[BuildJob]
+            if drop_queue:
+                cancelled.extend(self._queue)
+                self._queue.clear()
+            job, process = self._current, self._process
+            if job is not None:
+                job.cancelled = True
+                cancelled.insert(0, job)
+
+        if process is not None and process.poll() is None:
+            try:
+                # kdesrc-build spawns git, cmake, make... stop the whole process group
+                os.killpg(process.pid, signal.SIGTERM)
+            except OSError:
+                process.terminate()
+        return cancelled
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                if not self._queue:
+                    self._current = None
+                    self._worker = None
+                    return
+                job = self._current = self._queue.popleft()
+
+            self._execute(job)
+            self.on_finish(job)
+
+    def _execute(self, job: BuildJob) -> None:
+        job.started = time.monotonic()
+        self.on_start(job)
+        if job.cancelled:
+            job.returncode = -signal.SIGTERM
+            return
+        try:
+            process = subprocess.Popen(
+                job.cmd,
+                cwd=job.cwd,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                start_new_session=True,
+            )
+        except OSError as e:
+            self.on_output(job, "Failed to run {}: {}\n".format(job.cmd[0], e))
+            job.returncode = -1
+            return
+
+        with self._lock:
+            self._process = process
+        # cancelled between being dequeued and started
+        if job.cancelled:
+            self.cancel(drop_queue=False)
+
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        assert process.stdout is not None
+        with process.stdout:
+            while True:
+                chunk = process.stdout.read1(CHUNK_SIZE)  # type: ignore
+                if not chunk:
+                    break
+                text = decoder.decode(chunk)
+                if text:
+                    self.on_output(job, text)
+            text = decoder.decode(b"", final=True)
+            if text:
+                self.on_output(job, text)
+
+        job.returncode = process.wait()
+        with self._lock:
+            self._process = None
+
+
+def owning_module(path: str, roots: Sequence[str], known: Iterable[str] = ()) -> Optional[str]:
+    """
+    Guess which module the file belongs to.
+
+    `roots` are source and build directories of kdesrc-build. Whatever the
+    directory layout is, the module is the outermost directory under a root
+    which is a git checkout or has the name of a known module. Files outside
+    of the roots are matched by their enclosing git checkout, as long as it
+    is named after a known module.
+    """
+    known = set(known)
+    path = os.path.normpath(os.path.abspath(path))
+
+    for root in roots:
+        root = os.path.normpath(os.path.abspath(os.path.expanduser(root)))
+        if not path.startswith(root + os.sep):
+            continue
+        parts = os.path.relpath(path, root).split(os.sep)[:-1]
+        directory = root
+        for part in parts:
+            directory = os.path.join(directory, part)
+            if part in known or os.path.isdir(os.path.join(directory, ".git")):
+                return part
+
+    directory = os.path.dirname(path)
+    while True:
+        if os.path.exists(os.path.join(directory, ".git")):
+            name = os.path.basename(directory)
+            return name if name in known else None
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return None
+        directory = parent
@@ -0,0 +1,221 @@
+"""
+Append-only store of how long each phase of each module took to build.
+
+Records are kept in memory column by column, in typed arrays, with module
+and phase names interned into small integers, so hundreds of thousands of
+records cost a few bytes each. On disk, records are appended as fixed-size
+binary rows, and new names to a separate text file, so nothing is ever
+rewritten.
+"""
+
+from array import array
+import os
+import statistics
+import struct
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+__all__ = (
+    'TimingStore',
+    'durations_from_logs',
+    'run_dirs',
+)
+
+# run id, module id, phase id, seconds, succeeded
+RECORD = struct.Struct("<IIBfB")
+
+# How many of the latest runs of a module predictions are based on.
+RECENT_RUNS = 5
+
+# Order in which kdesrc-build writes logs of a module, the time of a phase is
+# the difference between the mtimes of its log and the one before it.
+LOG_PHASES = (
+    ("cmake.log", "configuring"),
+    ("build.log", "compiling"),
+    ("install.log", "installing"),
+)
+
+TABLES = ("run", "module", "phase", "imported")
+
+
+class TimingStore:
+    def __init__(self, directory: Optional[str] = None) -> None:
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._names = { table: [] for table in TABLES }  # type: Dict[str, List[str]]
+        self._ids = { table: {} for table in TABLES }  # type: Dict[str, Dict[str, int]]
+        self.runs = array("I")
+        self.modules = array("I")
+        self.phases = array("B")
+        self.seconds = array("f")
+        self.succeeded = array("B")
+        self._pending_names = []  # type: List[str]
+        self._pending_records = []  # type: List[bytes]
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self.runs)
+
+    def append(self, run: str, module: str, phase: str, seconds: float, succeeded: bool = True) -> None:
+        with self._lock:
+            row = (self._intern("run", run), self._intern("module", module), self._intern("phase", phase),
+                   float(seconds), int(succeeded))
+            self._add(*row)
+            self._pending_records.append(RECORD.pack(*row))
+
+    def mark_imported(self, run: str) -> None:
+        """Remember that logs of the run are already accounted for."""
+        with self._lock:
+            self._intern("imported", run)
+
+    def is_imported(self, run: str) -> bool:
+        return run in self._ids["imported"]
+
+    def flush(self) -> None:
+        """Append new names and records to the files."""
+        with self._lock:
+            names, self._pending_names = self._pending_names, []
+            records, self._pending_records = self._pending_records, []
+        if self.directory is None or (not names and not records):
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # names first, records refer to them
+            if names:
+                with open(os.path.join(self.directory, "timings.names"), "a", encoding="utf-8") as f:
+                    f.write("".join(names))
+            if records:
+                with open(os.path.join(self.directory, "timings.bin"), "ab") as f:
+                    f.write(b"".join(records))
+        except OSError as e:
+            print("WARNING: Failed to save build timings:", e)
+
+    def module_totals(self) -> Dict[str, List[Tuple[int, float]]]:
+        """Successful (run id, total seconds of all phases) of every module, oldest runs first."""
+        totals = {}  # type: Dict[Tuple[int, int], float]
+        failed = set()
+        with self._lock:
+            columns = zip(self.runs, self.modules, self.seconds, self.succeeded)
+            for run, module, seconds, succeeded in columns:
+                key = (module, run)
+                totals[key] = totals.get(key, 0.0) + seconds
+                if not succeeded:
+                    failed.add(key)
+            names = list(self._names["module"])
+            runs = list(self._names["run"])
+
+        result = {}  # type: Dict[str, List[Tuple[int, float]]]
+        # runs are named after their log directories, which sort in chronological order
+        for (module, run), seconds in sorted(totals.items(), key=lambda item: runs[item[0][1]]):
+            if (module, run) not in failed:
+                result.setdefault(names[module], []).append((run, seconds))
+        return result
+
+    def predict(self, totals: Dict[str, List[Tuple[int, float]]], module: str) -> Optional[float]:
+        """Median of the latest successful builds of the module, to be robust against odd runs."""
+        history = totals.get(module)
+        if not history:
+            return None
+        return statistics.median(seconds for _, seconds in history[-RECENT_RUNS:])
+
+    def slowest(self, limit: int = 50) -> List[Tuple[str, float, int]]:
+        """Modules with the highest predicted build time, with the number of runs the prediction is based on."""
+        totals = self.module_totals()
+        ranked = [(module, self.predict(totals, module) or 0.0, len(history)) for module, history in totals.items()]
+        ranked.sort(key=lambda item: -item[1])
+        return ranked[:limit]
+
+    def regressions(self, ratio: float = 1.5, min_delta: float = 10.0) -> List[Tuple[str, float, float]]:
+        """Modules whose last build was much slower than the ones before it, as (module, before, last)."""
+        found = []  # type: List[Tuple[str, float, float]]
+        for module, history in self.module_totals().items():
+            if len(history) < 2:
+                continue
+            last = history[-1][1]
+            before = statistics.median(seconds for _, seconds in history[-RECENT_RUNS - 1:-1])
+            if last > before * ratio and last - before >= min_delta:
+                found.append((module, before, last))
+        found.sort(key=lambda item: item[1] - item[2])
+        return found
+
+    def predict_total(self, modules: Iterable[str]) -> Tuple[float, List[str]]:
+        """Predicted wall time of building the modules one after another, and modules without any history."""
+        totals = self.module_totals()
+        total, unknown = 0.0, []
+        for module in modules:
+            predicted = self.predict(totals, module)
+            if predicted is None:
+                unknown.append(module)
+            else:
+                total += predicted
+        return total, unknown
+
+    def _intern(self, table: str, name: str) -> int:
+        ids = self._ids[table]
+        found = ids.get(name)
+        if found is None:
+            found = ids[name] = len(self._names[table])
+            self._names[table].append(name)
+            self._pending_names.append("{}\t{}\n".format(table, name))
+        return found
+
+    def _add(self, run: int, module: int, phase: int, seconds: float, succeeded: int) -> None:
+        self.runs.append(run)
+        self.modules.append(module)
+        self.phases.append(phase)
+        self.seconds.append(seconds)
+        self.succeeded.append(succeeded)
+
+    def _load(self) -> None:
+        if self.directory is None:
+            return
+        try:
+            with open(os.path.join(self.directory, "timings.names"), "r", encoding="utf-8") as f:
+                for line in f:
+                    table, _, name = line.rstrip("\n").partition("\t")
+                    if table in self._ids and name not in self._ids[table]:
+                        self._ids[table][name] = len(self._names[table])
+                        self._names[table].append(name)
+            with open(os.path.join(self.directory, "timings.bin"), "rb") as f:
+                data = f.read()
+        except OSError:
+            return
+
+        # ignore a torn record at the end, e.g. after a crash in the middle of a write
+        data = data[:len(data) - len(data) % RECORD.size]
+        counts = { table: len(names) for table, names in self._names.items() }
+        for run, module, phase, seconds, succeeded in RECORD.iter_unpack(data):
+            if run < counts["run"] and module < counts["module"] and phase < counts["phase"]:
+                self._add(run, module, phase, seconds, succeeded)
+
+
+def durations_from_logs(module_dir: str) -> List[Tuple[str, float]]:
+    """
+    Estimate (phase, seconds) of a module from a log directory of a past run.
+
+    Logs of past runs do not record durations, but every phase writes its log
+    until it ends, so consecutive mtimes tell how long each phase took.
+    """
+    mtimes = []  # type: List[Tuple[str, float]]
+    for name, phase in LOG_PHASES:
+        try:
+            mtimes.append((phase, os.stat(os.path.join(module_dir, name)).st_mtime))
+        except OSError:
+            continue
+    return [
+        (phase, max(mtime - previous, 0.0))
+        for (_, previous), (phase, mtime) in zip(mtimes, mtimes[1:])
+    ]
+
+
+def run_dirs(log_dirs: Sequence[str]) -> List[str]:
+    """Run directories of past builds, oldest first, without symlinks such as `latest`."""
+    runs = []  # type: List[str]
+    for log_dir in log_dirs:
+        try:
+            with os.scandir(log_dir) as it:
+                runs.extend(entry.path for entry in it if entry.is_dir(follow_symlinks=False))
+        except OSError:
+            pass
+    runs.sort(key=os.path.basename)
+    return runs
@@ -0,0 +1,110 @@
+from typing import List, Sequence
+
+import sublime
+from sublime import Region, View
+
+__all__ = (
+    'DirtyLines',
+    'changed_regions',
+    'find_by_selector_in',
+    'merge_regions',
+    'overlaps',
+)
+
+
+class DirtyLines:
+    """
+    Remembers which lines of a view were touched since a consumer looked at them last time.
+
+    Touched lines are stored as hidden regions of the view itself, so Sublime
+    Text keeps them in place while the buffer is being edited further. Every
+    consumer uses its own key, and thus consumes changes independently.
+    """
+
+    def __init__(self, key: str) -> None:
+        self.key = key
+
+    def mark(self, view: View, regions: Sequence[Region]) -> None:
+        if len(regions) == 0:
+            return
+        lines = view.get_regions(self.key)
+        lines.extend(view.full_line(region) for region in regions)
+        view.add_regions(self.key, merge_regions(lines), flags=sublime.HIDDEN)
+
+    def mark_all(self, view: View) -> None:
+        view.add_regions(self.key, [Region(0, view.size())], flags=sublime.HIDDEN)
+
+    def take(self, view: View) -> List[Region]:
+        """Return merged dirty lines and forget about them."""
+        lines = view.get_regions(self.key)
+        view.erase_regions(self.key)
+        return merge_regions(lines)
+
+
+def changed_regions(changes: Sequence[sublime.TextChange]) -> List[Region]:
+    """
+    Convert a batch of text changes into regions of the resulting buffer.
+
+    Changes are reported in the order they were applied, so every new change
+    shifts regions of the preceding ones.
+    """
+    regions = []  # type: List[Region]
+
+    for change in changes:
+        begin, end = change.a.pt, change.b.pt
+        delta = len(change.str) - (end - begin)
+        inserted = Region(begin, begin + len(change.str))
+
+        shifted = []
+        for region in regions:
+            if region.end() < begin:
+                shifted.append(region)
+            elif region.begin() > end:
+                shifted.append(Region(region.begin() + delta, region.end() + delta))
+            else:
+                region_end = region.end() + delta if region.end() > end else inserted.end()
+                inserted = Region(min(region.begin(), inserted.begin()), max(region_end, inserted.end()))
+        shifted.append(inserted)
+        regions = shifted
+
+    return regions
+
+
+def merge_regions(regions: Sequence[Region]) -> List[Region]:
+    """Sort regions and join the ones that overlap or touch each other."""
+    merged = []  # type: List[Region]
+    for region in sorted(regions, key=lambda r: (r.begin(), r.end())):
+        if merged and region.begin() <= merged[-1].end():
+            last = merged[-1]
+            merged[-1] = Region(last.begin(), max(last.end(), region.end()))
+        else:
+            merged.append(Region(region.begin(), region.end()))
+    return merged
+
+
+def overlaps(a: Region, b: Region) -> bool:
+    """Strict intersection: regions merely touching each other do not overlap."""
+    return a.begin() < b.end() and b.begin() < a.end()
+
+
+def find_by_selector_in(view: View, selector: str, areas: Sequence[Region]) -> List[Region]:
+    """
+    Like `View.find_by_selector`, but only looks at the given areas.
+
+    Matching regions are expanded to their full extent, so they might reach
+    out of the areas where they were found.
+    """
+    if len(areas) == 1 and areas[0].begin() == 0 and areas[0].end() >= view.size():
+        return view.find_by_selector(selector)
+
+    found = []  # type: List[Region]
+    for area in areas:
+        for token, scope in view.extract_tokens_with_scopes(area):
+            if found and found[-1].contains(token.begin()) and found[-1].end() != token.begin():
+                continue
+            if sublime.score_selector(scope, selector) == 0:
+                continue
+            region = view.expand_to_scope(token.begin(), selector)
+            if region is not None and not region.empty():
+                found.append(region)
+    return found
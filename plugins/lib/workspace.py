@@ -0,0 +1,171 @@
+"""
+Include graph and symbol index across all files of a kdesrc-build configuration.
+
+Starting from the root configuration file, `include` directives are
+followed transitively. Every file is parsed once and reused for as long as
+its mtime stays the same. Definitions of modules (`module` blocks and
+`use-modules` of module sets), module sets and `options` overrides are
+collected into hash tables, so looking up a symbol does not touch files.
+"""
+
+from dataclasses import dataclass
+import os
+import re
+import shutil
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from . import ScopeType
+from .rcparser import Document
+
+__all__ = (
+    'Location',
+    'Symbol',
+    'WorkspaceIndex',
+    'module_definitions_dir',
+)
+
+VARIABLE_RE = re.compile(r"\$\{([-\w]+)\}")
+
+
+@dataclass(frozen=True)
+class Location:
+    path: str
+    line: int
+    col: int
+
+    def encoded(self) -> str:
+        """Format suitable for Sublime Text's ENCODED_POSITION flag, which is 1-based."""
+        return "{}:{}:{}".format(self.path, self.line + 1, self.col + 1)
+
+
+@dataclass(frozen=True)
+class Symbol:
+    name: str
+    kind: str
+    """One of "module", "module-set", "use-modules" (module listed in a module set) or "options"."""
+    location: Location
+
+
+def module_definitions_dir(executable: str) -> Optional[str]:
+    """Return directory with build includes shipped with the given kdesrc-build, as `${module-definitions-dir}`."""
+    executable = shutil.which(executable)
+    if executable is None:
+        return None
+    path = os.path.join(os.path.dirname(os.path.realpath(executable)), "data", "build-include")
+    return path if os.path.isdir(path) else None
+
+
+class WorkspaceIndex:
+    def __init__(self, variables: Optional[Dict[str, str]] = None) -> None:
+        self.variables = variables or {}
+        self._lock = threading.Lock()
+        # path -> (mtime, parsed document)
+        self._files = {}  # type: Dict[str, Tuple[float, Document]]
+        self.graph = {}  # type: Dict[str, List[str]]
+        self.definitions = {}  # type: Dict[str, List[Symbol]]
+        self.overrides = {}  # type: Dict[str, List[Symbol]]
+        self.parsed = 0
+
+    def resolve_include(self, path: str, base: str) -> str:
+        path = VARIABLE_RE.sub(lambda m: self.variables.get(m.group(1), m.group(0)), path)
+        path = os.path.expanduser(os.path.expandvars(path))
+        if not os.path.isabs(path):
+            path = os.path.join(os.path.dirname(base), path)
+        return os.path.normpath(path)
+
+    def document(self, path: str) -> Optional[Document]:
+        entry = self._files.get(path)
+        return entry[1] if entry is not None else None
+
+    def files(self) -> List[str]:
+        return list(self.graph.keys())
+
+    def refresh(self, roots: Iterable[str]) -> None:
+        """Re-index files reachable from the roots. Only files with a new mtime are parsed again."""
+        with self._lock:
+            graph = {}  # type: Dict[str, List[str]]
+            pending = [os.path.normpath(root) for root in roots]
+            while pending:
+                path = pending.pop()
+                if path in graph:
+                    continue
+                doc = self._load(path)
+                if doc is None:
+                    graph[path] = []
+                    continue
+                children = [self.resolve_include(include.path, path) for include in doc.includes]
+                graph[path] = children
+                pending.extend(reversed(children))
+
+            for path in list(self._files.keys()):
+                if path not in graph:
+                    del self._files[path]
+
+            definitions = {}  # type: Dict[str, List[Symbol]]
+            overrides = {}  # type: Dict[str, List[Symbol]]
+            for path in graph:
+                doc = self.document(path)
+                if doc is not None:
+                    for symbol in symbols_of(path, doc):
+                        table = overrides if symbol.kind == "options" else definitions
+                        table.setdefault(symbol.name, []).append(symbol)
+
+            # swap whole tables at once, readers on other threads never see a half-built index
+            self.graph = graph
+            self.definitions = definitions
+            self.overrides = overrides
+
+    def lookup(self, name: str) -> List[Symbol]:
+        """All definitions of the name followed by all overrides of it."""
+        return self.definitions.get(name, []) + self.overrides.get(name, [])
+
+    def _load(self, path: str) -> Optional[Document]:
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            self._files.pop(path, None)
+            return None
+
+        entry = self._files.get(path)
+        if entry is not None and entry[0] == mtime:
+            return entry[1]
+
+        try:
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                doc = Document.from_text(f.read())
+        except OSError:
+            return None
+        self.parsed += 1
+        self._files[path] = (mtime, doc)
+        return doc
+
+
+def symbols_of(path: str, doc: Document) -> Iterable[Symbol]:
+    for block in doc.blocks:
+        if block.kind == ScopeType.MODULE and block.name:
+            yield Symbol(block.name, "module", Location(path, block.line, block.col))
+
+        elif block.kind == ScopeType.MODULE_SET:
+            if block.name:
+                yield Symbol(block.name, "module-set", Location(path, block.line, block.col))
+            for option in block.options:
+                if option.key == "use-modules":
+                    yield from modules_of(path, doc, option.line)
+
+        elif block.kind == ScopeType.OPTIONS and block.name:
+            yield Symbol(block.name, "options", Location(path, block.line, block.col))
+
+
+def modules_of(path: str, doc: Document, line: int) -> Iterable[Symbol]:
+    """Yield modules listed by an option value which starts at the line, with exact positions."""
+    option = doc.option_at(line)
+    if option is None:
+        return
+    for i, part in enumerate(option.parts):
+        row = option.line + i
+        text = doc.lines[row]
+        # first part starts at the value, continuation parts are stripped
+        offset = option.value_col if i == 0 else len(text) - len(text.lstrip())
+        for match in re.finditer(r"[^\s\\]+", part):
+            yield Symbol(match.group(0), "use-modules", Location(path, row, offset + match.start()))
@@ -0,0 +1,64 @@
+import json
+import os
+import time
+
+import sublime
+import sublime_plugin
+
+from .completions import settings
+from .plugins.lib.instrumentation import DEFAULT_THRESHOLD_MS, INSTRUMENTATION
+
+LATENCY_PANEL = "kdesrc-build-latency"
+
+SETTINGS_KEY = "kdesrc-build-instrumentation"
+
+
+def configure() -> None:
+    s = settings()
+    INSTRUMENTATION.configure(
+        s.get("kdesrc_build_instrumentation", False),
+        s.get("kdesrc_build_slow_call_threshold_ms", DEFAULT_THRESHOLD_MS),
+    )
+
+
+def plugin_loaded():
+    configure()
+    settings().add_on_change(SETTINGS_KEY, configure)
+
+
+def plugin_unloaded():
+    settings().clear_on_change(SETTINGS_KEY)
+
+
+class KdesrcBuildShowLatencyStatisticsCommand(sublime_plugin.WindowCommand):
+    """Show latency histograms of event handlers, slow calls and cache hit rates in a panel."""
+
+    def run(self) -> None:
+        panel = self.window.create_output_panel(LATENCY_PANEL)
+        panel.settings().set("word_wrap", False)
+        panel.run_command("append", { "characters": INSTRUMENTATION.summary(), "force": True })
+        panel.set_read_only(True)
+        self.window.run_command("show_panel", { "panel": "output." + LATENCY_PANEL })
+
+
+class KdesrcBuildExportLatencyStatisticsCommand(sublime_plugin.WindowCommand):
+    """Write everything recorded so far as JSON, and open it."""
+
+    def run(self) -> None:
+        directory = os.path.join(sublime.cache_path(), __package__)
+        path = os.path.join(directory, time.strftime("latency-%Y-%m-%d-%H%M%S.json"))
+        try:
+            os.makedirs(directory, exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(INSTRUMENTATION.to_json(), f, indent=1)
+                f.write("\n")
+        except OSError as e:
+            sublime.error_message("kdesrc-build: Failed to export latency statistics: {}".format(e))
+            return
+        self.window.open_file(path)
+
+
+class KdesrcBuildResetLatencyStatisticsCommand(sublime_plugin.WindowCommand):
+    def run(self) -> None:
+        INSTRUMENTATION.reset()
+        sublime.status_message("kdesrc-build: Latency statistics reset")
@@ -0,0 +1,72 @@
+"""
+Validation of option values by the linter. Run from the repository root:
+
+    $ python -m unittest discover -s tests
+"""
+
+import os
+import sys
+import unittest
+from typing import Any, List, NamedTuple, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "plugins"))
+
+from lib import ScopeType
+from lib.diagnostics import ERROR, WARNING, Linter
+from lib.rcparser import Document
+
+
+class Spec(NamedTuple):
+    type: type
+    scope: ScopeType = ScopeType.GLOBAL
+    choices: Tuple[Any, ...] = ()
+    strict: bool = False
+    deprecated: bool = False
+
+
+REGISTRY = {
+    "num-cores": Spec(int),
+    "stop-on-failure": Spec(bool),
+    "directory-layout": Spec(str, choices=("flat", "invent", "metadata"), strict=True),
+}
+
+
+class CheckOptionTest(unittest.TestCase):
+    def lint(self, *options: str) -> List[Tuple[str, str]]:
+        doc = Document.from_text("global\n{}\nend global\n".format("\n".join("    " + o for o in options)))
+        return [(d.severity, d.message) for d in Linter(REGISTRY.get).lint(doc)]
+
+    def assertValid(self, option: str) -> None:
+        self.assertEqual(self.lint(option), [])
+
+    def assertInvalid(self, option: str, severity: str) -> None:
+        found = self.lint(option)
+        self.assertEqual(len(found), 1, found)
+        self.assertEqual(found[0][0], severity)
+
+    def test_integer(self):
+        self.assertValid("num-cores 8")
+        self.assertInvalid("num-cores eight", ERROR)
+
+    def test_boolean(self):
+        self.assertValid("stop-on-failure false")
+        self.assertInvalid("stop-on-failure maybe", ERROR)
+
+    def test_choices(self):
+        self.assertValid("directory-layout invent")
+        self.assertInvalid("directory-layout nested", WARNING)
+
+    def test_variables(self):
+        # values are only known once kdesrc-build expands them
+        self.assertValid("num-cores ${jobs}")
+        self.assertValid("stop-on-failure ${flag}")
+        self.assertValid("directory-layout ${layout}")
+        self.assertValid("num-cores ${jobs}0")
+
+    def test_unknown_option(self):
+        self.assertInvalid("bogus-option ${jobs}", WARNING)
+        self.assertValid("_jobs 4")
+
+
+if __name__ == '__main__':
+    unittest.main()
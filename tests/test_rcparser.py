@@ -0,0 +1,183 @@
+"""
+Incremental parsing of kdesrc-buildrc files must give the same document as
+parsing from scratch. Run from the repository root:
+
+    $ python -m unittest discover -s tests
+"""
+
+import os
+import random
+import sys
+import unittest
+from typing import Any, List, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "plugins"))
+
+from lib import ScopeType
+from lib.rcparser import Document
+
+SAMPLE = """\
+# kdesrc-build configuration
+global
+    branch-group kf5-qt5
+    cmake-options -DCMAKE_BUILD_TYPE=Debug \\
+        -DBUILD_TESTING=ON  # continued
+    num-cores 8
+end global
+
+include ${module-definitions-dir}/kf5-qt5.ksb
+
+module-set frameworks
+    repository kde-projects
+    use-modules kconfig kio \\
+        kcoreaddons
+end module-set
+
+options kio
+    make-options -j4
+end options
+
+module kcalc
+    branch master
+end module
+"""
+
+# Lines which open, close or continue blocks and options, or break them.
+EDIT_LINES = (
+    "",
+    "# comment",
+    "global",
+    "end global",
+    "module foo",
+    "end module",
+    "module-set bar",
+    "end module-set",
+    "options baz",
+    "end options",
+    "end",
+    "end module trailing",
+    "    branch master",
+    "    cmake-options -DA=1 \\",
+    "        -DB=2",
+    "        -DC=3 \\",
+    "    set-env FOO bar # not a continuation \\",
+    "include other.ksb",
+    "include",
+    "stray text",
+)
+
+
+def snapshot(doc: Document) -> Tuple[Any, ...]:
+    return (doc.blocks, doc.block_lines, doc.includes, doc.comments, doc.errors)
+
+
+def first_change(old: List[str], new: List[str]) -> int:
+    for line, (a, b) in enumerate(zip(old, new)):
+        if a != b:
+            return line
+    return min(len(old), len(new))
+
+
+class IncrementalParseTest(unittest.TestCase):
+    def assertReparses(self, old: str, new: str) -> Document:
+        doc = Document.from_text(old)
+        lines = new.split("\n")
+        doc.update(lines, first_change(old.split("\n"), lines))
+        self.assertEqual(snapshot(doc), snapshot(Document.from_text(new)))
+        return doc
+
+    def edit(self, text: str, line: int, replacement: List[str], count: int = 1) -> str:
+        lines = text.split("\n")
+        lines[line:line + count] = replacement
+        return "\n".join(lines)
+
+    def test_full_parse(self):
+        doc = Document.from_text(SAMPLE)
+        self.assertEqual([block.kind for block in doc.blocks],
+                         [ScopeType.GLOBAL, ScopeType.MODULE_SET, ScopeType.OPTIONS, ScopeType.MODULE])
+        self.assertEqual(doc.blocks[0].get("cmake-options").value, "-DCMAKE_BUILD_TYPE=Debug -DBUILD_TESTING=ON")
+        self.assertEqual(doc.blocks[1].get("use-modules").value, "kconfig kio kcoreaddons")
+        self.assertEqual([include.path for include in doc.includes], ["${module-definitions-dir}/kf5-qt5.ksb"])
+        self.assertEqual(doc.errors, [])
+        self.assertEqual(doc.unterminated(), [])
+
+    def test_add_option(self):
+        self.assertReparses(SAMPLE, self.edit(SAMPLE, 21, ["    branch master", "    tag v1"]))
+
+    def test_remove_end_of_block(self):
+        # every block after it becomes part of the unterminated one
+        doc = self.assertReparses(SAMPLE, self.edit(SAMPLE, 6, []))
+        self.assertEqual(len(doc.unterminated()), 1)
+
+    def test_restore_end_of_block(self):
+        broken = self.edit(SAMPLE, 6, [])
+        doc = self.assertReparses(broken, SAMPLE)
+        self.assertEqual(doc.unterminated(), [])
+
+    def test_close_block_early(self):
+        self.assertReparses(SAMPLE, self.edit(SAMPLE, 12, ["end module-set"], count=0))
+
+    def test_open_block_inside_block(self):
+        self.assertReparses(SAMPLE, self.edit(SAMPLE, 18, ["module nested"], count=0))
+
+    def test_mismatched_end(self):
+        self.assertReparses(SAMPLE, self.edit(SAMPLE, 22, ["end module-set"]))
+
+    def test_start_continuation(self):
+        self.assertReparses(SAMPLE, self.edit(SAMPLE, 5, ["    num-cores 8 \\"]))
+
+    def test_end_continuation(self):
+        self.assertReparses(SAMPLE, self.edit(SAMPLE, 3, ["    cmake-options -DCMAKE_BUILD_TYPE=Debug"]))
+
+    def test_edit_continuation_line(self):
+        self.assertReparses(SAMPLE, self.edit(SAMPLE, 13, ["        kcoreaddons \\", "        ki18n"]))
+
+    def test_comment_out_header(self):
+        self.assertReparses(SAMPLE, self.edit(SAMPLE, 10, ["# module-set frameworks"]))
+
+    def test_rename_block(self):
+        self.assertReparses(SAMPLE, self.edit(SAMPLE, 20, ["module kcalc-renamed"]))
+
+    def test_edit_first_line(self):
+        self.assertReparses(SAMPLE, self.edit(SAMPLE, 0, ["module first", "end module"]))
+
+    def test_append(self):
+        self.assertReparses(SAMPLE, SAMPLE + "module last\n    branch work\nend module\n")
+
+    def test_truncate(self):
+        self.assertReparses(SAMPLE, "\n".join(SAMPLE.split("\n")[:12]))
+
+    def test_clear(self):
+        self.assertReparses(SAMPLE, "")
+
+    def test_random_edits(self):
+        rng = random.Random(20261017)
+        for _ in range(2000):
+            old = SAMPLE.split("\n")
+            for _ in range(rng.randint(0, 5)):
+                old = self.random_edit(rng, old)
+            new = old
+            for _ in range(rng.randint(1, 3)):
+                new = self.random_edit(rng, new)
+
+            doc = Document(old)
+            doc.update(new, first_change(old, new))
+            expected = Document(new)
+            self.assertEqual(snapshot(doc), snapshot(expected), "\n".join(["old:"] + old + ["new:"] + new))
+
+    @staticmethod
+    def random_edit(rng: random.Random, lines: List[str]) -> List[str]:
+        lines = list(lines)
+        line = rng.randint(0, len(lines))
+        action = rng.random()
+        if action < 0.4 or not lines:
+            lines.insert(line, rng.choice(EDIT_LINES))
+        elif action < 0.7:
+            del lines[min(line, len(lines) - 1)]
+        else:
+            lines[min(line, len(lines) - 1)] = rng.choice(EDIT_LINES)
+        return lines
+
+
+if __name__ == '__main__':
+    unittest.main()